@@ -0,0 +1,3 @@
+#!/bin/bash
+
+  python src/snake_tournament.py "$@"
@@ -8,13 +8,27 @@ from __future__ import print_function
 # Imports
 import curses
 from curses import KEY_RIGHT, KEY_LEFT, KEY_UP, KEY_DOWN
-from random import randint
-from datetime import datetime
 import logging
+import time
+
+import snake_engine
+import snake_input
+import snake_instrument
+import snake_leaderboard
+import snake_loop
+import snake_render
+import snake_replay
+import snake_shared
+from snake_engine import LEAST_SPEED, DIR_UP, DIR_DOWN, DIR_RIGHT, DIR_LEFT
 
 # CONFIGURABLE CONSTANTS
 BOUNDS_ENABLED = False
 BASE_SPEED = 5
+REPLAY_FILE = None  # Set a file path to record the game
+INSTRUMENTATION_FILE = None  # Set a file path to dump the per-tick timings
+SHARED_BOARD_NAME = None  # Set a shared memory name to publish the board on every tick
+LEADERBOARD_FILE = None  # Set a SQLite file path to record the scores
+PLAYER_NAME = "Player 0"  # Name of the player on the leaderboard
 
 # Key bindings
 KEY_ESC = 27
@@ -41,27 +55,20 @@ KEYS_RIGHT = [KEY_RIGHT, KEY_D, KEY_L, KEY_NUM_6]
 KEYS_LEFT = [KEY_LEFT, KEY_A, KEY_J, KEY_NUM_4]
 
 # CONSTANTS
-LEAST_SPEED = 600
-TOP_SPEED = 30
 INITIAL_SPEED = int(LEAST_SPEED / BASE_SPEED)
 
 Y_SIZE = 40
 X_SIZE = 100
 
-INITIAL_KEY = KEY_RIGHT
-INITIAL_FOOD = [10, 20]
-INITIAL_SNAKE = [[4, 10], [4, 9], [4, 8]]
+# Boards bigger than the window are shown through a viewport following the (first) player
+WINDOW_Y_SIZE = min(Y_SIZE, 40)
+WINDOW_X_SIZE = min(X_SIZE, 100)
 
-CHAR_FOOD = '*'
-CHAR_EMPTY = ' '
-CHAR_SNAKE = '#'
+INITIAL_KEY = KEY_RIGHT
 
 COLOR_FOOD = 209
-COLOR_EMPTY = 1
 COLOR_SNAKE = 47
 
-MAX_SCORE_PER_FOOD = 100
-
 #
 # Logger definition
 #
@@ -73,47 +80,33 @@ logger = logging.getLogger("console")
 # SECOND LEVEL HELPER METHODS
 #
 
-def print_game_iteration(win, score, snake):
+def print_hud(win, scores):
     """
-    Generates the window for the next game iteration
+    Prints the score and the game name.
 
     :param win: Window screen.
         + type: curses.Window
-    :param score: Current score
-        + type: int
-    :param snake: Snake positions
-        + type: List<List<int, int>>
+    :param scores: Current scores
+        + type: List<int>
     :return: None
     """
-    win.border(0)
-
     # Print score
-    win.addstr(0, 2, 'Score : ' + str(score) + ' ')
+    win.addstr(0, 2, 'Score : ' + str(scores[0]) + ' ')
 
     # Print Snake name
     win.addstr(0, 27, ' SNAKE ')  # 'SNAKE' strings
 
-    # Increase snake speed with its length
-    increase_speed = int(5 * (len(snake) / 5 + len(snake) / 10))
-    speed = INITIAL_SPEED - increase_speed % (INITIAL_SPEED - TOP_SPEED)
-    win.timeout(speed)
-
 
-def print_char(win, pos, char, color):
+def game_speed(snake):
     """
-    Prints the given char at the given position using the given color.
+    Calculates the game speed (tick duration in milliseconds) for the given snake.
 
-    :param win: Window screen.
-        + type: curses.Window
-    :param pos: Position to write.
-        + type: List<int, int>
-    :param char: Character to write.
-        + type: string
-    :param color: Color code to use.
+    :param snake: Snake positions
+        + type: SnakeBody
+    :return: The tick duration in milliseconds.
         + type: int
-    :return: None
     """
-    win.addch(pos[0], pos[1], char, curses.color_pair(color))
+    return snake_engine.game_speed(len(snake), INITIAL_SPEED)
 
 
 def process_events(win):
@@ -149,80 +142,67 @@ def wait_for_resume_game(win):
         + type: boolean
     """
     key = INITIAL_KEY
+    # Block on the key presses while paused
+    win.nodelay(0)
     while key != KEY_SPACE and key != KEY_ESC:
         key = win.getch()
+    win.nodelay(1)
 
     return key != KEY_SPACE
 
 
-def move_snake(win, key, snake, food, food_time, score):
+def key_to_direction(key):
     """
-    Calculates the next snake move.
+    Translates a direction key into an engine direction.
 
-    :param win: Window screen.
-        + type: curses.Window
-    :param key: Current pressed key.
+    :param key: Pressed key.
         + type: int
-    :param snake: Current snake position.
-        + type: List<List<int, int>>
-    :param food: Current food position.
-        + type: List<int, int>
-    :param food_time: Time when food was created.
-        + type: time
-    :param score: Current score.
-        + type: int
-    :return: A tuple representing if the game must be ended, the snake position, the next food position,
-    the food creation time, and the current score
-        + type: Tuple<Boolean, List, List, time, int>
+    :return: The engine direction or None if the key is not a direction key.
+        + type: int or None
+    """
+    if key in KEYS_UP:
+        return DIR_UP
+    if key in KEYS_DOWN:
+        return DIR_DOWN
+    if key in KEYS_RIGHT:
+        return DIR_RIGHT
+    if key in KEYS_LEFT:
+        return DIR_LEFT
+    return None
+
+
+def move_snake(renderer, direction, state, instrumentation=None, publisher=None):
+    """
+    Calculates the next snake move and prints it.
+
+    :param renderer: Game renderer.
+        + type: snake_render.Renderer
+    :param direction: New direction of the snake, or None to keep the current one.
+        + type: int or None
+    :param state: Current game state (modified in place).
+        + type: GameState
+    :param instrumentation: Per-tick timings, or None if disabled.
+        + type: snake_instrument.Instrumentation
+    :param publisher: Shared memory export of the board, or None if disabled.
+        + type: snake_shared.BoardPublisher
+    :return: Whether the game must be ended or not
+        + type: boolean
     """
-    # Calculates the new coordinates of the head of the snake
-    snake.insert(0, [snake[0][0] + (key in KEYS_DOWN and 1) + (key in KEYS_UP and -1),
-                     snake[0][1] + (key in KEYS_LEFT and -1) + (key in KEYS_RIGHT and 1)])
-
-    # If snake crosses the boundaries, make it enter from the other side
-    if snake[0][0] == 0:
-        snake[0][0] = Y_SIZE - 2
-    if snake[0][1] == 0:
-        snake[0][1] = X_SIZE - 2
-    if snake[0][0] == Y_SIZE - 1:
-        snake[0][0] = 1
-    if snake[0][1] == X_SIZE - 1:
-        snake[0][1] = 1
-
-    # Control if the game must end
-    # Exit if snake crosses the boundaries (Uncomment to enable)
-    if BOUNDS_ENABLED:
-        if snake[0][0] == 0 or snake[0][0] == Y_SIZE - 1 or snake[0][1] == 0 or snake[0][1] == X_SIZE - 1:
-            return True, snake, food, food_time, score
-    # If snake runs over itself
-    if snake[0] in snake[1:]:
-        return True, snake, food, food_time, score
-
-    # Control if the snake its the food
-    if snake[0] == food:
-        # Increase the score
-        elapsed_time = datetime.now() - food_time
-        et_seconds = elapsed_time.total_seconds() + 1
-        score = score + int(MAX_SCORE_PER_FOOD / et_seconds)
-
-        # Recalculate new food
-        food = None
-        while food is None:
-            # From 1 to size - 2 because of borders
-            food = [randint(1, Y_SIZE - 2), randint(1, X_SIZE - 2)]
-            if food in snake:
-                food = None
-        print_char(win, food, CHAR_FOOD, COLOR_FOOD)
-        food_time = datetime.now()
-    else:
-        # Decrease the size of the snake if it does not eat (because we have increased it at the beginning)
-        last = snake.pop()
-        print_char(win, last, CHAR_EMPTY, COLOR_EMPTY)
-
-    # Print the snake
-    print_char(win, snake[0], CHAR_SNAKE, COLOR_SNAKE)
-
-    return False, snake, food, food_time, score
+    if instrumentation is None:
+        diffs = snake_engine.step(state, [direction])
+        if publisher is not None:
+            publisher.publish(state, diffs)
+        renderer.draw(diffs, state.scores)
+        return state.must_end
+
+    start = instrumentation.clock()
+    diffs = snake_engine.step(state, [direction])
+    if publisher is not None:
+        publisher.publish(state, diffs)
+    simulated = instrumentation.record(snake_instrument.SPAN_SIMULATION, start)
+    renderer.draw(diffs, state.scores)
+    instrumentation.frame_displayed(instrumentation.record(snake_instrument.SPAN_RENDER, simulated))
+    return state.must_end
 
 
 #
@@ -243,7 +223,7 @@ def init_game_screen():
     curses.noecho()
     curses.curs_set(0)
 
-    win = curses.newwin(Y_SIZE, X_SIZE, 0, 0)
+    win = curses.newwin(WINDOW_Y_SIZE, WINDOW_X_SIZE, 0, 0)
     win.keypad(1)
     win.border(0)
     win.nodelay(1)
@@ -257,64 +237,117 @@ def init_game_screen():
     return win
 
 
-def run_game(win):
+def run_game(win, instrumentation=None):
     """
     Runs the game until the user requests to end or he gets killed.
 
     :param win: Window screen.
         + type: curses.Window
-    :return: Game score.
-        + type: int
+    :param instrumentation: Per-tick timings, or None if disabled.
+        + type: snake_instrument.Instrumentation
+    :return: Game result.
+        + type: snake_leaderboard.GameResult
     """
     logger.debug("Running main game method")
 
     # Initializing values
-    score = 0
-    snake = INITIAL_SNAKE
-    food = INITIAL_FOOD
-    food_time = datetime.now()
-
     key = INITIAL_KEY
-    print_char(win, food, CHAR_FOOD, COLOR_FOOD)
-
-    # Main loop
+    start_time = time.time()
+    seed = snake_engine.new_seed()
+    state = snake_engine.new_snake_state(y_size=Y_SIZE, x_size=X_SIZE, bounds_enabled=BOUNDS_ENABLED, seed=seed,
+                                         initial_speed=INITIAL_SPEED)
+    renderer = snake_render.new_renderer(win, state, [COLOR_SNAKE], [COLOR_FOOD], print_hud)
+    renderer.draw(state.initial_diffs(), state.scores)
+
+    # Record the game if requested
+    replay = None
+    if REPLAY_FILE is not None:
+        header = snake_replay.ReplayHeader(snake_replay.MODE_SNAKE, 1, seed, y_size=Y_SIZE, x_size=X_SIZE,
+                                           bounds_enabled=BOUNDS_ENABLED, initial_speed=INITIAL_SPEED)
+        replay = snake_replay.ReplayWriter(REPLAY_FILE, header)
+
+    # Publish the board for external readers if requested
+    publisher = None
+    if SHARED_BOARD_NAME is not None:
+        publisher = snake_shared.BoardPublisher(SHARED_BOARD_NAME, state)
+
+    # Main loop: input is polled continuously while the ticks follow the speed of the snake
+    loop = snake_loop.FixedTimestepLoop(game_speed(state.snakes[0]) / 1000.0)
+    loop.start()
+    # Reversing the snake is not prevented, it runs over itself as in the original game
+    turn_queue = snake_input.TurnQueue(allow_reversal=True)
     must_end = False
     while not must_end and key != KEY_ESC:
-        # Print game
-        print_game_iteration(win, score, snake)
-
         # Process events
+        if instrumentation is not None:
+            input_start = instrumentation.clock()
         event = process_events(win)
+        if instrumentation is not None:
+            instrumentation.record(snake_instrument.SPAN_INPUT, input_start)
         if event is not None:
             if event == KEY_SPACE:
                 # SPACE BAR pressed, pause/resume game
                 must_end = wait_for_resume_game(win)
-                # Start the loop again
+                # Restart the schedule and the loop again
+                loop.start()
                 continue
+            elif event == KEY_ESC:
+                # ESC pressed, end game
+                break
             else:
                 key = event
-
-        # Move snake
-        must_end, snake, food, food_time, score = move_snake(win, key, snake, food, food_time, score)
-
-    return score
-
-
-def end_game(score):
+                queued = turn_queue.push(key_to_direction(key), state.directions[0])
+                if queued and instrumentation is not None:
+                    instrumentation.input_queued(0)
+
+        # Move snake on every due tick, applying one queued turn per tick
+        while not must_end and loop.due():
+            direction = turn_queue.pop()
+            if direction is not None and instrumentation is not None:
+                instrumentation.turn_applied(0)
+            if replay is not None:
+                replay.record([direction], state)
+            must_end = move_snake(renderer, direction, state, instrumentation, publisher)
+            # Increase snake speed with its length
+            loop.interval = game_speed(state.snakes[0]) / 1000.0
+
+        loop.idle()
+
+    if replay is not None:
+        replay.close()
+    if publisher is not None:
+        publisher.close()
+    return snake_leaderboard.GameResult(snake_leaderboard.MODE_SNAKE, seed, [PLAYER_NAME], state.scores, state.ticks,
+                                        time.time() - start_time)
+
+
+def end_game(result, instrumentation=None, leaderboard=None):
     """
     Ends the game window screen and show the result.
 
-    :param score: User score.
-        + type: int
+    :param result: Game result.
+        + type: snake_leaderboard.GameResult
+    :param instrumentation: Per-tick timings to dump, or None if disabled.
+        + type: snake_instrument.Instrumentation
+    :param leaderboard: Leaderboard recording the result, or None if disabled.
+        + type: snake_leaderboard.LeaderboardWriter
     :return: None
     """
     logger.debug("Ending game")
     # Close window screen
     curses.endwin()
 
+    # Dump the per-tick timings
+    if instrumentation is not None and INSTRUMENTATION_FILE is not None:
+        instrumentation.dump(INSTRUMENTATION_FILE)
+
+    # Record the score (written on the background)
+    if leaderboard is not None:
+        leaderboard.record(result)
+
     # Print score
     print()
-    print("FINAL SCORE = " + str(score))
+    print("FINAL SCORE = " + str(result.scores[0]))
     print()
 
 
@@ -330,9 +363,16 @@ def main():
     :return: None
     """
     logger.info("Snake game start")
+    if SHARED_BOARD_NAME is not None:
+        # Fail before the terminal enters the curses mode
+        snake_shared.check_board(1, Y_SIZE, X_SIZE)
+    instrumentation = snake_instrument.new_instrumentation(INSTRUMENTATION_FILE)
+    leaderboard = snake_leaderboard.new_writer(LEADERBOARD_FILE)
     win = init_game_screen()
-    score = run_game(win)
-    end_game(score)
+    result = run_game(win, instrumentation)
+    end_game(result, instrumentation, leaderboard)
+    if leaderboard is not None:
+        leaderboard.close()
     logger.info("Snake game end")
 
 
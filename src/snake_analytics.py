@@ -0,0 +1,573 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+import argparse
+from collections import Counter
+import json
+import logging
+import multiprocessing
+import os
+import sys
+
+import snake_engine
+from snake_replay import ReplayReader
+
+# CONSTANTS
+REPLAY_EXTENSION = ".replay"
+
+# Regions per side the starting positions are grouped in for the survival curves
+DEFAULT_REGIONS = 3
+# Ticks per step of the survival curves
+SURVIVAL_BIN_TICKS = 50
+
+# Replay files sent to a worker process at once, so faster workers take more of the archive
+FILES_PER_BATCH = 256
+
+# Events produced while streaming a replay
+EVENT_GAME = "game"  # (EVENT_GAME, header)
+EVENT_FOOD = "food"  # (EVENT_FOOD, player id, ticks to reach the food)
+EVENT_DEATH = "death"  # (EVENT_DEATH, player id, packed cell, cause)
+EVENT_SURVIVAL = "survival"  # (EVENT_SURVIVAL, player id, packed start cell, ticks alive, whether it died)
+EVENT_END = "end"  # (EVENT_END, ticks)
+
+# Causes of death
+CAUSE_SELF = "self"
+CAUSE_WALL = "wall"
+CAUSE_KILLED = "killed"
+
+# Shown entries of the printed summary
+TOP_KILL_CELLS = 10
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# STREAMING
+#
+
+def replay_files(paths):
+    """
+    Iterates the replay files of the given files and directories (recursively), without listing whole
+    directories in memory.
+
+    :param paths: Replay files and directories.
+        + type: List<str>
+    :return: Generator of the replay file paths.
+        + type: Generator<str>
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                for name in names:
+                    if name.endswith(REPLAY_EXTENSION):
+                        yield os.path.join(directory, name)
+        else:
+            yield path
+
+
+def batch_files(files, size=FILES_PER_BATCH):
+    """
+    Groups the replay files in batches.
+
+    :param files: Replay file paths.
+        + type: Iterable<str>
+    :param size: Files per batch.
+        + type: int
+    :return: Generator of the lists of file paths.
+        + type: Generator<List<str>>
+    """
+    batch = []
+    for path in files:
+        batch.append(path)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def game_events(path):
+    """
+    Re-simulates a replay one tick at a time and yields its events (see the EVENT_* constants). Only the state
+    of the current tick is kept in memory.
+
+    :param path: Replay file path.
+        + type: str
+    :return: Generator of events.
+        + type: Generator<Tuple>
+    :raise ValueError: If the replay is damaged (some events may have been produced already).
+    """
+    reader = ReplayReader(path)
+    try:
+        header = reader.header
+        state = header.new_state()
+        yield EVENT_GAME, header
+        num_players = state.num_players
+        starts = [snake.head() for snake in state.snakes]
+        food_ticks = [0] * num_players
+        deaths = [None] * num_players
+
+        for actions in reader.ticks():
+            if state.must_end:
+                break
+            # Cell each snake moves to and its owner before the tick, to tell the cause of the deaths
+            grid = state.grid
+            targets = [None] * num_players
+            for player_id in range(num_players):
+                if state.players_alive[player_id]:
+                    direction = actions[player_id] if actions[player_id] is not None else state.directions[player_id]
+                    cell = snake_engine.next_cell(state, state.snakes[player_id].head(), direction)
+                    targets[player_id] = (cell, grid[cell] if cell is not None else None)
+            foods = list(state.foods)
+
+            snake_engine.step(state, actions)
+
+            for player_id in range(num_players):
+                if targets[player_id] is None:
+                    continue
+                if not state.players_alive[player_id]:
+                    cell, owner = targets[player_id]
+                    if cell is None:
+                        yield EVENT_DEATH, player_id, None, CAUSE_WALL
+                    else:
+                        yield EVENT_DEATH, player_id, cell, CAUSE_SELF if owner == player_id else CAUSE_KILLED
+                    deaths[player_id] = state.ticks
+                elif state.foods[player_id] != foods[player_id]:
+                    yield EVENT_FOOD, player_id, state.ticks - food_ticks[player_id]
+                    food_ticks[player_id] = state.ticks
+
+        for player_id in range(num_players):
+            if deaths[player_id] is not None:
+                yield EVENT_SURVIVAL, player_id, starts[player_id], deaths[player_id], True
+            else:
+                yield EVENT_SURVIVAL, player_id, starts[player_id], state.ticks, False
+        yield EVENT_END, state.ticks
+    finally:
+        reader.close()
+
+
+#
+# ACCUMULATORS
+#
+
+class KillHeatmap(object):
+    """
+    Number of snakes killed by another snake on each cell, per board size.
+    """
+
+    def __init__(self):
+        """
+        Creates a new empty heatmap.
+        """
+        self.boards = {}
+
+    def add(self, y_size, x_size, cell):
+        """
+        Records a kill.
+
+        :param y_size: Board height.
+            + type: int
+        :param x_size: Board width.
+            + type: int
+        :param cell: Packed cell of the kill.
+            + type: int
+        :return: None
+        """
+        board = self.boards.get((y_size, x_size))
+        if board is None:
+            board = self.boards[(y_size, x_size)] = Counter()
+        board[cell] = board[cell] + 1
+
+    def merge(self, other):
+        """
+        Adds the kills of another heatmap.
+
+        :param other: Another heatmap.
+            + type: KillHeatmap
+        :return: None
+        """
+        for size, board in other.boards.items():
+            self.boards.setdefault(size, Counter()).update(board)
+
+    def to_dict(self):
+        """
+        Summarizes the heatmap.
+
+        :return: The (row, column, kills) of each cell with kills, by board size ("<height>x<width>").
+            + type: dict
+        """
+        result = {}
+        for (y_size, x_size), board in sorted(self.boards.items()):
+            cells = [list(divmod(cell, x_size)) + [board[cell]] for cell in sorted(board, key=lambda c: (-board[c], c))]
+            result[str(y_size) + "x" + str(x_size)] = cells
+        return result
+
+
+class TimeToFood(object):
+    """
+    Distribution of the ticks needed to reach each food since it appeared.
+    """
+
+    def __init__(self):
+        """
+        Creates a new empty distribution.
+        """
+        self.counts = Counter()
+        self.count = 0
+        self.total = 0
+
+    def add(self, ticks):
+        """
+        Records an eaten food.
+
+        :param ticks: Ticks since the food appeared.
+            + type: int
+        :return: None
+        """
+        self.counts[ticks] = self.counts[ticks] + 1
+        self.count = self.count + 1
+        self.total = self.total + ticks
+
+    def merge(self, other):
+        """
+        Adds the foods of another distribution.
+
+        :param other: Another distribution.
+            + type: TimeToFood
+        :return: None
+        """
+        self.counts.update(other.counts)
+        self.count = self.count + other.count
+        self.total = self.total + other.total
+
+    def percentile(self, p):
+        """
+        Returns a percentile of the ticks to food.
+
+        :param p: Percentile (0 - 100).
+            + type: float
+        :return: The percentile, or 0 without foods.
+            + type: int
+        """
+        rank = max(1, int(p / 100.0 * self.count + 0.5))
+        seen = 0
+        for ticks in sorted(self.counts):
+            seen = seen + self.counts[ticks]
+            if seen >= rank:
+                return ticks
+        return 0
+
+    def to_dict(self):
+        """
+        Summarizes the distribution.
+
+        :return: Number of foods, mean and percentiles of the ticks to food.
+            + type: dict
+        """
+        return {"foods": self.count, "mean_ticks": self.total / float(self.count) if self.count else 0.0,
+                "p50_ticks": self.percentile(50), "p90_ticks": self.percentile(90),
+                "p99_ticks": self.percentile(99)}
+
+
+class SurvivalCurves(object):
+    """
+    Survival curves (Kaplan-Meier estimates) of the snakes grouped by the region of the board where they started.
+    The boards are split in regions x regions areas. Snakes alive when their game ends are counted as censored.
+    """
+
+    def __init__(self, regions=DEFAULT_REGIONS):
+        """
+        Creates new empty curves.
+
+        :param regions: Regions per side of the board.
+            + type: int
+        """
+        self.regions = regions
+        # Deaths and censored snakes of each region by bin of SURVIVAL_BIN_TICKS ticks
+        self.deaths = {}
+        self.censored = {}
+
+    def region(self, y_size, x_size, cell):
+        """
+        Returns the region of a starting cell.
+
+        :param y_size: Board height (including borders).
+            + type: int
+        :param x_size: Board width (including borders).
+            + type: int
+        :param cell: Packed starting cell.
+            + type: int
+        :return: The (row, column) of the region.
+            + type: Tuple<int, int>
+        """
+        y, x = divmod(cell, x_size)
+        return (y - 1) * self.regions // (y_size - 2), (x - 1) * self.regions // (x_size - 2)
+
+    def add(self, region, ticks, died):
+        """
+        Records the lifetime of a snake.
+
+        :param region: Region of its starting cell.
+            + type: Tuple<int, int>
+        :param ticks: Ticks alive.
+            + type: int
+        :param died: Whether it died (False if it was alive at the end of the game).
+            + type: boolean
+        :return: None
+        """
+        counts = self.deaths if died else self.censored
+        region_counts = counts.get(region)
+        if region_counts is None:
+            region_counts = counts[region] = Counter()
+        region_counts[ticks // SURVIVAL_BIN_TICKS] = region_counts[ticks // SURVIVAL_BIN_TICKS] + 1
+
+    def merge(self, other):
+        """
+        Adds the lifetimes of other curves.
+
+        :param other: Other curves (same number of regions).
+            + type: SurvivalCurves
+        :return: None
+        """
+        for counts, other_counts in ((self.deaths, other.deaths), (self.censored, other.censored)):
+            for region, region_counts in other_counts.items():
+                counts.setdefault(region, Counter()).update(region_counts)
+
+    def curve(self, region):
+        """
+        Computes the survival curve of a region.
+
+        :param region: Region.
+            + type: Tuple<int, int>
+        :return: The (tick, share of snakes still alive) at the end of each bin with deaths or censored snakes.
+            + type: List<Tuple<int, float>>
+        """
+        deaths = self.deaths.get(region, Counter())
+        censored = self.censored.get(region, Counter())
+        at_risk = sum(deaths.values()) + sum(censored.values())
+        survival = 1.0
+        curve = []
+        for step in sorted(set(deaths) | set(censored)):
+            if at_risk > 0:
+                survival = survival * (1.0 - deaths[step] / float(at_risk))
+            curve.append(((step + 1) * SURVIVAL_BIN_TICKS, survival))
+            at_risk = at_risk - deaths[step] - censored[step]
+        return curve
+
+    def to_dict(self):
+        """
+        Summarizes the curves.
+
+        :return: Snakes, deaths, median lifetime (None if more than half survived) and curve of each region,
+            by region ("<row>,<column>").
+            + type: dict
+        """
+        result = {}
+        for region in sorted(set(self.deaths) | set(self.censored)):
+            curve = self.curve(region)
+            deaths = sum(self.deaths.get(region, Counter()).values())
+            median = next((tick for tick, survival in curve if survival <= 0.5), None)
+            result[str(region[0]) + "," + str(region[1])] = {
+                "snakes": deaths + sum(self.censored.get(region, Counter()).values()), "deaths": deaths,
+                "median_ticks": median, "curve": [list(point) for point in curve]}
+        return result
+
+
+class ReplayAnalytics(object):
+    """
+    Statistics of a set of replays, built incrementally from their events. Partial statistics (e.g. of each
+    batch) are combined with merge.
+    """
+
+    def __init__(self, regions=DEFAULT_REGIONS):
+        """
+        Creates new empty statistics.
+
+        :param regions: Regions per side of the board for the survival curves.
+            + type: int
+        """
+        self.games = 0
+        self.ticks = 0
+        self.damaged = 0
+        self.causes = Counter()
+        self.kills = KillHeatmap()
+        self.time_to_food = TimeToFood()
+        self.survival = SurvivalCurves(regions)
+
+    def add_game(self, events):
+        """
+        Consumes the events of a game. The events are only added once the game has been read entirely, so a
+        damaged replay is counted as damaged and does not add partial statistics.
+
+        :param events: Events of a game.
+            + type: Iterable<Tuple>
+        :return: True if the game has been added.
+            + type: boolean
+        """
+        # The events of a game are few (no per-tick events), so they can be held until the game is read
+        try:
+            events = list(events)
+        except (ValueError, IOError) as e:
+            logger.warning("Damaged replay: " + str(e))
+            self.damaged = self.damaged + 1
+            return False
+
+        header = None
+        for event in events:
+            kind = event[0]
+            if kind == EVENT_GAME:
+                header = event[1]
+            elif kind == EVENT_FOOD:
+                self.time_to_food.add(event[2])
+            elif kind == EVENT_DEATH:
+                self.causes[event[3]] = self.causes[event[3]] + 1
+                if event[3] == CAUSE_KILLED:
+                    self.kills.add(header.y_size, header.x_size, event[2])
+            elif kind == EVENT_SURVIVAL:
+                self.survival.add(self.survival.region(header.y_size, header.x_size, event[2]), event[3], event[4])
+            elif kind == EVENT_END:
+                self.ticks = self.ticks + event[1]
+        self.games = self.games + 1
+        return True
+
+    def merge(self, other):
+        """
+        Adds the statistics of other replays.
+
+        :param other: Other statistics.
+            + type: ReplayAnalytics
+        :return: None
+        """
+        self.games = self.games + other.games
+        self.ticks = self.ticks + other.ticks
+        self.damaged = self.damaged + other.damaged
+        self.causes.update(other.causes)
+        self.kills.merge(other.kills)
+        self.time_to_food.merge(other.time_to_food)
+        self.survival.merge(other.survival)
+
+    def to_dict(self):
+        """
+        Summarizes the statistics.
+
+        :return: Games, ticks, damaged replays, causes of death, kill heatmaps, time to food and survival curves.
+            + type: dict
+        """
+        return {"games": self.games, "ticks": self.ticks, "damaged": self.damaged, "causes": dict(self.causes),
+                "kill_heatmaps": self.kills.to_dict(), "time_to_food": self.time_to_food.to_dict(),
+                "survival": self.survival.to_dict()}
+
+
+#
+# ANALYSIS
+#
+
+def analyze_batch(spec):
+    """
+    Streams a batch of replays into new statistics. Runs on the worker processes.
+
+    :param spec: Tuple with the replay file paths and the survival regions.
+        + type: Tuple<List<str>, int>
+    :return: The statistics of the batch.
+        + type: ReplayAnalytics
+    """
+    files, regions = spec
+    analytics = ReplayAnalytics(regions)
+    for path in files:
+        analytics.add_game(game_events(path))
+    return analytics
+
+
+def analyze(paths, workers=None, regions=DEFAULT_REGIONS):
+    """
+    Computes the statistics of a replay archive on a process pool. The archive is walked once, while the workers
+    analyze the batches of replays found so far. Every worker streams its replays one tick at a time and only the
+    aggregated statistics are sent back, so the memory used by the workers does not depend on the size of the
+    archive.
+
+    :param paths: Replay files and directories.
+        + type: List<str>
+    :param workers: Worker processes (defaults to the number of cores).
+        + type: int or None
+    :param regions: Regions per side of the board for the survival curves.
+        + type: int
+    :return: The statistics of the archive.
+        + type: ReplayAnalytics
+    """
+    workers = workers or multiprocessing.cpu_count()
+    analytics = ReplayAnalytics(regions)
+    pool = multiprocessing.Pool(workers)
+    try:
+        batches = ((files, regions) for files in batch_files(replay_files(paths)))
+        for batch_analytics in pool.imap_unordered(analyze_batch, batches):
+            analytics.merge(batch_analytics)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return analytics
+
+
+#
+# MAIN
+#
+
+def main():
+    """
+    Main function to compute the statistics of a replay archive.
+
+    :return: Exit code.
+        + type: int
+    """
+    parser = argparse.ArgumentParser(description="Snake replay analytics")
+    parser.add_argument("paths", nargs="+", help="Replay files or directories (searched for *" + REPLAY_EXTENSION +
+                                                 " files)")
+    parser.add_argument("--workers", type=int, help="Worker processes (defaults to the number of cores)")
+    parser.add_argument("--regions", type=int, default=DEFAULT_REGIONS,
+                        help="Regions per side of the board for the survival curves")
+    parser.add_argument("--output", help="Write the statistics to this JSON file")
+    args = parser.parse_args()
+    if args.regions < 1:
+        parser.error("The regions must be positive")
+
+    analytics = analyze(args.paths, args.workers, args.regions)
+    summary = analytics.to_dict()
+
+    print("Games:         " + str(summary["games"]) + " (" + str(summary["damaged"]) + " damaged replays skipped)")
+    print("Ticks:         " + str(summary["ticks"]))
+    print("Deaths:        " + ", ".join(cause + " " + str(count) for cause, count in sorted(summary["causes"].items())))
+    food = summary["time_to_food"]
+    print("Time to food:  %d foods, mean %.1f ticks, p50 %d, p90 %d, p99 %d" % (
+        food["foods"], food["mean_ticks"], food["p50_ticks"], food["p90_ticks"], food["p99_ticks"]))
+    for board, cells in summary["kill_heatmaps"].items():
+        print("Kill cells on " + board + " boards: " + ", ".join("(%d, %d) %d" % tuple(cell)
+                                                                 for cell in cells[:TOP_KILL_CELLS]))
+    print()
+    print("%-8s %8s %8s %14s" % ("region", "snakes", "deaths", "median ticks"))
+    for region, stats in summary["survival"].items():
+        median = str(stats["median_ticks"]) if stats["median_ticks"] is not None else "-"
+        print("%-8s %8d %8d %14s" % (region, stats["snakes"], stats["deaths"], median))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+#
+# ENTRY POINT
+#
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s | %(levelname)s | %(name)s - %(message)s')
+    sys.exit(main())
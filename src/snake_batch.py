@@ -0,0 +1,242 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+import logging
+
+import numpy as np
+
+from snake_engine import Y_SIZE, X_SIZE, BOUNDS_ENABLED, MAX_SCORE_PER_FOOD, INITIAL_SPEED, TOP_SPEED, DIRECTION_MOVES
+from snake_engine import INITIAL_SNAKE, INITIAL_FOOD, INITIAL_DIRECTION, CELL_EMPTY, CELL_SNAKE, CELL_FOOD
+
+# CONSTANTS
+# Extra cell content used on the observations to distinguish the snake head
+CELL_HEAD = 3
+
+# Action used to keep the current direction
+NO_ACTION = -1
+
+# Rejection sampling rounds before falling back to a full board scan when spawning foods
+FOOD_SAMPLING_ROUNDS = 8
+
+MOVES_Y = np.array([move[0] for move in DIRECTION_MOVES], dtype=np.int32)
+MOVES_X = np.array([move[1] for move in DIRECTION_MOVES], dtype=np.int32)
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# BATCH ENVIRONMENT
+#
+
+class BatchSnakeEnv(object):
+    """
+    Runs N single player Snake games in lockstep using NumPy arrays.
+
+    Every game follows the same rules as the single player engine (wraparound or bounds, self collision,
+    eating and growing, food respawn on a free cell). Games that end are automatically reset, so the
+    observation returned for a finished game is already the first one of the next game.
+
+    Every game starts from the same state as the engine (INITIAL_SNAKE, INITIAL_FOOD and INITIAL_DIRECTION). The
+    next foods are sampled from a NumPy generator, so they do not follow the engine ones for the same seed.
+    """
+
+    def __init__(self, num_games, y_size=Y_SIZE, x_size=X_SIZE, bounds_enabled=BOUNDS_ENABLED,
+                 initial_speed=INITIAL_SPEED, seed=None):
+        """
+        Creates a new batch of games.
+
+        :param num_games: Number of games stepped together.
+            + type: int
+        :param y_size: Board height (including borders).
+            + type: int
+        :param x_size: Board width (including borders).
+            + type: int
+        :param bounds_enabled: Whether crossing the borders kills the snake instead of wrapping around.
+            + type: boolean
+        :param initial_speed: Tick duration in milliseconds of the initial snakes, used to score the eaten foods.
+            + type: int
+        :param seed: Seed of the random number generator.
+            + type: int or None
+        """
+        self.num_games = num_games
+        self.y_size = y_size
+        self.x_size = x_size
+        self.bounds_enabled = bounds_enabled
+        self.initial_speed = initial_speed
+        self.rng = np.random.default_rng(seed)
+
+        # Maximum snake length is the number of playable cells
+        self.capacity = (y_size - 2) * (x_size - 2)
+        self._games = np.arange(num_games)
+
+        # Playable cells mask (borders excluded), used when sampling foods
+        playable = np.zeros((y_size, x_size), dtype=bool)
+        playable[1:-1, 1:-1] = True
+        self._playable = playable.reshape(-1)
+
+        # Snake bodies as ring buffers of packed cells (y * x_size + x)
+        self.bodies = np.zeros((num_games, self.capacity), dtype=np.int32)
+        self.starts = np.zeros(num_games, dtype=np.int64)
+        self.lengths = np.zeros(num_games, dtype=np.int64)
+
+        # Occupancy of each board and per game values
+        self.boards = np.zeros((num_games, y_size * x_size), dtype=bool)
+        self.foods = np.zeros(num_games, dtype=np.int64)
+        self.food_ms = np.zeros(num_games, dtype=np.int64)
+        self.directions = np.zeros(num_games, dtype=np.int64)
+        self.scores = np.zeros(num_games, dtype=np.int64)
+        self.ticks = np.zeros(num_games, dtype=np.int64)
+        self.elapsed_ms = np.zeros(num_games, dtype=np.int64)
+
+        self.reset()
+
+    def reset(self, mask=None):
+        """
+        Resets the given games (all of them by default) to their initial state.
+
+        :param mask: Boolean mask of the games to reset.
+            + type: numpy.ndarray or None
+        :return: The observations of all the games.
+            + type: numpy.ndarray
+        """
+        games = self._games if mask is None else np.flatnonzero(mask)
+        if len(games) > 0:
+            initial_cells = [pos[0] * self.x_size + pos[1] for pos in INITIAL_SNAKE]
+            self.boards[games] = False
+            self.bodies[games, :len(initial_cells)] = initial_cells
+            self.starts[games] = 0
+            self.lengths[games] = len(initial_cells)
+            for cell in initial_cells:
+                self.boards[games, cell] = True
+            self.directions[games] = INITIAL_DIRECTION
+            self.scores[games] = 0
+            self.ticks[games] = 0
+            self.elapsed_ms[games] = 0
+            self.foods[games] = INITIAL_FOOD[0] * self.x_size + INITIAL_FOOD[1]
+            self.food_ms[games] = 0
+        return self.observe()
+
+    def observe(self):
+        """
+        Builds the observation of all the games.
+
+        :return: Array of shape (num_games, y_size, x_size) with the CELL_* content of each cell.
+            + type: numpy.ndarray
+        """
+        obs = self.boards.view(np.int8) * np.int8(CELL_SNAKE - CELL_EMPTY) + np.int8(CELL_EMPTY)
+        obs[self._games, self.foods] = CELL_FOOD
+        obs[self._games, self.bodies[self._games, self.starts]] = CELL_HEAD
+        return obs.reshape(self.num_games, self.y_size, self.x_size)
+
+    def speeds(self):
+        """
+        Calculates the duration of the next tick of each game, as snake_engine.game_speed.
+
+        :return: The tick durations in milliseconds.
+            + type: numpy.ndarray
+        """
+        increase_speed = (5 * (self.lengths / 5 + self.lengths / 10)).astype(np.int64)
+        return self.initial_speed - increase_speed % (self.initial_speed - TOP_SPEED)
+
+    def step(self, actions=None):
+        """
+        Advances all the games one tick.
+
+        :param actions: Direction of each game (NO_ACTION to keep the current one).
+            + type: numpy.ndarray or None
+        :return: A tuple with the observations, the rewards (score increase) and whether each game ended
+            before being reset.
+            + type: Tuple<numpy.ndarray, numpy.ndarray, numpy.ndarray>
+        """
+        games = self._games
+        x_size = self.x_size
+        y_size = self.y_size
+
+        # Update directions
+        if actions is not None:
+            actions = np.asarray(actions)
+            self.directions = np.where(actions != NO_ACTION, actions, self.directions)
+
+        # Calculates the new heads
+        heads = self.bodies[games, self.starts]
+        head_y = heads // x_size + MOVES_Y[self.directions]
+        head_x = heads % x_size + MOVES_X[self.directions]
+        if self.bounds_enabled:
+            out = (head_y == 0) | (head_y == y_size - 1) | (head_x == 0) | (head_x == x_size - 1)
+            head_y = np.clip(head_y, 0, y_size - 1)
+            head_x = np.clip(head_x, 0, x_size - 1)
+        else:
+            # If snake crosses the boundaries, make it enter from the other side
+            out = np.zeros(self.num_games, dtype=bool)
+            head_y = np.where(head_y == 0, y_size - 2, np.where(head_y == y_size - 1, 1, head_y))
+            head_x = np.where(head_x == 0, x_size - 2, np.where(head_x == x_size - 1, 1, head_x))
+        new_heads = head_y * x_size + head_x
+
+        # Snake runs over itself (the tail has not moved yet) or crosses the bounds
+        dead = out | self.boards[games, new_heads]
+        alive = ~dead
+        eat = alive & (new_heads == self.foods)
+        self.ticks = self.ticks + 1
+        self.elapsed_ms = self.elapsed_ms + self.speeds()
+
+        # Advance the heads of the alive snakes
+        moving = np.flatnonzero(alive)
+        self.starts[moving] = (self.starts[moving] - 1) % self.capacity
+        self.bodies[moving, self.starts[moving]] = new_heads[moving]
+        self.boards[moving, new_heads[moving]] = True
+        self.lengths[moving] = self.lengths[moving] + 1
+
+        # Decrease snake size of the ones that have not eaten
+        shrinking = np.flatnonzero(alive & ~eat)
+        tails = self.bodies[shrinking, (self.starts[shrinking] + self.lengths[shrinking] - 1) % self.capacity]
+        self.boards[shrinking, tails] = False
+        self.lengths[shrinking] = self.lengths[shrinking] - 1
+
+        # Increase the score of the ones that have eaten
+        eating = np.flatnonzero(eat)
+        rewards = np.zeros(self.num_games, dtype=np.int64)
+        elapsed = (self.elapsed_ms[eating] - self.food_ms[eating]) / 1000.0
+        rewards[eating] = (MAX_SCORE_PER_FOOD / (elapsed + 1)).astype(np.int64)
+        self.scores = self.scores + rewards
+
+        # A snake filling the whole board also ends the game
+        done = dead | (self.lengths == self.capacity)
+        self._spawn_foods(eating[~done[eating]])
+
+        # Reset finished games
+        obs = self.reset(done)
+        return obs, rewards, done
+
+    def _spawn_foods(self, games):
+        """
+        Places a new food on a random free cell of each given game.
+
+        :param games: Indexes of the games that need a new food.
+            + type: numpy.ndarray
+        :return: None
+        """
+        # Cheap rejection sampling of playable cells, good while the boards are not almost full
+        pending = games
+        for _ in range(FOOD_SAMPLING_ROUNDS):
+            if len(pending) == 0:
+                break
+            cells = (self.rng.integers(1, self.y_size - 1, len(pending)) * self.x_size
+                     + self.rng.integers(1, self.x_size - 1, len(pending)))
+            self.foods[pending] = cells
+            pending = pending[self.boards[pending, cells]]
+
+        # Unlucky games pick the free cell with the highest random priority (occupied cells and borders never win)
+        if len(pending) > 0:
+            priorities = self.rng.random((len(pending), self.y_size * self.x_size))
+            priorities[self.boards[pending] | ~self._playable] = -1.0
+            self.foods[pending] = np.argmax(priorities, axis=1)
+        self.food_ms[games] = self.elapsed_ms[games]
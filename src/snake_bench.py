@@ -0,0 +1,356 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+import argparse
+import json
+import logging
+import platform
+import random
+import sys
+import time
+
+import snake_engine
+import snake_render
+from snake_engine import DIR_RIGHT
+
+# CONSTANTS
+BENCH_FORMAT_VERSION = 1
+DEFAULT_TICKS = 2000
+WARMUP_TICKS = 50
+
+# Relative slowdown of the ticks per second reported as a regression against the baseline
+DEFAULT_TOLERANCE = 0.10
+
+# Window size of the rendering benchmarks
+WINDOW_Y_SIZE = 40
+WINDOW_X_SIZE = 100
+
+PERCENTILES = [50, 90, 99]
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# SCENARIOS
+#
+
+class Scenario(object):
+    """
+    Benchmark scenario: a board with straight snakes moving right, one per row, so they never collide.
+
+    The food density is the probability that, on each tick, the food of every snake is placed right in front
+    of its head: 0 means that the snakes never eat (only the move path is measured), 1 that they eat on
+    every tick (growth and food spawning on every tick). A run starts again when a growing snake reaches
+    its tail.
+    """
+
+    def __init__(self, name, kind, y_size, x_size, num_players, length, food_density):
+        """
+        Creates a new scenario.
+
+        :param name: Scenario name.
+            + type: str
+        :param kind: "sim" to measure the engine step or "render" to measure the renderer on a fake window.
+            + type: str
+        :param y_size: Board height (including borders).
+            + type: int
+        :param x_size: Board width (including borders).
+            + type: int
+        :param num_players: Number of snakes.
+            + type: int
+        :param length: Initial length of the snakes.
+            + type: int
+        :param food_density: Probability of eating on each tick.
+            + type: float
+        """
+        self.name = name
+        self.kind = kind
+        self.y_size = y_size
+        self.x_size = x_size
+        self.num_players = num_players
+        self.length = length
+        self.food_density = food_density
+
+    def new_state(self, seed):
+        """
+        Builds the initial state of the scenario.
+
+        :param seed: Seed of the game.
+            + type: int
+        :return: The game state.
+            + type: GameState
+        """
+        snakes = []
+        for player_id in range(self.num_players):
+            y = 2 * player_id + 1
+            snakes.append([[y, x] for x in range(self.length, 0, -1)])
+        foods = [[2 * player_id + 2, 1] for player_id in range(self.num_players)]
+        return snake_engine.GameState(snakes, foods, [DIR_RIGHT] * self.num_players, y_size=self.y_size,
+                                      x_size=self.x_size, rng=random.Random(seed))
+
+    def feed(self, state, rng):
+        """
+        Places the foods in front of the snakes following the food density.
+
+        :param state: Game state.
+            + type: GameState
+        :param rng: Random number generator of the scenario.
+            + type: random.Random
+        :return: None
+        """
+        if self.food_density <= 0 or rng.random() >= self.food_density:
+            return
+        for player_id, snake in enumerate(state.snakes):
+            if state.players_alive[player_id]:
+                state.set_food(player_id, snake_engine.next_cell(state, snake.head(), DIR_RIGHT))
+
+
+def default_scenarios():
+    """
+    Builds the default scenarios, covering board sizes, snake lengths, player counts and food densities for
+    both the simulation and the rendering.
+
+    :return: List of scenarios.
+        + type: List<Scenario>
+    """
+    scenarios = []
+    # Board sizes
+    for y_size, x_size in [(40, 100), (1000, 1000), (10000, 10000)]:
+        name = "sim-board-" + str(y_size) + "x" + str(x_size)
+        scenarios.append(Scenario(name, "sim", y_size, x_size, 4, 3, 0.1))
+    # Snake lengths (the row is long enough for the snake not to reach its tail)
+    for length in [3, 100, 1000, 10000]:
+        scenarios.append(Scenario("sim-length-" + str(length), "sim", 40, length + 10, 1, length, 0.0))
+    # Player counts
+    for num_players in [1, 4, 100, 400]:
+        scenarios.append(Scenario("sim-players-" + str(num_players), "sim", 1000, 1000, num_players, 10, 0.1))
+    # Food densities
+    for food_density in [0.0, 0.1, 1.0]:
+        scenarios.append(Scenario("sim-food-" + str(food_density), "sim", 40, 100, 4, 3, food_density))
+    # Rendering: whole board on the window and viewport on huge boards
+    scenarios.append(Scenario("render-board-40x100", "render", 40, 100, 4, 3, 0.1))
+    scenarios.append(Scenario("render-viewport-10000x10000", "render", 10000, 10000, 4, 3, 0.1))
+    scenarios.append(Scenario("render-players-100", "render", 1000, 1000, 100, 10, 0.1))
+    return scenarios
+
+
+#
+# FAKE WINDOW
+#
+
+class FakeWindow(object):
+    """
+    Window with the curses methods used by the renderers, storing the characters in memory.
+    """
+
+    def __init__(self, height=WINDOW_Y_SIZE, width=WINDOW_X_SIZE):
+        """
+        Creates a new empty window.
+
+        :param height: Window height.
+            + type: int
+        :param width: Window width.
+            + type: int
+        """
+        self.height = height
+        self.width = width
+        self.cells = [[' '] * width for _ in range(height)]
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def addch(self, y, x, ch, attr=0):
+        self.cells[y][x] = ch
+
+    def addstr(self, y, x, text, attr=0):
+        row = self.cells[y]
+        for i, ch in enumerate(text[:self.width - x]):
+            row[x + i] = ch
+
+    def border(self, *args):
+        pass
+
+    def noutrefresh(self):
+        pass
+
+
+#
+# MEASUREMENTS
+#
+
+def percentile(sorted_values, p):
+    """
+    Returns a percentile of sorted values (nearest rank).
+
+    :param sorted_values: Sorted values.
+        + type: List<float>
+    :param p: Percentile (0 - 100).
+        + type: int
+    :return: The percentile.
+        + type: float
+    """
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def new_run(scenario, seed):
+    """
+    Builds the state and, for the rendering scenarios, the renderer of a scenario run.
+
+    :param scenario: Scenario to run.
+        + type: Scenario
+    :param seed: Seed of the game.
+        + type: int
+    :return: A tuple with the game state and the renderer (None for the simulation scenarios).
+        + type: Tuple<GameState, Renderer or None>
+    """
+    state = scenario.new_state(seed)
+    if scenario.kind != "render":
+        return state, None
+    colors = [1] * scenario.num_players
+    renderer = snake_render.new_renderer(FakeWindow(), state, colors, colors, color_attr=lambda color: color,
+                                         flush=lambda: None)
+    renderer.draw(state.initial_diffs(), state.scores)
+    return state, renderer
+
+
+def run_scenario(scenario, ticks=DEFAULT_TICKS, seed=0):
+    """
+    Runs a scenario measuring the duration of each tick.
+
+    :param scenario: Scenario to run.
+        + type: Scenario
+    :param ticks: Measured ticks.
+        + type: int
+    :param seed: Seed of the scenario.
+        + type: int
+    :return: The result of the scenario.
+        + type: dict
+    """
+    rng = random.Random(seed)
+    state, renderer = new_run(scenario, seed)
+    durations = []
+    clock = time.perf_counter
+    step = snake_engine.step
+    for tick in range(WARMUP_TICKS + ticks):
+        scenario.feed(state, rng)
+        if renderer is None:
+            start = clock()
+            step(state, None)
+            duration = clock() - start
+        else:
+            diffs = step(state, None)
+            start = clock()
+            renderer.draw(diffs, state.scores)
+            duration = clock() - start
+        if tick >= WARMUP_TICKS:
+            durations.append(duration)
+        if False in state.players_alive:
+            # A growing snake reached its tail, start again
+            state, renderer = new_run(scenario, seed + tick + 1)
+
+    durations.sort()
+    total = sum(durations)
+    result = {
+        "name": scenario.name,
+        "kind": scenario.kind,
+        "ticks": len(durations),
+        "ticks_per_second": len(durations) / total if total > 0 else 0.0,
+        "max_us": durations[-1] * 1e6 if durations else 0.0,
+    }
+    for p in PERCENTILES:
+        result["p" + str(p) + "_us"] = percentile(durations, p) * 1e6 if durations else 0.0
+    return result
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares the results against a baseline.
+
+    :param results: Results of the current run.
+        + type: List<dict>
+    :param baseline: Results of the baseline run.
+        + type: List<dict>
+    :param tolerance: Relative slowdown of the ticks per second reported as a regression.
+        + type: float
+    :return: List of (name, baseline ticks per second, current ticks per second, relative change, regressed).
+        + type: List<Tuple<str, float, float, float, boolean>>
+    """
+    baseline_by_name = dict((result["name"], result) for result in baseline)
+    comparison = []
+    for result in results:
+        base = baseline_by_name.get(result["name"])
+        if base is None or base["ticks_per_second"] <= 0:
+            continue
+        change = result["ticks_per_second"] / base["ticks_per_second"] - 1.0
+        comparison.append((result["name"], base["ticks_per_second"], result["ticks_per_second"], change,
+                           change < -tolerance))
+    return comparison
+
+
+#
+# MAIN
+#
+
+def main():
+    """
+    Main function to run the benchmarks.
+
+    :return: Exit code (1 if there are regressions against the baseline).
+        + type: int
+    """
+    parser = argparse.ArgumentParser(description="Snake benchmarks")
+    parser.add_argument("--ticks", type=int, default=DEFAULT_TICKS, help="Measured ticks per scenario")
+    parser.add_argument("--filter", default="", help="Only run the scenarios containing this text")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare the results against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    results = []
+    print("%-32s %8s %14s %10s %10s %10s %10s" % ("scenario", "ticks", "ticks/s", "p50 us", "p90 us", "p99 us",
+                                                  "max us"))
+    for scenario in default_scenarios():
+        if args.filter not in scenario.name:
+            continue
+        result = run_scenario(scenario, args.ticks)
+        results.append(result)
+        print("%-32s %8d %14.1f %10.1f %10.1f %10.1f %10.1f" % (result["name"], result["ticks"],
+                                                                result["ticks_per_second"], result["p50_us"],
+                                                                result["p90_us"], result["p99_us"], result["max_us"]))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"version": BENCH_FORMAT_VERSION, "python": platform.python_version(), "results": results}, f,
+                      indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = 0
+        print()
+        for name, base, current, change, regressed in compare(results, baseline, args.tolerance):
+            print("%-32s %14.1f -> %14.1f %+7.1f%% %s" % (name, base, current, change * 100,
+                                                          "REGRESSION" if regressed else ""))
+            regressions = regressions + int(regressed)
+        if regressions:
+            return 1
+    return 0
+
+
+#
+# ENTRY POINT
+#
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s | %(levelname)s | %(name)s - %(message)s')
+    sys.exit(main())
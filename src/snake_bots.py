@@ -0,0 +1,595 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+from array import array
+from collections import deque
+import heapq
+import importlib
+import logging
+import time
+import weakref
+
+from snake_engine import DIRECTIONS, OPPOSITE_DIRECTIONS, NO_OWNER, next_cell
+
+# CONSTANTS
+# Thinking time of each bot on each tick, in seconds (late directions are ignored)
+BOT_TIME_BUDGET = 0.002
+
+# Distance of the cells that cannot reach the target
+UNREACHABLE = 1 << 30
+
+# Boards with more cells than this are too big for the distance fields (the path policy moves greedily)
+PATHFINDING_MAX_CELLS = 1 << 16
+
+# Extra moves kept exact on the distance fields beyond the distance of the bots using them
+HORIZON_SLACK = 4
+
+# Nodes expanded by the searches between two deadline checks
+DEADLINE_CHECK_NODES = 64
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+# Neighbour tables by board (y_size, x_size, bounds_enabled)
+_neighbour_tables = {}
+
+# Path cache of each game state
+_path_caches = weakref.WeakKeyDictionary()
+
+
+#
+# HELPER METHODS
+#
+
+def wrapped_distance(a, b, size):
+    """
+    Distance between two coordinates of a board axis that wraps around its borders.
+
+    :param a: First coordinate.
+        + type: int
+    :param b: Second coordinate.
+        + type: int
+    :param size: Playable size of the axis.
+        + type: int
+    :return: The distance.
+        + type: int
+    """
+    d = abs(a - b) % size
+    return min(d, size - d)
+
+
+def cell_distance(state, a, b):
+    """
+    Moves between two cells on an empty board (a lower bound of the path length).
+
+    :param state: Game state.
+        + type: GameState
+    :param a: First packed cell.
+        + type: int
+    :param b: Second packed cell.
+        + type: int
+    :return: The distance.
+        + type: int
+    """
+    a_y, a_x = divmod(a, state.x_size)
+    b_y, b_x = divmod(b, state.x_size)
+    return wrapped_distance(a_y, b_y, state.y_size - 2) + wrapped_distance(a_x, b_x, state.x_size - 2)
+
+
+#
+# PATHFINDING
+#
+
+def neighbour_table(state):
+    """
+    Returns the neighbour cells of every cell of the board, following the wrap around and bounds rules.
+    Tables are built once per board size and shared by all the games.
+
+    :param state: Game state.
+        + type: GameState
+    :return: Neighbour cells of each packed cell (empty for the border cells).
+        + type: List<Tuple<int>>
+    """
+    key = (state.y_size, state.x_size, state.bounds_enabled)
+    table = _neighbour_tables.get(key)
+    if table is None:
+        table = [()] * (state.y_size * state.x_size)
+        for y in range(1, state.y_size - 1):
+            for x in range(1, state.x_size - 1):
+                cell = y * state.x_size + x
+                neighbours = (next_cell(state, cell, direction) for direction in DIRECTIONS)
+                table[cell] = tuple(neighbour for neighbour in neighbours if neighbour is not None)
+        _neighbour_tables[key] = table
+    return table
+
+
+class DistanceField(object):
+    """
+    Moves from every cell of the board to a target cell, avoiding the snakes.
+
+    The field is computed once with a BFS from the target and then repaired incrementally when cells are
+    occupied or freed: the cells whose shortest paths all went through a newly occupied cell are invalidated,
+    and the invalidated and freed cells are settled again with a multi-source BFS seeded from their valid
+    neighbours. A tick only touches the cells around the snake heads and tails, instead of the whole board.
+
+    Only the distances up to the horizon are kept exact: the cells farther from the target just hold a value
+    bigger than the horizon. Bots approaching the target lower the horizon, so the changes behind them are
+    skipped, and a full computation raises it again when needed.
+    """
+
+    def __init__(self, state, target):
+        """
+        Computes the distance field of a target.
+
+        :param state: Game state.
+            + type: GameState
+        :param target: Packed target cell (reachable even if a snake is on it).
+            + type: int
+        """
+        self.target = target
+        self.table = neighbour_table(state)
+        self.dist = array('i', [UNREACHABLE]) * (state.y_size * state.x_size)
+        self.horizon = UNREACHABLE - 1
+        self.compute(state.grid)
+
+    def compute(self, grid):
+        """
+        Computes the whole field from scratch, without horizon.
+
+        :param grid: Occupancy grid of the board.
+            + type: array<int>
+        :return: None
+        """
+        self.horizon = UNREACHABLE - 1
+        dist = array('i', [UNREACHABLE]) * len(self.dist)
+        table = self.table
+        dist[self.target] = 0
+        queue = deque([self.target])
+        pop = queue.popleft
+        push = queue.append
+        while queue:
+            cell = pop()
+            d = dist[cell] + 1
+            for neighbour in table[cell]:
+                if dist[neighbour] == UNREACHABLE and grid[neighbour] == NO_OWNER:
+                    dist[neighbour] = d
+                    push(neighbour)
+        self.dist = dist
+
+    def update(self, grid, cells):
+        """
+        Repairs the field after some cells have been occupied or freed.
+
+        :param grid: Current occupancy grid of the board.
+            + type: array<int>
+        :param cells: Packed cells that may have changed since the last update.
+            + type: Iterable<int>
+        :return: None
+        """
+        dist = self.dist
+        table = self.table
+        target = self.target
+        horizon = self.horizon
+
+        # Invalidate the cells that lost all their shortest paths
+        affected = set()
+        seeds = []
+        for cell in cells:
+            if cell == target or cell in affected:
+                continue
+            if grid[cell] == NO_OWNER:
+                if dist[cell] > horizon:
+                    seeds.append(cell)
+                continue
+            if dist[cell] > horizon:
+                dist[cell] = UNREACHABLE
+                continue
+            affected.add(cell)
+            queue = [cell]
+            for parent in queue:
+                d = dist[parent]
+                if d >= horizon:
+                    continue
+                for child in table[parent]:
+                    if dist[child] != d + 1 or child in affected:
+                        continue
+                    if grid[child] == NO_OWNER:
+                        # Still valid if another parent keeps its distance
+                        for other in table[child]:
+                            if dist[other] == d and other not in affected and \
+                                    (grid[other] == NO_OWNER or other == target):
+                                break
+                        else:
+                            affected.add(child)
+                            queue.append(child)
+                    else:
+                        affected.add(child)
+                        queue.append(child)
+        if not affected and not seeds:
+            return
+        for cell in affected:
+            dist[cell] = UNREACHABLE
+
+        # Settle the invalidated and freed cells from their valid neighbours: multi-source BFS where the
+        # sources (sorted by distance) are merged with the BFS queue, which is sorted as well
+        sources = []
+        for cell in seeds + list(affected):
+            if grid[cell] != NO_OWNER:
+                continue
+            best = UNREACHABLE
+            for neighbour in table[cell]:
+                if dist[neighbour] < best:
+                    best = dist[neighbour]
+            if best < horizon:
+                sources.append((best + 1, cell))
+        sources.sort(reverse=True)
+        queue = deque()
+        while sources or queue:
+            if queue and (not sources or queue[0][0] <= sources[-1][0]):
+                d, cell = queue.popleft()
+            else:
+                d, cell = sources.pop()
+            if d >= dist[cell]:
+                continue
+            dist[cell] = d
+            d = d + 1
+            if d > horizon:
+                continue
+            for neighbour in table[cell]:
+                if d < dist[neighbour] and grid[neighbour] == NO_OWNER:
+                    queue.append((d, neighbour))
+
+
+class PathCache(object):
+    """
+    Distance fields to the foods of a game, shared by all its bots and kept in sync with the snakes.
+
+    The cache mirrors the body of every snake to find the cells occupied and freed on each tick (the new
+    heads and the popped tails) without scanning the board. The field of a food is dropped when no player
+    has its food on that cell anymore.
+    """
+
+    def __init__(self, state):
+        """
+        Creates a new empty cache for a game.
+
+        :param state: Game state.
+            + type: GameState
+        """
+        self.fields = {}
+        self._mirrors = [deque(snake) for snake in state.snakes]
+        self._ticks = state.ticks
+
+    def sync(self, state):
+        """
+        Updates the fields with the cells changed since the last synced tick.
+
+        :param state: Game state.
+            + type: GameState
+        :return: None
+        """
+        if state.ticks == self._ticks:
+            return
+        if state.ticks != self._ticks + 1:
+            # Skipped ticks (or a restored state), start again
+            self.fields.clear()
+            self._mirrors = [deque(snake) for snake in state.snakes]
+            self._ticks = state.ticks
+            return
+
+        changed = []
+        for mirror, snake in zip(self._mirrors, state.snakes):
+            if not len(snake):
+                changed.extend(mirror)
+                mirror.clear()
+                continue
+            head = snake.head()
+            if mirror[0] != head:
+                mirror.appendleft(head)
+                changed.append(head)
+            while len(mirror) > len(snake):
+                changed.append(mirror.pop())
+        self._ticks = state.ticks
+
+        for target in list(self.fields):
+            if target not in state.food_owners:
+                del self.fields[target]
+        grid = state.grid
+        for field in self.fields.values():
+            field.update(grid, changed)
+
+    def field(self, state, target):
+        """
+        Returns the distance field of a target cell, computing it if needed.
+
+        :param state: Game state.
+            + type: GameState
+        :param target: Packed target cell.
+            + type: int
+        :return: The distance field.
+            + type: DistanceField
+        """
+        self.sync(state)
+        field = self.fields.get(target)
+        if field is None:
+            field = DistanceField(state, target)
+            self.fields[target] = field
+        return field
+
+
+def path_cache(state):
+    """
+    Returns the path cache of a game, creating it on the first call.
+
+    :param state: Game state.
+        + type: GameState
+    :return: The synced path cache.
+        + type: PathCache
+    """
+    cache = _path_caches.get(state)
+    if cache is None:
+        cache = PathCache(state)
+        _path_caches[state] = cache
+    cache.sync(state)
+    return cache
+
+
+def find_path(state, start, goal, deadline=None):
+    """
+    Finds a shortest path between two cells avoiding the snakes (A* with the wrapped distance).
+
+    :param state: Game state.
+        + type: GameState
+    :param start: Packed start cell (e.g. a snake head).
+        + type: int
+    :param goal: Packed goal cell (reachable even if a snake is on it).
+        + type: int
+    :param deadline: time.perf_counter time at which the search gives up, or None.
+        + type: float or None
+    :return: The cells from the first move to the goal, or None if there is no path (or no time left).
+        + type: List<int> or None
+    """
+    grid = state.grid
+    parents = {start: None}
+    costs = {start: 0}
+    heap = [(cell_distance(state, start, goal), 0, start)]
+    expanded = 0
+    while heap:
+        _, cost, cell = heapq.heappop(heap)
+        if cell == goal:
+            path = []
+            while cell != start:
+                path.append(cell)
+                cell = parents[cell]
+            path.reverse()
+            return path
+        if cost > costs[cell]:
+            continue
+        expanded = expanded + 1
+        if deadline is not None and expanded % DEADLINE_CHECK_NODES == 0 and time.perf_counter() > deadline:
+            return None
+        for direction in DIRECTIONS:
+            neighbour = next_cell(state, cell, direction)
+            if neighbour is None or (grid[neighbour] != NO_OWNER and neighbour != goal):
+                continue
+            if neighbour not in costs or cost + 1 < costs[neighbour]:
+                costs[neighbour] = cost + 1
+                parents[neighbour] = cell
+                heapq.heappush(heap, (cost + 1 + cell_distance(state, neighbour, goal), cost + 1, neighbour))
+    return None
+
+
+def reachable_area(state, start, limit, deadline=None):
+    """
+    Counts the free cells reachable from a cell, up to a limit.
+
+    :param state: Game state.
+        + type: GameState
+    :param start: Packed free cell.
+        + type: int
+    :param limit: Maximum cells to count.
+        + type: int
+    :param deadline: time.perf_counter time at which the count stops, or None.
+        + type: float or None
+    :return: The number of reachable cells (at most limit).
+        + type: int
+    """
+    grid = state.grid
+    seen = {start}
+    queue = deque([start])
+    while queue and len(seen) < limit:
+        if deadline is not None and len(seen) % DEADLINE_CHECK_NODES == 0 and time.perf_counter() > deadline:
+            break
+        cell = queue.popleft()
+        for direction in DIRECTIONS:
+            neighbour = next_cell(state, cell, direction)
+            if neighbour is not None and neighbour not in seen and grid[neighbour] == NO_OWNER:
+                seen.add(neighbour)
+                queue.append(neighbour)
+    return min(len(seen), limit)
+
+
+#
+# POLICIES
+#
+
+def greedy_policy(state, player_id, deadline=None):
+    """
+    Moves towards the own food avoiding the occupied cells. Only the neighbour cells of the head are
+    checked on the occupancy grid, so the cost per snake does not depend on the number of snakes.
+
+    :param state: Game state.
+        + type: GameState
+    :param player_id: Controlled player.
+        + type: int
+    :param deadline: time.perf_counter time at which the direction must be returned, or None.
+        + type: float or None
+    :return: The new direction, or None to keep the current one.
+        + type: int or None
+    """
+    if not state.players_alive[player_id]:
+        return None
+    head = state.snakes[player_id].head()
+    current = state.directions[player_id]
+    food = state.foods[player_id]
+    grid = state.grid
+
+    best = None
+    best_distance = None
+    for direction in DIRECTIONS:
+        if direction == OPPOSITE_DIRECTIONS[current]:
+            continue
+        cell = next_cell(state, head, direction)
+        if cell is None or grid[cell] != NO_OWNER:
+            continue
+        distance = 0 if food is None else cell_distance(state, cell, food)
+        # Keeping the current direction wins the ties
+        if best is None or distance < best_distance or (distance == best_distance and direction == current):
+            best = direction
+            best_distance = distance
+
+    if best is None or best == current:
+        return None
+    return best
+
+
+def path_policy(state, player_id, deadline=None):
+    """
+    Follows the shortest path to the own food around the snakes, using the cached distance field of the
+    food. When the food cannot be reached, moves to the neighbour cell with the most free space around.
+
+    :param state: Game state.
+        + type: GameState
+    :param player_id: Controlled player.
+        + type: int
+    :param deadline: time.perf_counter time at which the direction must be returned, or None.
+        + type: float or None
+    :return: The new direction, or None to keep the current one.
+        + type: int or None
+    """
+    if not state.players_alive[player_id]:
+        return None
+    if state.y_size * state.x_size > PATHFINDING_MAX_CELLS:
+        return greedy_policy(state, player_id, deadline)
+    snake = state.snakes[player_id]
+    head = snake.head()
+    current = state.directions[player_id]
+    food = state.foods[player_id]
+    grid = state.grid
+
+    candidates = []
+    for direction in DIRECTIONS:
+        if direction == OPPOSITE_DIRECTIONS[current]:
+            continue
+        cell = next_cell(state, head, direction)
+        if cell is not None and grid[cell] == NO_OWNER:
+            candidates.append((direction != current, direction, cell))
+    if not candidates:
+        return None
+
+    distance = UNREACHABLE
+    if food is not None:
+        field = path_cache(state).field(state, food)
+        if min(field.dist[cell] for _, _, cell in candidates) > field.horizon:
+            # The snake moved beyond the exact part of the field
+            field.compute(grid)
+        distance, _, best, _ = min((field.dist[candidate[2]],) + candidate for candidate in candidates)
+        if distance < UNREACHABLE:
+            field.horizon = min(field.horizon, distance + HORIZON_SLACK)
+    if distance == UNREACHABLE:
+        # No path to the food, survive in the biggest free area
+        limit = len(snake) + 1
+        best = max(candidates, key=lambda c: (reachable_area(state, c[2], limit, deadline), not c[0]))[1]
+    return None if best == current else best
+
+
+#
+# BOT API
+#
+
+class BotController(object):
+    """
+    Runs the policies of the bot players of a game.
+
+    A policy is a function called as policy(state, player_id, deadline) that returns a direction (or None to
+    keep the current one) before the time.perf_counter deadline. Directions returned after the deadline are
+    ignored, like late network inputs, and counted as overruns. Without budget (e.g. on tournaments that
+    must be reproducible) the deadline is None and every direction is applied.
+    """
+
+    def __init__(self, policies, budget=BOT_TIME_BUDGET):
+        """
+        Creates a new controller.
+
+        :param policies: Policy of each bot player id.
+            + type: dict<int, function>
+        :param budget: Thinking time of each bot on each tick in seconds, or None for no limit.
+            + type: float or None
+        """
+        self.policies = sorted(policies.items())
+        self.budget = budget
+        self.overruns = dict((player_id, 0) for player_id in policies)
+
+    def actions(self, state, actions):
+        """
+        Asks every bot for its direction on the next tick.
+
+        :param state: Game state.
+            + type: GameState
+        :param actions: Actions of the next tick, indexed by player id, where the bot directions are written.
+            + type: List<int or None>
+        :return: None
+        """
+        clock = time.perf_counter
+        for player_id, policy in self.policies:
+            if not state.players_alive[player_id]:
+                actions[player_id] = None
+                continue
+            deadline = clock() + self.budget if self.budget is not None else None
+            direction = policy(state, player_id, deadline)
+            if deadline is not None and clock() > deadline:
+                self.overruns[player_id] = self.overruns[player_id] + 1
+                logger.debug("Bot " + str(player_id) + " exceeded its time budget")
+                direction = None
+            actions[player_id] = direction if direction in DIRECTIONS else None
+
+
+#
+# POLICY REGISTRY
+#
+
+# Built-in policies by name
+POLICIES = {
+    "greedy": greedy_policy,
+    "path": path_policy,
+}
+
+
+def load_policy(name):
+    """
+    Returns a policy by name: either a built-in policy or the import path of a function ("module:function"),
+    so external strategies can be plugged without changing this module.
+
+    :param name: Policy name or import path.
+        + type: str
+    :return: The policy, called as policy(state, player_id, deadline) (see BotController).
+        + type: function
+    :raise ValueError: If the policy does not exist.
+    """
+    if name in POLICIES:
+        return POLICIES[name]
+    module_name, _, function_name = name.partition(":")
+    if not function_name:
+        raise ValueError("Unknown policy " + name)
+    try:
+        return getattr(importlib.import_module(module_name), function_name)
+    except (ImportError, AttributeError):
+        raise ValueError("Unknown policy " + name)
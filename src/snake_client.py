@@ -0,0 +1,344 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+import argparse
+import curses
+import logging
+import select
+import socket
+
+import snake_engine
+import snake_fight
+import snake_input
+import snake_loop
+import snake_prediction
+import snake_protocol
+import snake_render
+from snake_fight import KEY_ESC
+from snake_protocol import DEFAULT_HOST, DEFAULT_PORT, ROLE_PLAYER, ROLE_SPECTATOR, NO_PLAYER, MSG_WELCOME, \
+    MSG_TICK, MSG_END, MSG_SNAPSHOT, MSG_DELTA, MSG_HASH, MSG_STATE
+
+# CONSTANTS
+RECV_SIZE = 64 * 1024
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# CONNECTION
+#
+
+class GameClient(object):
+    """
+    Blocking socket connection to a Snake Fight server, polled from the game loop.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, role=ROLE_PLAYER, name=None):
+        """
+        Connects to the server and requests to join a match.
+
+        :param host: Server address.
+            + type: str
+        :param port: Server port.
+            + type: int
+        :param role: Requested role.
+            + type: int
+        :param name: Player name recorded on the leaderboard, or None to be named by the server.
+            + type: str or None
+        """
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.role = role
+        self.decoder = snake_protocol.FrameDecoder()
+        self.sock.sendall(snake_protocol.encode_join(role, name))
+
+    def receive(self, timeout):
+        """
+        Waits up to the given time for data and returns the received frames.
+
+        :param timeout: Maximum seconds to wait.
+            + type: float
+        :return: List of (message type, payload) tuples.
+            + type: List<Tuple<int, bytes>>
+        :raise ConnectionError: If the server closed the connection.
+        """
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        if not readable:
+            return []
+        data = self.sock.recv(RECV_SIZE)
+        if not data:
+            raise ConnectionError("Connection closed by the server")
+        return self.decoder.feed(data)
+
+    def send_input(self, tick, direction):
+        """
+        Sends a turn request to the server.
+
+        :param tick: Tick the turn is requested for.
+            + type: int
+        :param direction: Requested direction.
+            + type: int
+        :return: None
+        """
+        self.sock.sendall(snake_protocol.encode_input(tick, direction))
+
+    def request_resync(self):
+        """
+        Requests the full state of the game after drifting from the server.
+
+        :return: None
+        """
+        self.sock.sendall(snake_protocol.encode_resync())
+
+    def close(self):
+        """
+        Closes the connection.
+
+        :return: None
+        """
+        self.sock.close()
+
+
+#
+# HELPER METHODS
+#
+
+def game_speed(state):
+    """
+    Calculates the game speed following the longest snake, as the server does.
+
+    :param state: Game state.
+        + type: GameState
+    :return: The game speed in milliseconds per tick.
+        + type: int
+    """
+    return snake_engine.game_speed(max(len(snake) for snake in state.snakes))
+
+
+def process_events(win, turn_queue=None, direction=None):
+    """
+    Process all the pending events on the window, queueing the turns of the player.
+
+    :param win: Window screen.
+        + type: curses.Window
+    :param turn_queue: Pending turns of the player (None for spectators).
+        + type: snake_input.TurnQueue
+    :param direction: Current (predicted) direction of the player.
+        + type: int
+    :return: Whether the user requested to end the game.
+        + type: boolean
+    """
+    event = win.getch()
+    while event != curses.ERR:
+        if event == KEY_ESC:
+            return True
+        turn = snake_fight.key_to_direction(event)
+        if turn is not None and turn_queue is not None:
+            turn_queue.push(turn, direction)
+        event = win.getch()
+    return False
+
+
+def wait_for_match(win, client):
+    """
+    Waits until the server starts the match.
+
+    :param win: Window screen.
+        + type: curses.Window
+    :param client: Server connection.
+        + type: GameClient
+    :return: A tuple with the player id and the match header, or None if the user left.
+        + type: Tuple<int, ReplayHeader> or None
+    """
+    win.addstr(1, 2, ' Waiting for players... ')
+    win.refresh()
+    while True:
+        if win.getch() == KEY_ESC:
+            return None
+        for msg_type, payload in client.receive(snake_loop.POLL_INTERVAL):
+            if msg_type == MSG_WELCOME:
+                match_id, player_id, header = snake_protocol.decode_welcome(payload)
+                logger.debug("Joined match " + str(match_id) + " as player " + str(player_id))
+                return player_id, header
+
+
+#
+# MAIN METHODS
+#
+
+def run_spectator(win, client, header):
+    """
+    Shows a remote game until the server ends it or the user leaves. Spectators do not simulate the game,
+    they draw the state deltas sent by the server.
+
+    :param win: Window screen.
+        + type: curses.Window
+    :param client: Server connection.
+        + type: GameClient
+    :param header: Match header.
+        + type: ReplayHeader
+    :return: Game scores.
+        + type: List<int>
+    """
+    colors_per_player = snake_fight.build_colors_per_player(header.num_players)
+    renderer = snake_render.Renderer(win, header.x_size, colors_per_player, colors_per_player,
+                                     lambda hud_win, scores: snake_fight.print_scores(hud_win, colors_per_player,
+                                                                                      scores))
+    scores = [0] * header.num_players
+    while True:
+        if process_events(win):
+            return scores
+        try:
+            frames = client.receive(snake_loop.POLL_INTERVAL)
+        except ConnectionError:
+            return scores
+        for msg_type, payload in frames:
+            if msg_type == MSG_SNAPSHOT or msg_type == MSG_DELTA:
+                tick, diffs, changed_scores, killed = snake_protocol.decode_delta(payload)
+                if msg_type == MSG_SNAPSHOT:
+                    # Redraw the whole board
+                    win.erase()
+                    renderer.invalidate()
+                for player_id, score in changed_scores:
+                    scores[player_id] = score
+                for player_id in killed:
+                    logger.debug("Player " + str(player_id) + " killed at tick " + str(tick))
+                renderer.draw(diffs, scores)
+            elif msg_type == MSG_END:
+                return snake_protocol.decode_end(payload)
+
+
+def run_game(win, client):
+    """
+    Runs a remote game until the server ends it or the user leaves.
+
+    The server only sends the inputs applied on each tick, so the client simulates the same game locally
+    from the match seed. The own snake is predicted ahead of the server ticks, so turns are shown on the next
+    local tick and corrected (rolled back) when the server applies different inputs. If the state hashes sent
+    by the server show that the game drifted, the client requests the full state and continues from it.
+
+    :param win: Window screen.
+        + type: curses.Window
+    :param client: Server connection.
+        + type: GameClient
+    :return: Game scores.
+        + type: List<int>
+    """
+    logger.debug("Running main game method")
+
+    joined = wait_for_match(win, client)
+    if joined is None:
+        return []
+    player_id, header = joined
+    if player_id == NO_PLAYER:
+        return run_spectator(win, client, header)
+    predictor = snake_prediction.RollbackPredictor(header, player_id)
+
+    # Print initial snakes and foods
+    win.erase()
+    colors_per_player = snake_fight.build_colors_per_player(header.num_players)
+    renderer = snake_render.Renderer(win, header.x_size, colors_per_player, colors_per_player,
+                                     lambda hud_win, scores: snake_fight.print_scores(hud_win, colors_per_player,
+                                                                                      scores))
+    renderer.draw(predictor.state.initial_diffs(), predictor.state.scores)
+
+    # Main loop: the predicted ticks follow the same schedule as the server ones
+    loop = snake_loop.FixedTimestepLoop(game_speed(predictor.state) / 1000.0)
+    loop.start()
+    turn_queue = snake_input.TurnQueue()
+    resync_requested = False
+    while True:
+        # Process events
+        if process_events(win, turn_queue, predictor.state.directions[player_id]):
+            return predictor.state.scores
+
+        # Predict the due ticks, and the extra ones to keep the lead over the server
+        while predictor.can_predict() and (predictor.needs_lead() or loop.due()):
+            turn = turn_queue.pop()
+            if turn is not None:
+                client.send_input(predictor.state.ticks, turn)
+            renderer.draw(predictor.predict(turn), predictor.state.scores)
+            loop.interval = game_speed(predictor.state) / 1000.0
+
+        # Apply the authoritative ticks while waiting for the next tick
+        try:
+            frames = client.receive(max(0.0, min(loop.next_tick - loop.clock(), snake_loop.POLL_INTERVAL)))
+        except ConnectionError:
+            return predictor.state.scores
+        for msg_type, payload in frames:
+            if msg_type == MSG_TICK:
+                tick, actions = snake_protocol.decode_tick(payload, header.num_players)
+                diffs = predictor.confirm(tick, actions)
+                if diffs is None:
+                    # Rolled back, redraw the whole board
+                    win.erase()
+                    renderer.invalidate()
+                    diffs = predictor.state.initial_diffs()
+                renderer.draw(diffs, predictor.state.scores)
+            elif msg_type == MSG_HASH:
+                tick, digest = snake_protocol.decode_hash(payload)
+                if not resync_requested and tick == predictor.confirmed_ticks \
+                        and digest != predictor.confirmed_digest():
+                    logger.debug("Drifted from the server at tick " + str(tick) + ", requesting the state")
+                    client.request_resync()
+                    resync_requested = True
+            elif msg_type == MSG_STATE:
+                predictor.resync(payload)
+                resync_requested = False
+                win.erase()
+                renderer.invalidate()
+                renderer.draw(predictor.state.initial_diffs(), predictor.state.scores)
+            elif msg_type == MSG_END:
+                logger.debug("Rolled back " + str(predictor.rollbacks) + " times, resynchronized "
+                             + str(predictor.resyncs) + " times")
+                return snake_protocol.decode_end(payload)
+
+
+#
+# MAIN
+#
+
+def main():
+    """
+    Main function to play Snake Fight on a server.
+    Use any direction keys to play and Esc Key for exiting.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Snake Fight client")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Server address")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Server port")
+    parser.add_argument("--spectate", action="store_true", help="Watch a match instead of playing")
+    parser.add_argument("--name", help="Player name recorded on the server leaderboard")
+    args = parser.parse_args()
+    if args.name is not None and len(args.name.encode('utf-8')) > snake_protocol.MAX_NAME_SIZE:
+        parser.error("The name must take at most " + str(snake_protocol.MAX_NAME_SIZE) + " bytes")
+
+    logger.info("Snake client start")
+    client = GameClient(args.host, args.port, ROLE_SPECTATOR if args.spectate else ROLE_PLAYER, args.name)
+    win = snake_fight.init_game_screen()
+    try:
+        scores = run_game(win, client)
+    finally:
+        client.close()
+    curses.endwin()
+    if scores:
+        snake_fight.print_final_scores(scores)
+    logger.info("Snake client end")
+
+
+#
+# ENTRY POINT
+#
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s | %(levelname)s | %(name)s - %(message)s')
+    main()
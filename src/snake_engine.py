@@ -0,0 +1,600 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+import random
+import logging
+from array import array
+from bisect import insort
+
+from snake_structures import SnakeBody, FreeCells, SparseGrid, SparseFreeCells
+
+# CONFIGURABLE CONSTANTS
+BOUNDS_ENABLED = False
+
+# CONSTANTS
+Y_SIZE = 40
+X_SIZE = 100
+
+MAX_SCORE_PER_FOOD = 100
+SCORE_PER_KILL = 50
+
+# Tick durations in milliseconds
+BASE_SPEED = 5
+LEAST_SPEED = 600
+TOP_SPEED = 30
+INITIAL_SPEED = int(LEAST_SPEED / BASE_SPEED)
+
+# Bits of the random seeds of the games
+SEED_BITS = 64
+
+# Directions
+DIR_UP = 0
+DIR_DOWN = 1
+DIR_RIGHT = 2
+DIR_LEFT = 3
+
+DIRECTIONS = [DIR_UP, DIR_DOWN, DIR_RIGHT, DIR_LEFT]
+DIRECTION_MOVES = [[-1, 0], [1, 0], [0, 1], [0, -1]]
+OPPOSITE_DIRECTIONS = [DIR_DOWN, DIR_UP, DIR_LEFT, DIR_RIGHT]
+
+# Single player initial state
+INITIAL_DIRECTION = DIR_RIGHT
+INITIAL_FOOD = [10, 20]
+INITIAL_SNAKE = [[4, 10], [4, 9], [4, 8]]
+
+# Cell contents reported on the state diffs
+CELL_EMPTY = 0
+CELL_SNAKE = 1
+CELL_FOOD = 2
+
+# Owner id stored on the occupancy grid for cells without snake
+NO_OWNER = -1
+
+# Boards with more cells than this only store the occupied cells
+SPARSE_BOARD_CELLS = 1 << 20
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# GAME STATE
+#
+
+class GameState(object):
+    """
+    Terminal-free state of a Snake game (single player) or a Snake Fight game (several players).
+
+    All the per-player attributes are lists indexed by the player id. A dead player keeps its score
+    but its snake is emptied and its food is set to None.
+    """
+
+    def __init__(self, snakes, foods, directions, y_size=Y_SIZE, x_size=X_SIZE, bounds_enabled=BOUNDS_ENABLED,
+                 clock=None, rng=None, initial_speed=INITIAL_SPEED):
+        """
+        Creates a new game state.
+
+        :param snakes: Initial snake positions of each player (head first).
+            + type: List<List<List<int, int>>>
+        :param foods: Initial food position of each player (None to spawn it on a random free cell).
+            + type: List<List<int, int> or None>
+        :param directions: Initial direction of each player.
+            + type: List<int>
+        :param y_size: Board height (including borders).
+            + type: int
+        :param x_size: Board width (including borders).
+            + type: int
+        :param bounds_enabled: Whether crossing the borders kills the snake instead of wrapping around.
+            + type: boolean
+        :param clock: Function returning the current time in seconds (defaults to the tick-based clock).
+            + type: function
+        :param rng: Random number generator providing randint (defaults to the random module).
+            + type: random.Random
+        :param initial_speed: Tick duration in milliseconds of the initial snakes, followed by the tick-based clock.
+            + type: int
+        """
+        self.y_size = y_size
+        self.x_size = x_size
+        self.bounds_enabled = bounds_enabled
+        self.initial_speed = initial_speed
+        self.elapsed_ms = 0
+        self.clock = clock if clock is not None else self.tick_clock
+        self.rng = rng if rng is not None else random
+        self.ticks = 0
+
+        # Event counters since the state was created (not stored on the replay snapshots)
+        self.kills = 0
+        self.foods_eaten = 0
+
+        # Snakes and foods are stored as packed cells (y * x_size + x)
+        self.num_players = len(snakes)
+        self.snakes = [SnakeBody(pos[0] * x_size + pos[1] for pos in snake) for snake in snakes]
+        self.foods = [None for _ in range(self.num_players)]
+        self.directions = list(directions)
+        self.players_alive = [True for _ in range(self.num_players)]
+        self.scores = [0 for _ in range(self.num_players)]
+
+        # Occupancy grid: owner player id of each packed cell (y * x_size + x) or NO_OWNER
+        # Free cells: index of the cells without snake, kept in sync with the grid
+        # Food owners: sorted player ids whose food is on each packed cell, kept in sync with the foods
+        # Huge boards use sparse versions of the grid and the free cells, sized by the occupied cells
+        if y_size * x_size > SPARSE_BOARD_CELLS:
+            self.grid = SparseGrid(NO_OWNER)
+            self.free_cells = SparseFreeCells(y_size, x_size)
+        else:
+            self.grid = array('i', [NO_OWNER]) * (y_size * x_size)
+            self.free_cells = FreeCells(y_size, x_size)
+        self.food_owners = {}
+        for player_id, snake in enumerate(self.snakes):
+            for cell in snake:
+                self.grid[cell] = player_id
+                self.free_cells.remove(cell)
+        for player_id, food in enumerate(foods):
+            self.set_food(player_id, food[0] * x_size + food[1] if food is not None else spawn_food(self))
+
+        now = self.clock()
+        self.food_times = [now for _ in range(self.num_players)]
+
+        self.must_end = False
+
+    def tick_clock(self):
+        """
+        Deterministic clock based on the simulated ticks, each one lasting the game speed when it started.
+
+        :return: The elapsed game time in seconds.
+            + type: float
+        """
+        return self.elapsed_ms / 1000.0
+
+    def speed(self):
+        """
+        Calculates the duration of the next tick from the length of the longest snake.
+
+        :return: The tick duration in milliseconds.
+            + type: int
+        """
+        return game_speed(max(len(snake) for snake in self.snakes), self.initial_speed)
+
+    def set_food(self, player_id, cell):
+        """
+        Moves the food of a player, keeping the food owners of each cell in sync.
+
+        :param player_id: Player id.
+            + type: int
+        :param cell: New packed food cell, or None to remove the food.
+            + type: int or None
+        :return: None
+        """
+        old = self.foods[player_id]
+        if old is not None:
+            owners = self.food_owners[old]
+            owners.remove(player_id)
+            if not owners:
+                del self.food_owners[old]
+        self.foods[player_id] = cell
+        if cell is not None:
+            owners = self.food_owners.get(cell)
+            if owners is None:
+                self.food_owners[cell] = [player_id]
+            else:
+                insort(owners, player_id)
+
+    def initial_diffs(self):
+        """
+        Returns the diffs required to draw the whole state on an empty board.
+
+        :return: List of cell diffs.
+            + type: List<Tuple<int, int, int>>
+        """
+        diffs = []
+        for player_id, food in enumerate(self.foods):
+            if food is not None:
+                diffs.append((food, CELL_FOOD, player_id))
+        for player_id, snake in enumerate(self.snakes):
+            for cell in snake:
+                diffs.append((cell, CELL_SNAKE, player_id))
+        return diffs
+
+
+#
+# HELPER METHODS
+#
+
+def new_seed():
+    """
+    Generates a new random seed for a game.
+
+    :return: A random seed.
+        + type: int
+    """
+    return random.getrandbits(SEED_BITS)
+
+
+def game_speed(snake_len, initial_speed=INITIAL_SPEED):
+    """
+    Calculates the game speed (tick duration in milliseconds) for the given snake length.
+
+    :param snake_len: Length of the (longest) snake.
+        + type: int
+    :param initial_speed: Tick duration in milliseconds of the initial snakes.
+        + type: int
+    :return: The tick duration in milliseconds.
+        + type: int
+    """
+    # Increase snake speed with its length
+    increase_speed = int(5 * (snake_len / 5 + snake_len / 10))
+    return initial_speed - increase_speed % (initial_speed - TOP_SPEED)
+
+
+def random_direction(rng=random):
+    """
+    Selects a random direction.
+
+    :param rng: Random number generator.
+        + type: random.Random
+    :return: A random direction.
+        + type: int
+    """
+    return DIRECTIONS[rng.randint(0, 3)]
+
+
+def random_position(y_size=Y_SIZE, x_size=X_SIZE, rng=random):
+    """
+    Returns a random position within the board.
+
+    :param y_size: Board height (including borders).
+        + type: int
+    :param x_size: Board width (including borders).
+        + type: int
+    :param rng: Random number generator.
+        + type: random.Random
+    :return: A random valid position within the board
+        + type: List<int,int>
+    """
+    # From 1 to size - 2 because of borders
+    return [rng.randint(1, y_size - 2), rng.randint(1, x_size - 2)]
+
+
+def wrap_position(pos, y_size, x_size):
+    """
+    Makes a position that crossed the boundaries enter from the other side.
+
+    :param pos: Position to wrap (modified in place).
+        + type: List<int, int>
+    :param y_size: Board height (including borders).
+        + type: int
+    :param x_size: Board width (including borders).
+        + type: int
+    :return: The wrapped position.
+        + type: List<int, int>
+    """
+    if pos[0] == 0:
+        pos[0] = y_size - 2
+    if pos[1] == 0:
+        pos[1] = x_size - 2
+    if pos[0] == y_size - 1:
+        pos[0] = 1
+    if pos[1] == x_size - 1:
+        pos[1] = 1
+    return pos
+
+
+def next_cell(state, head, direction):
+    """
+    Returns the cell a snake head moves to, following the wrap around and bounds rules of the step.
+
+    :param state: Game state.
+        + type: GameState
+    :param head: Packed head cell.
+        + type: int
+    :param direction: Moving direction.
+        + type: int
+    :return: The packed cell, or None if the move crosses the bounds.
+        + type: int or None
+    """
+    y, x = divmod(head, state.x_size)
+    move = DIRECTION_MOVES[direction]
+    y = y + move[0]
+    x = x + move[1]
+    if y < 1 or y > state.y_size - 2 or x < 1 or x > state.x_size - 2:
+        if state.bounds_enabled:
+            return None
+        y = (y - 1) % (state.y_size - 2) + 1
+        x = (x - 1) % (state.x_size - 2) + 1
+    return y * state.x_size + x
+
+
+def initial_snake_random(direction, y_size=Y_SIZE, x_size=X_SIZE, rng=random):
+    """
+    Returns a random position of a snake of size 3 within the board, with its body trailing behind
+    the given direction.
+
+    :param direction: Initial direction of the snake.
+        + type: int
+    :param y_size: Board height (including borders).
+        + type: int
+    :param x_size: Board width (including borders).
+        + type: int
+    :param rng: Random number generator.
+        + type: random.Random
+    :return: A random position of a snake of size 3 within the board.
+        + List<List<int,int>, List<int,int>, List<int,int>>
+    """
+    move_y, move_x = DIRECTION_MOVES[direction]
+    snake = [random_position(y_size, x_size, rng)]
+    for _ in range(2):
+        last = snake[-1]
+        snake.append(wrap_position([last[0] - move_y, last[1] - move_x], y_size, x_size))
+    return snake
+
+
+def new_snake_state(y_size=Y_SIZE, x_size=X_SIZE, bounds_enabled=BOUNDS_ENABLED, clock=None, rng=None, seed=None,
+                    initial_speed=INITIAL_SPEED):
+    """
+    Creates a new single player Snake state.
+
+    :param y_size: Board height (including borders).
+        + type: int
+    :param x_size: Board width (including borders).
+        + type: int
+    :param bounds_enabled: Whether crossing the borders kills the snake instead of wrapping around.
+        + type: boolean
+    :param clock: Function returning the current time in seconds.
+        + type: function
+    :param rng: Random number generator (built from the seed if not given).
+        + type: random.Random
+    :param seed: Seed of the random number generator.
+        + type: int or None
+    :param initial_speed: Tick duration in milliseconds of the initial snakes.
+        + type: int
+    :return: The new game state.
+        + type: GameState
+    """
+    rng = rng if rng is not None else random.Random(seed)
+    return GameState([INITIAL_SNAKE], [INITIAL_FOOD], [INITIAL_DIRECTION], y_size=y_size, x_size=x_size,
+                     bounds_enabled=bounds_enabled, clock=clock, rng=rng, initial_speed=initial_speed)
+
+
+def new_fight_state(num_players, y_size=Y_SIZE, x_size=X_SIZE, bounds_enabled=BOUNDS_ENABLED, clock=None, rng=None,
+                    seed=None, initial_speed=INITIAL_SPEED):
+    """
+    Creates a new Snake Fight state with random snakes, directions and foods.
+
+    :param num_players: Number of players.
+        + type: int
+    :param y_size: Board height (including borders).
+        + type: int
+    :param x_size: Board width (including borders).
+        + type: int
+    :param bounds_enabled: Whether crossing the borders kills the snake instead of wrapping around.
+        + type: boolean
+    :param clock: Function returning the current time in seconds.
+        + type: function
+    :param rng: Random number generator (built from the seed if not given).
+        + type: random.Random
+    :param seed: Seed of the random number generator.
+        + type: int or None
+    :param initial_speed: Tick duration in milliseconds of the initial snakes.
+        + type: int
+    :return: The new game state.
+        + type: GameState
+    """
+    rng = rng if rng is not None else random.Random(seed)
+    directions = [random_direction(rng) for _ in range(num_players)]
+    snakes = []
+    occupied = set()
+    for direction in directions:
+        # Snakes must not overlap each other
+        snake = None
+        while snake is None:
+            snake = initial_snake_random(direction, y_size, x_size, rng)
+            cells = set(pos[0] * x_size + pos[1] for pos in snake)
+            if len(cells) != len(snake) or not occupied.isdisjoint(cells):
+                snake = None
+        occupied.update(cells)
+        snakes.append(snake)
+    foods = [None for _ in range(num_players)]
+    return GameState(snakes, foods, directions, y_size=y_size, x_size=x_size, bounds_enabled=bounds_enabled,
+                     clock=clock, rng=rng, initial_speed=initial_speed)
+
+
+def cell_content(state, cell):
+    """
+    Returns what must be shown on the given cell.
+
+    :param state: Game state.
+        + type: GameState
+    :param cell: Packed cell to check.
+        + type: int
+    :return: A tuple with the cell content and the owner player id (None if empty).
+        + type: Tuple<int, int>
+    """
+    owner = state.grid[cell]
+    if owner != NO_OWNER:
+        return CELL_SNAKE, owner
+    owners = state.food_owners.get(cell)
+    if owners:
+        return CELL_FOOD, owners[0]
+    return CELL_EMPTY, None
+
+
+def spawn_food(state):
+    """
+    Returns a new random food cell that does not overlap any snake.
+
+    :param state: Game state.
+        + type: GameState
+    :return: The new packed food cell or None if the board is full.
+        + type: int or None
+    """
+    return state.free_cells.sample(state.rng)
+
+
+def kill_player(state, player_id, diffs):
+    """
+    Kills the given player, removing its snake and its food from the board.
+
+    :param state: Game state.
+        + type: GameState
+    :param player_id: Player to kill.
+        + type: int
+    :param diffs: List where the produced cell diffs are appended.
+        + type: List<Tuple<int, int, int>>
+    :return: None
+    """
+    snake = state.snakes[player_id]
+    food = state.foods[player_id]
+    state.set_food(player_id, None)
+    state.players_alive[player_id] = False
+
+    grid = state.grid
+    free_cells = state.free_cells
+    for cell in snake:
+        if grid[cell] == player_id:
+            grid[cell] = NO_OWNER
+            free_cells.add(cell)
+    for cell in snake:
+        content, owner = cell_content(state, cell)
+        diffs.append((cell, content, owner))
+    snake.clear()
+    if food is not None:
+        content, owner = cell_content(state, food)
+        diffs.append((food, content, owner))
+
+
+#
+# MAIN STEP
+#
+
+def step(state, actions=None):
+    """
+    Advances the game one tick.
+
+    :param state: Game state (modified in place).
+        + type: GameState
+    :param actions: New direction of each player, or None to keep the current one.
+        + type: List<int or None>
+    :return: List of cell diffs (packed cell, cell content, owner player id) that changed on this tick.
+        + type: List<Tuple<int, int, int>>
+    """
+    diffs = []
+    if state.must_end:
+        return diffs
+
+    # The tick lasts the game speed before the snakes move (as the frontends schedule it)
+    state.elapsed_ms = state.elapsed_ms + state.speed()
+
+    # Update directions
+    if actions is not None:
+        for player_id, action in enumerate(actions):
+            if action is not None:
+                state.directions[player_id] = action
+
+    grid = state.grid
+    free_cells = state.free_cells
+    y_size = state.y_size
+    x_size = state.x_size
+    bounds_enabled = state.bounds_enabled
+
+    # Calculates new coordinates of the snakes (heads are not on the grid until they survive)
+    heads = {}
+    for player_id, snake in enumerate(state.snakes):
+        if state.players_alive[player_id]:
+            move_y, move_x = DIRECTION_MOVES[state.directions[player_id]]
+            head_y, head_x = divmod(snake.head(), x_size)
+            head_y = head_y + move_y
+            head_x = head_x + move_x
+
+            if bounds_enabled:
+                # Snake out of bounds, the head is not added to the board
+                if head_y == 0 or head_y == y_size - 1 or head_x == 0 or head_x == x_size - 1:
+                    kill_player(state, player_id, diffs)
+                    continue
+            else:
+                # If snake crosses the boundaries, make it enter from the other side
+                if head_y == 0:
+                    head_y = y_size - 2
+                elif head_y == y_size - 1:
+                    head_y = 1
+                if head_x == 0:
+                    head_x = x_size - 2
+                elif head_x == x_size - 1:
+                    head_x = 1
+
+            cell = head_y * x_size + head_x
+            snake.push_head(cell)
+            if cell in heads:
+                heads[cell].append(player_id)
+            else:
+                heads[cell] = [player_id]
+
+    # Control which snakes die
+    for player_id, snake in enumerate(state.snakes):
+        if not state.players_alive[player_id]:
+            continue
+
+        cell = snake.head()
+        owner = grid[cell]
+        # As in the original game, every other snake on the head cell is credited with the kill: the owner of
+        # the cell and the snakes whose heads reach it that have not been checked yet (even if the snake also
+        # runs over itself)
+        killers = [other_player_id for other_player_id in heads[cell]
+                   if other_player_id > player_id and state.players_alive[other_player_id]]
+        if owner != NO_OWNER and owner != player_id and owner not in killers:
+            killers.insert(0, owner)
+
+        if killers:
+            # Snake head touches other snakes. Increase the other players' score
+            for killer in killers:
+                state.scores[killer] = state.scores[killer] + SCORE_PER_KILL
+            state.kills = state.kills + 1
+            # Kill current snake
+            kill_player(state, player_id, diffs)
+        elif owner == player_id:
+            # Snake runs over itself
+            kill_player(state, player_id, diffs)
+        else:
+            grid[cell] = player_id
+            free_cells.remove(cell)
+
+    state.ticks = state.ticks + 1
+    if True not in state.players_alive:
+        state.must_end = True
+        return diffs
+
+    # Check if the snakes eat
+    for player_id, snake in enumerate(state.snakes):
+        if not state.players_alive[player_id]:
+            continue
+        head = snake.head()
+        if head == state.foods[player_id]:
+            # Increase the score
+            et_seconds = state.clock() - state.food_times[player_id] + 1
+            state.scores[player_id] = state.scores[player_id] + int(MAX_SCORE_PER_FOOD / et_seconds)
+            state.foods_eaten = state.foods_eaten + 1
+
+            # Recalculate new food
+            state.set_food(player_id, spawn_food(state))
+            state.food_times[player_id] = state.clock()
+            if state.foods[player_id] is not None:
+                diffs.append((state.foods[player_id], CELL_FOOD, player_id))
+        else:
+            # Decrease snake size (has not eaten)
+            last = snake.pop_tail()
+            grid[last] = NO_OWNER
+            free_cells.add(last)
+            content, owner = cell_content(state, last)
+            diffs.append((last, content, owner))
+
+        # Draw the snake head (advance)
+        diffs.append((head, CELL_SNAKE, player_id))
+
+    return diffs
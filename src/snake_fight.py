@@ -8,14 +8,31 @@ from __future__ import print_function
 # Imports
 import curses
 from curses import KEY_RIGHT, KEY_LEFT, KEY_UP, KEY_DOWN
-from random import randint
-from datetime import datetime
 import logging
+import time
+
+import snake_bots
+import snake_engine
+import snake_input
+import snake_instrument
+import snake_leaderboard
+import snake_loop
+import snake_render
+import snake_replay
+import snake_shared
+from snake_engine import LEAST_SPEED, DIR_UP, DIR_DOWN, DIR_RIGHT, DIR_LEFT
 
 # CONFIGURABLE CONSTANTS
 BOUNDS_ENABLED = False
 BASE_SPEED = 5
 NUM_PLAYERS = 4  # MAXIMUM: 4
+NUM_BOTS = 0  # Bot snakes added to the players (hundreds are supported)
+BOT_POLICY = "greedy"  # Policy of the bot snakes (see snake_bots.POLICIES)
+REPLAY_FILE = None  # Set a file path to record the game
+INSTRUMENTATION_FILE = None  # Set a file path to dump the per-tick timings
+SHARED_BOARD_NAME = None  # Set a shared memory name to publish the board on every tick
+LEADERBOARD_FILE = None  # Set a SQLite file path to record the scores
+PLAYER_NAMES = []  # Names of the players on the leaderboard (defaults to "Player <id>")
 
 # Key bindings
 KEY_ESC = 27
@@ -42,23 +59,17 @@ KEYS_RIGHT = [KEY_D, KEY_RIGHT, KEY_L, KEY_NUM_6]
 KEYS_LEFT = [KEY_A, KEY_LEFT, KEY_J, KEY_NUM_4]
 
 # CONSTANTS
-LEAST_SPEED = 600
-TOP_SPEED = 30
 INITIAL_SPEED = int(LEAST_SPEED / BASE_SPEED)
 
 Y_SIZE = 40
 X_SIZE = 100
 
-CHAR_FOOD = '*'
-CHAR_EMPTY = ' '
-CHAR_SNAKE = '#'
+# Boards bigger than the window are shown through a viewport following the (first) player
+WINDOW_Y_SIZE = min(Y_SIZE, 40)
+WINDOW_X_SIZE = min(X_SIZE, 100)
 
-COLOR_EMPTY = 1
 VALID_COLORS = [209, 47, 227, 22]
 
-MAX_SCORE_PER_FOOD = 100
-SCORE_PER_KILL = 50
-
 #
 # Logger definition
 #
@@ -97,65 +108,33 @@ def build_colors_per_player(num_players):
     """
     colors_per_player = []
     for i in range(num_players):
-        colors_per_player.append(VALID_COLORS[i])
+        colors_per_player.append(VALID_COLORS[i % len(VALID_COLORS)])
     return colors_per_player
 
 
-def initial_key_random(player_id):
+def key_to_direction(key):
     """
-    Selects a random initial direction key for the given player id.
+    Translates a direction key of any player into an engine direction.
 
-    :param player_id: Player id.
-        + type: int
-    :return: A random initial direction key.
+    :param key: Pressed key.
         + type: int
+    :return: The engine direction or None if the key is not a direction key.
+        + type: int or None
     """
-    rand = randint(0, 3)
-    if rand == 0:
-        return KEYS_UP[player_id]
-    elif rand == 1:
-        return KEYS_DOWN[player_id]
-    elif rand == 2:
-        return KEYS_RIGHT[player_id]
-    return KEYS_LEFT[player_id]
-
-
-def random_position():
-    """
-    Returns a random position within the board.
-
-    :return: A random valid position within the board
-        + type: List<int,int>
-    """
-    return [randint(1, Y_SIZE - 2), randint(1, X_SIZE - 2)]
-
-
-def initial_snake_random():
-    """
-    Returns a random position of a snake of size 3 within the board.
-
-    :return: A random position of a snake of size 3 within the board.
-        + List<List<int,int>, List<int,int>, List<int,int>>
-    """
-    snake_head = random_position()
+    if key in KEYS_UP:
+        return DIR_UP
+    if key in KEYS_DOWN:
+        return DIR_DOWN
+    if key in KEYS_RIGHT:
+        return DIR_RIGHT
+    if key in KEYS_LEFT:
+        return DIR_LEFT
+    return None
 
-    snake_body = snake_head
-    snake_body[1] = snake_body[1] - 1
-    if snake_body[1] < 0:
-        snake_body[1] = X_SIZE - 2
 
-    snake_tail = snake_body
-    snake_tail[1] = snake_tail[1] - 1
-    if snake_tail[1] < 0:
-        snake_tail[1] = X_SIZE - 2
-
-    snake = [snake_head, snake_body, snake_tail]
-    return snake
-
-
-def print_game_iteration(win, colors_per_player, scores, snakes):
+def print_scores(win, colors_per_player, scores):
     """
-    Generates the window for the next game iteration
+    Prints the score of each player.
 
     :param win: Window screen.
         + type: curses.Window
@@ -163,34 +142,54 @@ def print_game_iteration(win, colors_per_player, scores, snakes):
         + type: List<int>
     :param scores: Current scores
         + type: List<int>
-    :param snakes: Snakes positions
-        + type: List<List<List<int, int>>>
     :return: None
     """
-    win.border(0)
-
     # Print Snake name
     # win.addstr(0, int(X_SIZE / 2), ' SNAKE ')  # 'SNAKE' strings
 
     # Print scores
-    for player_id, score in enumerate(scores):
+    for player_id, score in enumerate(scores[:len(KEYS_UP)]):
         msg = ' Player ' + str(player_id + 1) + " Score : " + str(score) + ' '
-        if player_id / 2 == 0:
+        if player_id // 2 == 0:
             posy = 0
         else:
-            posy = Y_SIZE - 1
+            posy = WINDOW_Y_SIZE - 1
         if player_id % 2 == 0:
             posx = 2
         else:
-            posx = int((3 * X_SIZE) / 5)
+            posx = int((3 * WINDOW_X_SIZE) / 5)
 
         win.addstr(posy, posx, msg, curses.color_pair(colors_per_player[player_id]))
 
-    # Increase snake speed with its length
-    longest_snake_len = max(len(snake) for snake in snakes)
-    increase_speed = int(5 * (longest_snake_len / 5 + longest_snake_len / 10))
-    speed = INITIAL_SPEED - increase_speed % (INITIAL_SPEED - TOP_SPEED)
-    win.timeout(speed)
+
+def print_bot_scores(win, num_humans, scores):
+    """
+    Prints the best score of the bots.
+
+    :param win: Window screen.
+        + type: curses.Window
+    :param num_humans: Number of human players (the bots come after them).
+        + type: int
+    :param scores: Current scores
+        + type: List<int>
+    :return: None
+    """
+    bot_scores = scores[num_humans:]
+    if bot_scores:
+        msg = ' Bots: ' + str(len(bot_scores)) + " Best Score : " + str(max(bot_scores)) + ' '
+        win.addstr(WINDOW_Y_SIZE - 1, int((2 * WINDOW_X_SIZE) / 5), msg)
+
+
+def game_speed(snakes):
+    """
+    Calculates the game speed (tick duration in milliseconds) for the given snakes.
+
+    :param snakes: Snakes positions
+        + type: List<SnakeBody>
+    :return: The tick duration in milliseconds.
+        + type: int
+    """
+    return snake_engine.game_speed(max(len(snake) for snake in snakes), INITIAL_SPEED)
 
 
 def process_event(win, keys_per_player):
@@ -202,10 +201,13 @@ def process_event(win, keys_per_player):
     :param keys_per_player: Registered valid keys for each player
         + type: dict<str, List<int>>
     :return: Dictionary containing when entry per player that has registered an event, or global.
-        + type: dict<str, int>
+        None if there are no pending events.
+        + type: dict<str, int> or None
     """
     # Get event
     event = win.getch()
+    if event == curses.ERR:
+        return None
 
     # Only allow valid events
     events = {}
@@ -221,25 +223,42 @@ def process_event(win, keys_per_player):
     return events
 
 
-def process_events(win, keys_per_player):
+def process_events(win, keys_per_player, turn_queues, directions, instrumentation=None):
     """
-    Process the next NUM_PLAYERS events on the window and assigns them to the corresponding player
+    Process all the pending events on the window, queueing the turns of each player.
 
     :param win: Window screen.
         + type: curses.Window
     :param keys_per_player: Registered valid keys for each player
         + type: dict<str, List<int>>
-    :return: Dictionary containing when entry per player that has registered an event, or global.
-        + type: dict<str, int>
-    """
-    # Process 1 event
-    # TODO: Maybe process more in the future?
-    events = {}
-    for _ in range(1):
-        partial_events = process_event(win, keys_per_player)
-        events.update(partial_events)
+    :param turn_queues: Pending turns of each player.
+        + type: List<snake_input.TurnQueue>
+    :param directions: Current direction of each player.
+        + type: List<int>
+    :param instrumentation: Per-tick timings, or None if disabled.
+        + type: snake_instrument.Instrumentation
+    :return: The global event (pending events after it are left for later) or None.
+        + type: int or None
+    """
+    if instrumentation is not None:
+        start = instrumentation.clock()
+    event_global = None
+    events = process_event(win, keys_per_player)
+    while events is not None:
+        if "global" in events:
+            event_global = events["global"]
+            break
+        for player, event in events.items():
+            player_id = int(player)
+            queued = turn_queues[player_id].push(key_to_direction(event), directions[player_id])
+            if queued and instrumentation is not None:
+                instrumentation.input_queued(player_id)
+        events = process_event(win, keys_per_player)
 
-    return events
+    # Every poll is timed, even if it had no events
+    if instrumentation is not None:
+        instrumentation.record(snake_instrument.SPAN_INPUT, start)
+    return event_global
 
 
 def wait_for_resume_game(win):
@@ -252,145 +271,47 @@ def wait_for_resume_game(win):
         + type: boolean
     """
     key = None
+    # Block on the key presses while paused
+    win.nodelay(0)
     while key != KEY_SPACE and key != KEY_ESC:
         key = win.getch()
+    win.nodelay(1)
 
     return key != KEY_SPACE
 
 
-def print_char(win, pos, char, color):
+def move_snakes(renderer, actions, state, instrumentation=None, publisher=None):
     """
-    Prints the given char at the given position using the given color.
+    Calculates the next move of all the snakes and prints it.
 
-    :param win: Window screen.
-        + type: curses.Window
-    :param pos: Position to write.
-        + type: List<int, int>
-    :param char: Character to write.
-        + type: string
-    :param color: Color code to use.
-        + type: int
-    :return: None
-    """
-    win.addch(pos[0], pos[1], char, curses.color_pair(color))
-
-
-def clear_from_win(win, positions):
-    """
-    Prints an empty char on the given position.
-
-    :param win: Window screen.
-        + type: curses.Window
-    :param positions: Positions to write
-        + type: List<List<int, int>>
-    :return: None
-    """
-    for pos in positions:
-        print_char(win, pos, CHAR_EMPTY, COLOR_EMPTY)
-
-
-def move_snakes(win, colors_per_player, keys, players_alive, scores, snakes, foods, food_times):
+    :param renderer: Game renderer.
+        + type: snake_render.Renderer
+    :param actions: New direction of each player, or None to keep the current one.
+        + type: List<int or None>
+    :param state: Current game state (modified in place).
+        + type: GameState
+    :param instrumentation: Per-tick timings, or None if disabled.
+        + type: snake_instrument.Instrumentation
+    :param publisher: Shared memory export of the board, or None if disabled.
+        + type: snake_shared.BoardPublisher
+    :return: Whether the game must end or not.
+        + type: boolean
     """
-    Calculates the next move of all the snakes.
+    if instrumentation is None:
+        diffs = snake_engine.step(state, actions)
+        if publisher is not None:
+            publisher.publish(state, diffs)
+        renderer.draw(diffs, state.scores)
+        return state.must_end
 
-    :param win:   Window screen.
-        + type: curses.Window
-    :param colors_per_player: Color for each active player.
-        + type: List<int>
-    :param keys: Pressed key for each active player.
-        + type: List<int>
-    :param players_alive: List indicating whether the player is alive or not.
-        + type: List<boolean>
-    :param scores: List indicating the current score of each player.
-        + type: List<int>
-    :param snakes: Current snake position of each player.
-        + type: List<List<List<int, int>>>
-    :param foods: Current food position of each player.
-        + type: List<List<int, int>>
-    :param food_times: Time when food of each player was created
-        + type: List<time>
-    :return: A tuple with the updated values: whether the game must end or not, the alive players,
-        the scores, the new snakes positions, the new foods positions, and the new foods times.
-        + type: List<Tuple<Boolean,List,List,List,List,List>>
-    """
-    # Calculates new coordinates of the snakes
-    for player_id, snake in enumerate(snakes):
-        if players_alive[player_id]:
-            snake.insert(0, [snake[0][0] + (keys[player_id] in KEYS_DOWN and 1) + (keys[player_id] in KEYS_UP and -1),
-                             snake[0][1] + (keys[player_id] in KEYS_LEFT and -1) + (
-                                     keys[player_id] in KEYS_RIGHT and 1)])
-
-            # If snake crosses the boundaries, make it enter from the other side
-            if snake[0][0] == 0:
-                snake[0][0] = Y_SIZE - 2
-            if snake[0][1] == 0:
-                snake[0][1] = X_SIZE - 2
-            if snake[0][0] == Y_SIZE - 1:
-                snake[0][0] = 1
-            if snake[0][1] == X_SIZE - 1:
-                snake[0][1] = 1
-
-    # Control if the game must end
-    for player_id, snake in enumerate(snakes):
-        if players_alive[player_id]:
-            # Snake out of bounds
-            if BOUNDS_ENABLED:
-                if snake[0][0] == 0 or snake[0][0] == Y_SIZE - 1 or snake[0][1] == 0 or snake[0][1] == X_SIZE - 1:
-                    clear_from_win(win, snakes[player_id])
-                    clear_from_win(win, [foods[player_id]])
-                    snakes[player_id] = []
-                    players_alive[player_id] = False
-            # Snake runs over itself
-            if snake[0] in snake[1:]:
-                clear_from_win(win, snakes[player_id])
-                clear_from_win(win, [foods[player_id]])
-                snakes[player_id] = []
-                players_alive[player_id] = False
-            # Snake head touches another snake
-            for other_player_id, other_snake in enumerate(snakes):
-                if other_player_id != player_id:
-                    if snake[0] in other_snake:
-                        # Increase the other player's score
-                        scores[other_player_id] = scores[other_player_id] + SCORE_PER_KILL
-                        # Kill current snake
-                        clear_from_win(win, snakes[player_id])
-                        clear_from_win(win, [foods[player_id]])
-                        snakes[player_id] = []
-                        players_alive[player_id] = False
-    if True not in players_alive:
-        return True, players_alive, scores, snakes, foods, food_times
-
-    # Check if the snakes eat
-    for player_id, snake in enumerate(snakes):
-        if players_alive[player_id]:
-            food = foods[player_id]
-            food_time = food_times[player_id]
-            if snake[0] == food:
-                # Increase the score
-                elapsed_time = datetime.now() - food_time
-                et_seconds = elapsed_time.total_seconds() + 1
-                scores[player_id] = scores[player_id] + int(MAX_SCORE_PER_FOOD / et_seconds)
-
-                # Recalculate new food
-                foods[player_id] = [randint(1, Y_SIZE - 2), randint(1, X_SIZE - 2)]
-                food_times[player_id] = datetime.now()
-                print_char(win, foods[player_id], CHAR_FOOD, colors_per_player[player_id])
-            else:
-                # Decrease snake size (has not eaten)
-                last = snake.pop()
-                if last in foods:
-                    # If there was a food, re-print it
-                    food_player = foods.index(last)
-                    print_char(win, last, CHAR_FOOD, colors_per_player[food_player])
-                else:
-                    # Otherwise just clean the position
-                    clear_from_win(win, [last])
-
-            # Print the snake head (advance)
-            print_char(win, snake[0], CHAR_SNAKE, colors_per_player[player_id])
-
-    # Return new state
-    return False, players_alive, scores, snakes, foods, food_times
+    start = instrumentation.clock()
+    diffs = snake_engine.step(state, actions)
+    if publisher is not None:
+        publisher.publish(state, diffs)
+    simulated = instrumentation.record(snake_instrument.SPAN_SIMULATION, start)
+    renderer.draw(diffs, state.scores)
+    instrumentation.frame_displayed(instrumentation.record(snake_instrument.SPAN_RENDER, simulated))
+    return state.must_end
 
 
 #
@@ -411,7 +332,7 @@ def init_game_screen():
     curses.noecho()
     curses.curs_set(0)
 
-    win = curses.newwin(Y_SIZE, X_SIZE, 0, 0)
+    win = curses.newwin(WINDOW_Y_SIZE, WINDOW_X_SIZE, 0, 0)
     win.keypad(1)
     win.border(0)
     win.nodelay(1)
@@ -425,45 +346,64 @@ def init_game_screen():
     return win
 
 
-def run_game(win):
+def run_game(win, instrumentation=None):
     """
     Runs the game until the user requests to end or he gets killed.
 
     :param win: Window screen.
         + type: curses.Window
-    :return: Game score.
-        + type: int
+    :param instrumentation: Per-tick timings, or None if disabled.
+        + type: snake_instrument.Instrumentation
+    :return: Game result.
+        + type: snake_leaderboard.GameResult
     """
     logger.debug("Running main game method")
 
     # Initializing values
+    num_players = NUM_PLAYERS + NUM_BOTS
+    start_time = time.time()
     keys_per_player = build_keys_per_player(NUM_PLAYERS)
-    colors_per_player = build_colors_per_player(NUM_PLAYERS)
-    scores = [0 for _ in range(NUM_PLAYERS)]
-    players_alive = [True for _ in range(NUM_PLAYERS)]
-    keys = [initial_key_random(i) for i in range(NUM_PLAYERS)]
-    snakes = [initial_snake_random() for _ in range(NUM_PLAYERS)]
-    foods = [random_position() for _ in range(NUM_PLAYERS)]
-    food_times = [datetime.now() for _ in range(NUM_PLAYERS)]
-
-    # Print initial foods
-    for player_id, food in enumerate(foods):
-        print_char(win, food, CHAR_FOOD, colors_per_player[player_id])
-
-    # Main loop
+    colors_per_player = build_colors_per_player(num_players)
+    seed = snake_engine.new_seed()
+    state = snake_engine.new_fight_state(num_players, y_size=Y_SIZE, x_size=X_SIZE, bounds_enabled=BOUNDS_ENABLED,
+                                         seed=seed, initial_speed=INITIAL_SPEED)
+
+    # Print initial snakes and foods
+    def print_hud(hud_win, scores):
+        print_scores(hud_win, colors_per_player, scores[:NUM_PLAYERS])
+        print_bot_scores(hud_win, NUM_PLAYERS, scores)
+
+    renderer = snake_render.new_renderer(win, state, colors_per_player, colors_per_player, print_hud)
+    renderer.draw(state.initial_diffs(), state.scores)
+
+    # Record the game if requested
+    replay = None
+    if REPLAY_FILE is not None:
+        header = snake_replay.ReplayHeader(snake_replay.MODE_FIGHT, num_players, seed, y_size=Y_SIZE, x_size=X_SIZE,
+                                           bounds_enabled=BOUNDS_ENABLED, initial_speed=INITIAL_SPEED)
+        replay = snake_replay.ReplayWriter(REPLAY_FILE, header)
+
+    # Publish the board for external readers if requested
+    publisher = None
+    if SHARED_BOARD_NAME is not None:
+        publisher = snake_shared.BoardPublisher(SHARED_BOARD_NAME, state)
+
+    # Main loop: input is polled continuously while the ticks follow the speed of the longest snake
+    loop = snake_loop.FixedTimestepLoop(game_speed(state.snakes) / 1000.0)
+    loop.start()
+    turn_queues = [snake_input.TurnQueue() for _ in range(NUM_PLAYERS)]
+    bot_policy = snake_bots.load_policy(BOT_POLICY)
+    bots = snake_bots.BotController(dict((player_id, bot_policy) for player_id in range(NUM_PLAYERS, num_players)))
     must_end = False
     while not must_end:
-        # Print game
-        print_game_iteration(win, colors_per_player, scores, snakes)
-
         # Process events
-        events = process_events(win, keys_per_player)
-        if "global" in events:
-            event_global = events["global"]
+        event_global = process_events(win, keys_per_player, turn_queues, state.directions, instrumentation)
+        if event_global is not None:
             if event_global == KEY_SPACE:
                 # SPACE BAR pressed, pause/resume game
                 must_end = wait_for_resume_game(win)
-                # Start the loop again
+                # Restart the schedule and the loop again
+                loop.start()
                 continue
             elif event_global == KEY_ESC:
                 # ESC pressed, end game
@@ -471,36 +411,84 @@ def run_game(win):
                 # Start loop again
                 continue
 
-        # Update player keys
-        for player, event in events.items():
-            if event is not None:
-                keys[int(player)] = event
-
-        # Move snakes
-        must_end, players_alive, scores, snakes, foods, food_times = move_snakes(win, colors_per_player, keys,
-                                                                                 players_alive, scores, snakes, foods,
-                                                                                 food_times)
-
-    return scores
+        # Move snakes on every due tick, applying one queued turn per player
+        while not must_end and loop.due():
+            actions = [turn_queue.pop() for turn_queue in turn_queues]
+            if instrumentation is not None:
+                for player_id, action in enumerate(actions):
+                    if action is not None:
+                        instrumentation.turn_applied(player_id)
+            actions.extend([None] * NUM_BOTS)
+            bots.actions(state, actions)
+            if replay is not None:
+                replay.record(actions, state)
+            must_end = move_snakes(renderer, actions, state, instrumentation, publisher)
+            # Increase snake speed with its length
+            loop.interval = game_speed(state.snakes) / 1000.0
+
+        loop.idle()
+
+    if replay is not None:
+        replay.close()
+    if publisher is not None:
+        publisher.close()
+    players = snake_leaderboard.default_player_names(PLAYER_NAMES, NUM_PLAYERS) + [BOT_POLICY + " bot"] * NUM_BOTS
+    return snake_leaderboard.GameResult(snake_leaderboard.MODE_FIGHT, seed, players, state.scores, state.ticks,
+                                        time.time() - start_time)
+
+
+def rank_players(scores):
+    """
+    Sorts the players from the winner to the loser.
+
+    :param scores: Final score of each player.
+        + type: List<int>
+    :return: List of [score, player id] (ties go to the highest player id).
+        + type: List<List<int, int>>
+    """
+    final_scores = []
+    for player_id, score in enumerate(scores):
+        final_scores.append([score, player_id])
+    final_scores.sort(reverse=True)
+    return final_scores
 
 
-def end_game(scores):
+def end_game(result, instrumentation=None, leaderboard=None):
     """
     Ends the game window screen and show the result.
 
-    :param scores: User scores.
-        + type: List<int>
+    :param result: Game result.
+        + type: snake_leaderboard.GameResult
+    :param instrumentation: Per-tick timings to dump, or None if disabled.
+        + type: snake_instrument.Instrumentation
+    :param leaderboard: Leaderboard recording the result, or None if disabled.
+        + type: snake_leaderboard.LeaderboardWriter
     :return: None
     """
     logger.debug("Ending game")
     # Close window screen
     curses.endwin()
 
-    # Print score
-    final_scores = []
-    for player_id, score in enumerate(scores):
-        final_scores.append([score, player_id])
-    final_scores.sort(reverse=True)
+    # Dump the per-tick timings
+    if instrumentation is not None and INSTRUMENTATION_FILE is not None:
+        instrumentation.dump(INSTRUMENTATION_FILE)
+
+    # Record the scores (written on the background)
+    if leaderboard is not None:
+        leaderboard.record(result)
+
+    print_final_scores(result.scores)
+
+
+def print_final_scores(scores):
+    """
+    Prints the final scores and the winner.
+
+    :param scores: Final score of each player.
+        + type: List<int>
+    :return: None
+    """
+    final_scores = rank_players(scores)
 
     print()
     print("FINAL SCORES:")
@@ -525,9 +513,16 @@ def main():
     :return: None
     """
     logger.info("Snake game start")
+    if SHARED_BOARD_NAME is not None:
+        # Fail before the terminal enters the curses mode
+        snake_shared.check_board(NUM_PLAYERS + NUM_BOTS, Y_SIZE, X_SIZE)
+    instrumentation = snake_instrument.new_instrumentation(INSTRUMENTATION_FILE, NUM_PLAYERS)
+    leaderboard = snake_leaderboard.new_writer(LEADERBOARD_FILE)
     win = init_game_screen()
-    scores = run_game(win)
-    end_game(scores)
+    result = run_game(win, instrumentation)
+    end_game(result, instrumentation, leaderboard)
+    if leaderboard is not None:
+        leaderboard.close()
     logger.info("Snake game end")
 
 
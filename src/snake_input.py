@@ -0,0 +1,106 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+from collections import deque
+import logging
+
+from snake_engine import OPPOSITE_DIRECTIONS
+
+# CONSTANTS
+# Maximum pending turns per player (extra key presses are dropped)
+TURN_QUEUE_SIZE = 3
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# TURN QUEUE
+#
+
+def is_valid_turn(direction, current, allow_reversal=False):
+    """
+    Checks whether a turn changes the direction of a snake without reversing it.
+
+    :param direction: Requested direction.
+        + type: int
+    :param current: Current direction of the snake.
+        + type: int
+    :param allow_reversal: Whether turning 180 degrees is valid.
+        + type: boolean
+    :return: True if the turn is valid.
+        + type: boolean
+    """
+    return direction != current and (allow_reversal or direction != OPPOSITE_DIRECTIONS[current])
+
+
+class TurnQueue(object):
+    """
+    Bounded queue of the pending turns of one player.
+
+    All the key presses received between two ticks are queued and one turn is applied per tick, so fast
+    sequences (e.g. UP then LEFT) are not lost. Turns that would not change the direction are rejected when
+    queued, and so are the turns that would reverse it 180 degrees (killing the snake) unless allowed.
+    """
+    __slots__ = ['_turns', '_allow_reversal']
+
+    def __init__(self, size=TURN_QUEUE_SIZE, allow_reversal=False):
+        """
+        Creates a new empty turn queue.
+
+        :param size: Maximum pending turns.
+            + type: int
+        :param allow_reversal: Whether turns reversing the snake are queued (as the original single player game).
+            + type: boolean
+        """
+        self._turns = deque(maxlen=size)
+        self._allow_reversal = allow_reversal
+
+    def __len__(self):
+        return len(self._turns)
+
+    def push(self, direction, current):
+        """
+        Queues a new turn.
+
+        :param direction: Requested direction.
+            + type: int
+        :param current: Current direction of the snake.
+            + type: int
+        :return: True if the turn has been queued.
+            + type: boolean
+        """
+        last = self._turns[-1] if self._turns else current
+        if not is_valid_turn(direction, last, self._allow_reversal):
+            return False
+        if len(self._turns) == self._turns.maxlen:
+            return False
+        self._turns.append(direction)
+        return True
+
+    def pop(self):
+        """
+        Returns the next turn to apply.
+
+        :return: The next direction or None if there are no pending turns.
+            + type: int or None
+        """
+        if self._turns:
+            return self._turns.popleft()
+        return None
+
+    def clear(self):
+        """
+        Drops all the pending turns.
+
+        :return: None
+        """
+        self._turns.clear()
@@ -0,0 +1,308 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+from collections import deque
+import json
+import logging
+import time
+
+# CONSTANTS
+# Linear buckets per power of two of the histograms (relative error below 1 / 2 ** (SUB_BUCKET_BITS - 1))
+SUB_BUCKET_BITS = 5
+# Largest recorded value, in microseconds (about 12 days)
+MAX_VALUE_BITS = 40
+
+# Recorded spans
+SPAN_INPUT = "input"
+SPAN_SIMULATION = "simulation"
+SPAN_RENDER = "render"
+SPAN_INPUT_TO_DISPLAY = "input_to_display"
+
+SPANS = [SPAN_INPUT, SPAN_SIMULATION, SPAN_RENDER, SPAN_INPUT_TO_DISPLAY]
+
+PERCENTILES = [50, 90, 99, 99.9]
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+# Functions called with (span name, start, end) after each recorded span
+_hooks = []
+
+
+#
+# PROFILER HOOKS
+#
+
+def register_hook(hook):
+    """
+    Registers a function called after each recorded span with the span name and its start and end times
+    (time.perf_counter seconds). Registering a hook enables the instrumentation of the next games even if
+    no dump file is configured, so external profilers can attach without touching the game code.
+
+    :param hook: Function receiving (span name, start, end).
+        + type: function
+    :return: None
+    """
+    _hooks.append(hook)
+
+
+def unregister_hook(hook):
+    """
+    Removes a registered hook.
+
+    :param hook: Registered function.
+        + type: function
+    :return: None
+    """
+    _hooks.remove(hook)
+
+
+#
+# HISTOGRAM
+#
+
+class Histogram(object):
+    """
+    Log-linear histogram of integer values (microseconds).
+
+    Values below 2 ** SUB_BUCKET_BITS have their own bucket, and every following power of two is split in
+    2 ** (SUB_BUCKET_BITS - 1) linear buckets. Recording is O(1) without allocations and the memory is fixed,
+    whatever the number of recorded values.
+    """
+    __slots__ = ['counts', 'count', 'total', 'min', 'max']
+
+    def __init__(self):
+        """
+        Creates a new empty histogram.
+        """
+        half = 1 << (SUB_BUCKET_BITS - 1)
+        self.counts = [0] * ((MAX_VALUE_BITS - SUB_BUCKET_BITS + 2) * half)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def bucket_index(value):
+        """
+        Returns the bucket of a value.
+
+        :param value: Non negative value.
+            + type: int
+        :return: The bucket index.
+            + type: int
+        """
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+        return (shift << (SUB_BUCKET_BITS - 1)) + (value >> shift)
+
+    @staticmethod
+    def bucket_value(index):
+        """
+        Returns the lowest value of a bucket.
+
+        :param index: Bucket index.
+            + type: int
+        :return: The lowest value of the bucket.
+            + type: int
+        """
+        if index < (1 << SUB_BUCKET_BITS):
+            return index
+        half = 1 << (SUB_BUCKET_BITS - 1)
+        shift = index // half - 1
+        return (index - shift * half) << shift
+
+    def record(self, value):
+        """
+        Records a value.
+
+        :param value: Value in microseconds (negative values are recorded as 0).
+            + type: int
+        :return: None
+        """
+        value = max(0, int(value))
+        index = min(self.bucket_index(value), len(self.counts) - 1)
+        self.counts[index] = self.counts[index] + 1
+        self.count = self.count + 1
+        self.total = self.total + value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """
+        Returns an approximate percentile (lowest value of the bucket containing it).
+
+        :param p: Percentile (0 - 100).
+            + type: float
+        :return: The percentile, or 0 if the histogram is empty.
+            + type: int
+        """
+        if self.count == 0:
+            return 0
+        rank = max(1, int(p / 100.0 * self.count + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen = seen + count
+            if seen >= rank:
+                return min(self.bucket_value(index), self.max)
+        return self.max
+
+    def to_dict(self):
+        """
+        Summarizes the histogram.
+
+        :return: Count, mean, min, max, percentiles and non-empty buckets (lowest value, count).
+            + type: dict
+        """
+        summary = {
+            "count": self.count,
+            "mean_us": self.total / float(self.count) if self.count else 0.0,
+            "min_us": self.min or 0,
+            "max_us": self.max,
+        }
+        for p in PERCENTILES:
+            summary["p" + str(p) + "_us"] = self.percentile(p)
+        summary["buckets"] = [[self.bucket_value(index), count] for index, count in enumerate(self.counts) if count]
+        return summary
+
+
+#
+# INSTRUMENTATION
+#
+
+class Instrumentation(object):
+    """
+    Per-tick timings of a game: input handling, simulation, render and input-to-display latency.
+
+    Typical usage on the game loop:
+        start = instrumentation.clock()
+        ...
+        instrumentation.record(SPAN_SIMULATION, start)
+
+    The input-to-display latency goes from the key press being queued (input_queued) until the frame showing
+    the turn has been drawn (frame_displayed), through the tick applying it (turn_applied).
+    """
+
+    def __init__(self, num_players=1, clock=time.perf_counter, hooks=None):
+        """
+        Creates a new instrumentation with empty histograms.
+
+        :param num_players: Number of local players.
+            + type: int
+        :param clock: Clock returning seconds.
+            + type: function
+        :param hooks: Functions called after each span (defaults to the registered hooks).
+            + type: List<function>
+        """
+        self.clock = clock
+        self.hooks = hooks if hooks is not None else _hooks
+        self.histograms = dict((span, Histogram()) for span in SPANS)
+        self.ticks = 0
+        self._queued = [deque() for _ in range(num_players)]
+        self._applied = []
+
+    def record(self, span, start, end=None):
+        """
+        Records a span that started at the given time.
+
+        :param span: Span name.
+            + type: str
+        :param start: Start time (clock seconds).
+            + type: float
+        :param end: End time (defaults to now).
+            + type: float
+        :return: The end time.
+            + type: float
+        """
+        if end is None:
+            end = self.clock()
+        self.histograms[span].record((end - start) * 1e6)
+        for hook in self.hooks:
+            hook(span, start, end)
+        return end
+
+    def input_queued(self, player_id):
+        """
+        Marks that a turn of a player has been queued.
+
+        :param player_id: Player id.
+            + type: int
+        :return: None
+        """
+        self._queued[player_id].append(self.clock())
+
+    def turn_applied(self, player_id):
+        """
+        Marks that the oldest queued turn of a player has been applied on the current tick.
+
+        :param player_id: Player id.
+            + type: int
+        :return: None
+        """
+        if self._queued[player_id]:
+            self._applied.append(self._queued[player_id].popleft())
+
+    def frame_displayed(self, end=None):
+        """
+        Marks that a frame has been drawn, closing the latency of the turns applied since the previous one.
+
+        :param end: Display time (defaults to now).
+            + type: float
+        :return: None
+        """
+        self.ticks = self.ticks + 1
+        if self._applied:
+            if end is None:
+                end = self.clock()
+            for start in self._applied:
+                self.record(SPAN_INPUT_TO_DISPLAY, start, end)
+            del self._applied[:]
+
+    def to_dict(self):
+        """
+        Summarizes all the histograms.
+
+        :return: Ticks and summary of each histogram.
+            + type: dict
+        """
+        return {"ticks": self.ticks,
+                "histograms": dict((span, histogram.to_dict()) for span, histogram in self.histograms.items())}
+
+    def dump(self, path):
+        """
+        Writes the summary of all the histograms as JSON.
+
+        :param path: File path.
+            + type: str
+        :return: None
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        logger.debug("Instrumentation dumped to " + str(path))
+
+
+def new_instrumentation(path, num_players=1):
+    """
+    Creates the instrumentation of a game if it is enabled, either by a dump file or by a registered hook.
+
+    :param path: Dump file path, or None.
+        + type: str or None
+    :param num_players: Number of local players.
+        + type: int
+    :return: The instrumentation, or None if it is disabled.
+        + type: Instrumentation or None
+    """
+    if path is None and not _hooks:
+        return None
+    return Instrumentation(num_players)
@@ -0,0 +1,491 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+import argparse
+import logging
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+# CONSTANTS
+MODE_SNAKE = "snake"
+MODE_FIGHT = "fight"
+MODE_SERVER = "server"
+MODES = [MODE_SNAKE, MODE_FIGHT, MODE_SERVER]
+
+# Games written on each transaction at most
+WRITE_BATCH_SIZE = 256
+# Seconds a game waits for other games to be written on the same transaction
+WRITE_FLUSH_INTERVAL = 0.5
+
+# Seconds a connection waits for the database to be unlocked by another process
+LOCK_TIMEOUT = 10.0
+
+DEFAULT_TOP = 10
+DEFAULT_HISTORY = 20
+
+# Seeds are unsigned 64 bit values but SQLite integers are signed
+SEED_RANGE = 1 << 64
+MAX_SIGNED_SEED = 1 << 63
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    mode TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    ended_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    ticks INTEGER NOT NULL,
+    num_players INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scores (
+    game_id INTEGER NOT NULL REFERENCES games(id),
+    player_id INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    ended_at REAL NOT NULL
+);
+-- Top-N and percentiles: range scans on the scores of a mode, already sorted
+CREATE INDEX IF NOT EXISTS scores_by_mode ON scores (mode, score DESC);
+-- Player history: latest games of a player first
+CREATE INDEX IF NOT EXISTS scores_by_player ON scores (player, ended_at DESC);
+-- Scores of a game
+CREATE INDEX IF NOT EXISTS scores_by_game ON scores (game_id);
+"""
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+# Marks the end of the writer queue
+_STOP = object()
+
+
+#
+# HELPER METHODS
+#
+
+def connect(path):
+    """
+    Opens a leaderboard database, creating its tables and indexes if needed.
+
+    The database uses write-ahead logging, so readers (e.g. the leaderboard command) never block the writer and
+    commits only append to the log.
+
+    :param path: SQLite file path.
+        + type: str
+    :return: The connection.
+        + type: sqlite3.Connection
+    """
+    connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def seed_to_db(seed):
+    """
+    Converts an unsigned 64 bit seed to the signed value stored on the database.
+
+    :param seed: Game seed.
+        + type: int
+    :return: The stored value.
+        + type: int
+    """
+    return seed - SEED_RANGE if seed >= MAX_SIGNED_SEED else seed
+
+
+def seed_from_db(value):
+    """
+    Converts a stored seed back to the unsigned 64 bit game seed.
+
+    :param value: Stored value.
+        + type: int
+    :return: The game seed.
+        + type: int
+    """
+    return value + SEED_RANGE if value < 0 else value
+
+
+def default_player_names(names, num_players):
+    """
+    Completes the configured player names with "Player <id>" for the players without name.
+
+    :param names: Configured names.
+        + type: List<str>
+    :param num_players: Number of players.
+        + type: int
+    :return: The name of each player.
+        + type: List<str>
+    """
+    return [names[player_id] if player_id < len(names) else "Player " + str(player_id)
+            for player_id in range(num_players)]
+
+
+#
+# GAME RESULTS
+#
+
+class GameResult(object):
+    """
+    Final scores of a game, as recorded on the leaderboard.
+    """
+
+    def __init__(self, mode, seed, players, scores, ticks, duration, ended_at=None):
+        """
+        Creates a new game result.
+
+        :param mode: Game mode (MODE_SNAKE, MODE_FIGHT or MODE_SERVER).
+            + type: str
+        :param seed: Game seed (replays can be reproduced from it).
+            + type: int
+        :param players: Name of each player.
+            + type: List<str>
+        :param scores: Final score of each player.
+            + type: List<int>
+        :param ticks: Simulated ticks.
+            + type: int
+        :param duration: Duration of the game in seconds.
+            + type: float
+        :param ended_at: End time (seconds since the epoch, defaults to now).
+            + type: float or None
+        """
+        self.mode = mode
+        self.seed = seed
+        self.players = list(players)
+        self.scores = list(scores)
+        self.ticks = ticks
+        self.duration = duration
+        self.ended_at = ended_at if ended_at is not None else time.time()
+
+    def ranks(self):
+        """
+        Ranks the players by score (players with the same score share the rank).
+
+        :return: The rank of each player, starting at 1.
+            + type: List<int>
+        """
+        return [1 + sum(1 for other in self.scores if other > score) for score in self.scores]
+
+
+def write_results(connection, results):
+    """
+    Writes game results on a single transaction.
+
+    :param connection: Leaderboard connection.
+        + type: sqlite3.Connection
+    :param results: Game results.
+        + type: List<GameResult>
+    :return: None
+    """
+    with connection:
+        for result in results:
+            cursor = connection.execute(
+                "INSERT INTO games (mode, seed, ended_at, duration, ticks, num_players) VALUES (?, ?, ?, ?, ?, ?)",
+                (result.mode, seed_to_db(result.seed), result.ended_at, result.duration, result.ticks,
+                 len(result.scores)))
+            game_id = cursor.lastrowid
+            connection.executemany(
+                "INSERT INTO scores (game_id, player_id, player, mode, score, rank, ended_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(game_id, player_id, result.players[player_id], result.mode, score, rank, result.ended_at)
+                 for player_id, (score, rank) in enumerate(zip(result.scores, result.ranks()))])
+
+
+#
+# WRITER
+#
+
+class LeaderboardWriter(object):
+    """
+    Records game results on a background thread, so the end of a game or the game loop of the server never
+    waits for the disk.
+
+    Results are queued without blocking and written in batches: the thread waits up to WRITE_FLUSH_INTERVAL
+    after a result for more results, and writes up to WRITE_BATCH_SIZE games per transaction. Closing the
+    writer writes the queued results.
+    """
+
+    def __init__(self, path, batch_size=WRITE_BATCH_SIZE, flush_interval=WRITE_FLUSH_INTERVAL):
+        """
+        Creates a new writer and starts its thread.
+
+        :param path: SQLite file path.
+            + type: str
+        :param batch_size: Games written on each transaction at most.
+            + type: int
+        :param flush_interval: Seconds a game waits for other games to be written on the same transaction.
+            + type: float
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        # The connection is opened here so a wrong path fails on the caller; SQLite connections can only be used
+        # by their thread, so the writer thread opens its own one
+        connect(path).close()
+        self._thread = threading.Thread(target=self._run, name="leaderboard", daemon=True)
+        self._thread.start()
+
+    def record(self, result):
+        """
+        Queues a game result.
+
+        :param result: Game result.
+            + type: GameResult
+        :return: None
+        """
+        self._queue.put(result)
+
+    def _run(self):
+        """
+        Writes the queued results until the writer is closed. Runs on the writer thread.
+
+        :return: None
+        """
+        connection = connect(self.path)
+        try:
+            stopping = False
+            while not stopping:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while batch[-1] is not _STOP and len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                if batch[-1] is _STOP:
+                    stopping = True
+                    batch.pop()
+                if not batch:
+                    continue
+                try:
+                    write_results(connection, batch)
+                    self.written = self.written + len(batch)
+                except Exception:
+                    # Losing some scores is better than stopping the games or the writer thread
+                    self.failed = self.failed + len(batch)
+                    logger.exception("Could not record " + str(len(batch)) + " games on the leaderboard")
+        finally:
+            connection.close()
+
+    def close(self):
+        """
+        Writes the queued results and stops the writer thread.
+
+        :return: None
+        """
+        self._queue.put(_STOP)
+        self._thread.join()
+
+
+def new_writer(path):
+    """
+    Creates the leaderboard writer of a game if it is enabled.
+
+    :param path: SQLite file path, or None.
+        + type: str or None
+    :return: The writer, or None if the leaderboard is disabled.
+        + type: LeaderboardWriter or None
+    """
+    if path is None:
+        return None
+    return LeaderboardWriter(path)
+
+
+#
+# QUERIES
+#
+
+class Leaderboard(object):
+    """
+    Read access to a leaderboard database. Every query is answered from an index: top-N and percentiles walk
+    the scores of a mode already sorted, and the history of a player reads its latest games first.
+    """
+
+    def __init__(self, path):
+        """
+        Opens a leaderboard database.
+
+        :param path: SQLite file path.
+            + type: str
+        """
+        self.connection = connect(path)
+
+    @staticmethod
+    def _rows(cursor):
+        """
+        Converts the rows of a score query to dictionaries.
+
+        :param cursor: Executed query.
+            + type: sqlite3.Cursor
+        :return: The rows.
+            + type: List<dict>
+        """
+        rows = []
+        for row in cursor:
+            row = dict(row)
+            row["seed"] = seed_from_db(row["seed"])
+            rows.append(row)
+        return rows
+
+    def top(self, mode, limit=DEFAULT_TOP):
+        """
+        Returns the best scores of a mode.
+
+        :param mode: Game mode.
+            + type: str
+        :param limit: Number of scores.
+            + type: int
+        :return: The score, player, rank, game id, seed, duration, ticks and end time of each score.
+            + type: List<dict>
+        """
+        return self._rows(self.connection.execute(
+            "SELECT s.score, s.player, s.rank, s.game_id, g.seed, g.duration, g.ticks, s.ended_at "
+            "FROM scores AS s JOIN games AS g ON g.id = s.game_id "
+            "WHERE s.mode = ? ORDER BY s.score DESC LIMIT ?", (mode, limit)))
+
+    def history(self, player, limit=DEFAULT_HISTORY):
+        """
+        Returns the latest games of a player.
+
+        :param player: Player name.
+            + type: str
+        :param limit: Number of games.
+            + type: int
+        :return: The score, mode, rank, game id, seed, duration, ticks and end time of each game.
+            + type: List<dict>
+        """
+        return self._rows(self.connection.execute(
+            "SELECT s.score, s.mode, s.rank, s.game_id, g.seed, g.duration, g.ticks, s.ended_at "
+            "FROM scores AS s JOIN games AS g ON g.id = s.game_id "
+            "WHERE s.player = ? ORDER BY s.ended_at DESC LIMIT ?", (player, limit)))
+
+    def count(self, mode):
+        """
+        Returns the number of scores of a mode.
+
+        :param mode: Game mode.
+            + type: str
+        :return: The number of scores.
+            + type: int
+        """
+        return self.connection.execute("SELECT COUNT(*) FROM scores WHERE mode = ?", (mode,)).fetchone()[0]
+
+    def percentile_rank(self, mode, score):
+        """
+        Returns the percentage of scores of a mode below a score.
+
+        :param mode: Game mode.
+            + type: str
+        :param score: Score.
+            + type: int
+        :return: The percentile rank (0 - 100), or None if the mode has no scores.
+            + type: float or None
+        """
+        total = self.count(mode)
+        if total == 0:
+            return None
+        below = self.connection.execute("SELECT COUNT(*) FROM scores WHERE mode = ? AND score < ?",
+                                        (mode, score)).fetchone()[0]
+        return 100.0 * below / total
+
+    def score_at_percentile(self, mode, p):
+        """
+        Returns the score of a mode at a percentile (nearest rank).
+
+        :param mode: Game mode.
+            + type: str
+        :param p: Percentile (0 - 100).
+            + type: float
+        :return: The score, or None if the mode has no scores.
+            + type: int or None
+        """
+        total = self.count(mode)
+        if total == 0:
+            return None
+        offset = min(total - 1, max(0, int(p / 100.0 * total + 0.5) - 1))
+        return self.connection.execute("SELECT score FROM scores WHERE mode = ? "
+                                       "ORDER BY score LIMIT 1 OFFSET ?", (mode, offset)).fetchone()[0]
+
+    def close(self):
+        """
+        Closes the database.
+
+        :return: None
+        """
+        self.connection.close()
+
+
+#
+# MAIN
+#
+
+def main():
+    """
+    Main function to show the leaderboard.
+
+    :return: Exit code.
+        + type: int
+    """
+    parser = argparse.ArgumentParser(description="Snake leaderboard")
+    parser.add_argument("database", help="Leaderboard SQLite file")
+    parser.add_argument("--mode", choices=MODES, default=MODE_SNAKE, help="Game mode")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="Number of best scores shown")
+    parser.add_argument("--player", help="Show the latest games of this player instead")
+    parser.add_argument("--history", type=int, default=DEFAULT_HISTORY, help="Number of latest games shown")
+    parser.add_argument("--score", type=int, help="Also show the percentile rank of this score")
+    parser.add_argument("--percentiles", type=float, nargs="*", default=[50, 90, 99],
+                        help="Score percentiles shown")
+    args = parser.parse_args()
+
+    leaderboard = Leaderboard(args.database)
+    try:
+        if args.player is not None:
+            print("%-6s %8s %4s %10s %8s %s" % ("mode", "score", "rank", "duration", "ticks", "seed"))
+            for row in leaderboard.history(args.player, args.history):
+                print("%-6s %8d %4d %9.1fs %8d %d" % (row["mode"], row["score"], row["rank"], row["duration"],
+                                                     row["ticks"], row["seed"]))
+            return 0
+
+        print("%-4s %-24s %8s %10s %8s %s" % ("#", "player", "score", "duration", "ticks", "seed"))
+        for position, row in enumerate(leaderboard.top(args.mode, args.top)):
+            print("%-4d %-24s %8d %9.1fs %8d %d" % (position + 1, row["player"], row["score"], row["duration"],
+                                                    row["ticks"], row["seed"]))
+        print()
+        print("Scores: " + str(leaderboard.count(args.mode)))
+        for p in args.percentiles:
+            print("p%g: %s" % (p, leaderboard.score_at_percentile(args.mode, p)))
+        if args.score is not None:
+            rank = leaderboard.percentile_rank(args.mode, args.score)
+            if rank is not None:
+                print("Score %d is above %.1f%% of the scores" % (args.score, rank))
+    finally:
+        leaderboard.close()
+    return 0
+
+
+#
+# ENTRY POINT
+#
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s | %(levelname)s | %(name)s - %(message)s')
+    sys.exit(main())
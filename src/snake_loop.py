@@ -0,0 +1,123 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+import time
+import logging
+
+# CONSTANTS
+# Maximum seconds slept between two input polls
+POLL_INTERVAL = 0.005
+
+# Maximum ticks simulated back to back to catch up before dropping the remaining lag
+MAX_CATCH_UP_TICKS = 5
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# FIXED TIMESTEP LOOP
+#
+
+class FixedTimestepLoop(object):
+    """
+    Schedules the simulation ticks on a monotonic clock, independently of the input polling.
+
+    Ticks are due at exact multiples of the tick interval (next_tick accumulates the interval instead of
+    restarting from the current time), so the cadence does not drift with the time spent simulating,
+    rendering or handling input. When the loop falls behind, the lagged ticks are simulated back to back
+    up to MAX_CATCH_UP_TICKS, and any further lag is dropped and counted.
+
+    Typical usage:
+        loop.start()
+        while running:
+            poll_input()
+            while loop.due():
+                simulate()
+            render()
+            loop.idle()
+    """
+
+    def __init__(self, interval, clock=time.monotonic, sleep=time.sleep, poll_interval=POLL_INTERVAL,
+                 max_catch_up=MAX_CATCH_UP_TICKS):
+        """
+        Creates a new loop.
+
+        :param interval: Tick interval in seconds (can be updated at any time through the attribute).
+            + type: float
+        :param clock: Monotonic clock returning seconds.
+            + type: function
+        :param sleep: Function sleeping the given seconds.
+            + type: function
+        :param poll_interval: Maximum seconds slept between two input polls.
+            + type: float
+        :param max_catch_up: Maximum ticks simulated back to back when the loop is late.
+            + type: int
+        """
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.poll_interval = poll_interval
+        self.max_catch_up = max_catch_up
+
+        self.next_tick = None
+        self.ticks = 0
+        self.late_ticks = 0
+        self.dropped_ticks = 0
+        self._catch_up = 0
+
+    def start(self):
+        """
+        (Re)starts the schedule, the first tick is due after one interval. Must be called again after
+        pausing the game so the paused time is not caught up.
+
+        :return: None
+        """
+        self.next_tick = self.clock() + self.interval
+        self._catch_up = 0
+
+    def due(self):
+        """
+        Checks whether a tick must be simulated now, consuming it from the schedule.
+
+        :return: True if the caller must simulate one tick.
+            + type: boolean
+        """
+        now = self.clock()
+        if now < self.next_tick:
+            self._catch_up = 0
+            return False
+
+        if self._catch_up >= self.max_catch_up:
+            # Too far behind, drop the remaining lag instead of bursting
+            missed = int((now - self.next_tick) / self.interval) + 1
+            self.dropped_ticks = self.dropped_ticks + missed
+            logger.debug("Game loop dropped " + str(missed) + " ticks")
+            self.next_tick = now + self.interval
+            self._catch_up = 0
+            return False
+
+        if now - self.next_tick >= self.interval:
+            self.late_ticks = self.late_ticks + 1
+        self._catch_up = self._catch_up + 1
+        self.next_tick = self.next_tick + self.interval
+        self.ticks = self.ticks + 1
+        return True
+
+    def idle(self):
+        """
+        Sleeps until the next tick is due or the next input poll, whatever comes first.
+
+        :return: None
+        """
+        remaining = self.next_tick - self.clock()
+        if remaining > 0:
+            self.sleep(min(remaining, self.poll_interval))
@@ -0,0 +1,341 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import threading
+
+# CONSTANTS
+METRICS_HOST = '127.0.0.1'
+DEFAULT_METRICS_PORT = 9777
+METRICS_PATH = '/metrics'
+
+# Content type of the text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Default histogram buckets, in seconds
+DEFAULT_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# HELPER METHODS
+#
+
+def format_value(value):
+    """
+    Formats a sample value following the text exposition format.
+
+    :param value: Sample value.
+        + type: int or float
+    :return: The formatted value.
+        + type: str
+    """
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def format_labels(label_names, label_values):
+    """
+    Formats the labels of a sample.
+
+    :param label_names: Label names.
+        + type: Tuple<str>
+    :param label_values: Label values.
+        + type: Tuple
+    :return: The formatted labels (empty if there are no labels).
+        + type: str
+    """
+    if not label_names:
+        return ''
+    pairs = []
+    for name, value in zip(label_names, label_values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(name + '="' + value + '"')
+    return '{' + ','.join(pairs) + '}'
+
+
+#
+# METRICS
+#
+
+class Counter(object):
+    """
+    Monotonic counter, optionally split by labels.
+
+    Recording is a plain addition from the thread owning the metric: there are no locks, so the tick path is
+    never blocked by a scrape. The scrape runs on another thread and may read a counter in the middle of a
+    tick, which only delays the sample until the next scrape.
+    """
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        """
+        Creates a new counter.
+
+        :param name: Metric name.
+            + type: str
+        :param help_text: Metric description.
+            + type: str
+        :param label_names: Label names.
+            + type: Tuple<str>
+        """
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.values = {} if self.label_names else {(): 0}
+
+    def inc(self, amount=1, label_values=()):
+        """
+        Increases the counter.
+
+        :param amount: Non negative increase.
+            + type: int or float
+        :param label_values: Label values of the increased sample.
+            + type: Tuple
+        :return: None
+        """
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def value(self, label_values=()):
+        """
+        Returns the current value of a sample.
+
+        :param label_values: Label values of the sample.
+            + type: Tuple
+        :return: The value.
+            + type: int or float
+        """
+        return self.values.get(label_values, 0)
+
+    def samples(self):
+        """
+        Returns the samples of the counter.
+
+        :return: List of (sample name, formatted labels, value).
+            + type: List<Tuple<str, str, int or float>>
+        """
+        return [(self.name, format_labels(self.label_names, label_values), value)
+                for label_values, value in sorted(list(self.values.items()))]
+
+
+class Gauge(object):
+    """
+    Value that can go up and down, either set on the owner thread or computed by a function on each scrape.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, function=None):
+        """
+        Creates a new gauge.
+
+        :param name: Metric name.
+            + type: str
+        :param help_text: Metric description.
+            + type: str
+        :param function: Function returning the value on each scrape, or None to use the set value.
+            + type: function
+        """
+        self.name = name
+        self.help_text = help_text
+        self.function = function
+        self.current = 0
+
+    def set(self, value):
+        """
+        Sets the gauge value.
+
+        :param value: New value.
+            + type: int or float
+        :return: None
+        """
+        self.current = value
+
+    def samples(self):
+        """
+        Returns the samples of the gauge.
+
+        :return: List of (sample name, formatted labels, value).
+            + type: List<Tuple<str, str, int or float>>
+        """
+        value = self.function() if self.function is not None else self.current
+        return [(self.name, '', value)]
+
+
+class Histogram(object):
+    """
+    Histogram of observations on fixed buckets. The counts are stored per bucket and only accumulated when
+    scraped, so an observation is a binary search and two additions.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        """
+        Creates a new histogram.
+
+        :param name: Metric name.
+            + type: str
+        :param help_text: Metric description.
+            + type: str
+        :param buckets: Sorted upper bounds of the buckets (the +Inf bucket is added).
+            + type: List<float>
+        """
+        self.name = name
+        self.help_text = help_text
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        """
+        Records an observation.
+
+        :param value: Observed value.
+            + type: float
+        :return: None
+        """
+        index = bisect_left(self.buckets, value)
+        self.counts[index] = self.counts[index] + 1
+        self.total = self.total + value
+
+    def samples(self):
+        """
+        Returns the samples of the histogram: cumulative buckets, sum and count.
+
+        :return: List of (sample name, formatted labels, value).
+            + type: List<Tuple<str, str, int or float>>
+        """
+        counts = list(self.counts)
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + [float('inf')], counts):
+            cumulative = cumulative + count
+            samples.append((self.name + '_bucket', '{le="' + format_value(float(bound)) + '"}', cumulative))
+        samples.append((self.name + '_sum', '', self.total))
+        samples.append((self.name + '_count', '', cumulative))
+        return samples
+
+
+class MetricsRegistry(object):
+    """
+    Set of metrics exposed together.
+    """
+
+    def __init__(self):
+        """
+        Creates a new empty registry.
+        """
+        self.metrics = []
+
+    def register(self, metric):
+        """
+        Adds a metric to the registry.
+
+        :param metric: Counter, gauge or histogram.
+            + type: Counter or Gauge or Histogram
+        :return: The metric.
+            + type: Counter or Gauge or Histogram
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Renders all the metrics in the text exposition format.
+
+        :return: The exposition text.
+            + type: str
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP ' + metric.name + ' ' + metric.help_text)
+            lines.append('# TYPE ' + metric.name + ' ' + metric.kind)
+            for name, labels, value in metric.samples():
+                lines.append(name + labels + ' ' + format_value(value))
+        return '\n'.join(lines) + '\n'
+
+
+#
+# HTTP ENDPOINT
+#
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Serves the registry of the server on METRICS_PATH.
+    """
+
+    def do_GET(self):
+        if self.path.split('?')[0] != METRICS_PATH:
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        logger.debug("Metrics request: " + fmt % args)
+
+
+class MetricsServer(object):
+    """
+    HTTP endpoint exposing a registry from a background thread, so scrapes never run on the game loop.
+    """
+
+    def __init__(self, registry, host=METRICS_HOST, port=DEFAULT_METRICS_PORT):
+        """
+        Creates a new metrics endpoint.
+
+        :param registry: Exposed metrics.
+            + type: MetricsRegistry
+        :param host: Address to listen on.
+            + type: str
+        :param port: Port to listen on (0 picks a free port).
+            + type: int
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._httpd = None
+        self._thread = None
+
+    def start(self):
+        """
+        Starts listening for scrapes on a daemon thread.
+
+        :return: None
+        """
+        self._httpd = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.registry = self.registry
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        logger.info("Metrics on http://" + self.host + ":" + str(self.port) + METRICS_PATH)
+
+    def close(self):
+        """
+        Stops the endpoint.
+
+        :return: None
+        """
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
@@ -0,0 +1,214 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+from collections import deque
+import logging
+
+import snake_engine
+import snake_input
+import snake_replay
+
+# CONSTANTS
+# Maximum ticks predicted ahead of the last authoritative tick
+ROLLBACK_WINDOW = 16
+
+# Ticks predicted ahead of the authoritative ticks in the self-check
+VERIFY_LEAD = 4
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# PREDICTION
+#
+
+class RollbackPredictor(object):
+    """
+    Predicts a networked game locally so the own snake reacts on the next local tick, whatever the network
+    delay.
+
+    The predicted state runs ahead of the authoritative ticks assuming the remote players keep their
+    direction. Each predicted tick keeps a snapshot of the state before it and the actions it assumed, in a
+    ring of at most ROLLBACK_WINDOW ticks. When the server confirms a tick with the same actions the snapshot
+    is simply dropped; otherwise the state is restored from the snapshot, the authoritative actions are
+    applied, and the remaining predicted ticks are re-simulated.
+
+    The server periodically sends the hash of its state, compared with the hash of the authoritative state of
+    the prediction (see confirmed_digest). If the game drifted, the full state requested to the server replaces
+    the prediction (see resync).
+
+    The own turns are sent to the server tagged with the tick they were predicted on. A turn that reaches
+    the server too late is applied on a later tick: the prediction then assumes it on the next tick and the
+    lead over the authoritative ticks grows by one tick, until the turns reach the server in time.
+    """
+
+    def __init__(self, header, player_id, window=ROLLBACK_WINDOW):
+        """
+        Creates a new predictor on the initial state of a match.
+
+        :param header: Match header.
+            + type: ReplayHeader
+        :param player_id: Player controlled by this client.
+            + type: int
+        :param window: Maximum ticks predicted ahead of the last authoritative tick.
+            + type: int
+        """
+        self.header = header
+        self.player_id = player_id
+        self.window = window
+        self.state = header.new_state()
+        self.confirmed_ticks = 0
+        self.lead = 0
+        self.rollbacks = 0
+        self.resyncs = 0
+        self._history = deque()
+
+    def can_predict(self):
+        """
+        Checks whether another tick can be predicted without exceeding the rollback window.
+
+        :return: True if predict can be called.
+            + type: boolean
+        """
+        return len(self._history) < self.window and not self.state.must_end
+
+    def needs_lead(self):
+        """
+        Checks whether the prediction is behind its target lead and must simulate extra ticks.
+
+        :return: True if a tick must be predicted now.
+            + type: boolean
+        """
+        return len(self._history) < self.lead and self.can_predict()
+
+    def predict(self, direction):
+        """
+        Simulates the next tick assuming the remote players keep their direction.
+
+        :param direction: Own turn applied on this tick, or None.
+            + type: int or None
+        :return: Cell diffs produced by the tick.
+            + type: List<Tuple<int, int, int>>
+        """
+        actions = [None] * self.state.num_players
+        actions[self.player_id] = direction
+        self._history.append((snake_replay.pack_state(self.state), actions))
+        return snake_engine.step(self.state, actions)
+
+    def confirm(self, tick, actions):
+        """
+        Applies the authoritative actions of a tick.
+
+        :param tick: Tick number (before applying the actions).
+            + type: int
+        :param actions: Actions applied by the server.
+            + type: List<int or None>
+        :return: The cell diffs to draw, or None if the whole board must be redrawn after a rollback.
+            + type: List<Tuple<int, int, int>> or None
+        :raise ValueError: If the tick is not the next authoritative tick.
+        """
+        if tick != self.confirmed_ticks:
+            raise ValueError("Expected tick " + str(self.confirmed_ticks) + " but got " + str(tick))
+        self.confirmed_ticks = tick + 1
+
+        if not self._history:
+            # Not ahead of the server, simulate the authoritative tick directly
+            return snake_engine.step(self.state, actions)
+
+        snapshot, predicted = self._history.popleft()
+        if predicted == actions:
+            # Prediction confirmed, the state is already up to date
+            return []
+
+        # Misprediction: restore the state before the tick and re-simulate
+        self.rollbacks = self.rollbacks + 1
+        own = self.player_id
+        late_turn = predicted[own] if predicted[own] != actions[own] else None
+        state = snake_replay.unpack_state(self.header, snapshot)
+        snake_engine.step(state, actions)
+
+        history = deque()
+        for _, predicted in self._history:
+            if late_turn is not None and predicted[own] is None:
+                # The server has not applied the own turn yet, assume it comes on the next tick
+                if snake_input.is_valid_turn(late_turn, state.directions[own]):
+                    predicted = list(predicted)
+                    predicted[own] = late_turn
+                    self.lead = min(self.lead + 1, self.window)
+                late_turn = None
+            history.append((snake_replay.pack_state(state), predicted))
+            snake_engine.step(state, predicted)
+        self._history = history
+        self.state = state
+        return None
+
+    def confirmed_digest(self):
+        """
+        Hashes the state after the authoritative ticks, to compare it with the state hashes sent by the server.
+
+        :return: The digest of the state (see snake_replay.state_digest).
+            + type: bytes
+        """
+        # The snapshot before the oldest predicted tick is the state after the last authoritative tick
+        blob = self._history[0][0] if self._history else snake_replay.pack_state(self.state)
+        return snake_replay.state_digest(blob)
+
+    def resync(self, blob):
+        """
+        Replaces the prediction with the full state sent by the server after the game drifted.
+
+        :param blob: The state blob.
+            + type: bytes
+        :return: None
+        """
+        self.resyncs = self.resyncs + 1
+        self.state = snake_replay.unpack_state(self.header, blob)
+        self.confirmed_ticks = self.state.ticks
+        self._history = deque()
+
+
+#
+# SELF-CHECK
+#
+
+def verify_prediction(path, player_id=0, lead=VERIFY_LEAD):
+    """
+    Checks that the prediction gives the same game as the server: a player predicts ahead of the recorded ticks,
+    which are confirmed one at a time, rolling back every time the other players turn. After each confirmation
+    the authoritative state of the prediction is compared with the replayed one.
+
+    :param path: Replay file path.
+        + type: str
+    :param player_id: Player controlled by the prediction.
+        + type: int
+    :param lead: Ticks predicted ahead of the confirmed ticks.
+        + type: int
+    :return: The first tick where the states differ, or None if they always match.
+        + type: int or None
+    """
+    reader = snake_replay.ReplayReader(path)
+    try:
+        ticks = list(reader.ticks())
+    finally:
+        reader.close()
+    state = reader.header.new_state()
+    predictor = RollbackPredictor(reader.header, player_id)
+    predictor.lead = lead
+    for tick, actions in enumerate(ticks):
+        while predictor.needs_lead():
+            predicted_tick = predictor.state.ticks
+            predictor.predict(ticks[predicted_tick][player_id] if predicted_tick < len(ticks) else None)
+        snake_engine.step(state, actions)
+        predictor.confirm(tick, actions)
+        if predictor.confirmed_digest() != snake_replay.state_digest(snake_replay.pack_state(state)):
+            return state.ticks
+    return None
@@ -0,0 +1,411 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+import struct
+import logging
+
+import snake_replay
+from snake_replay import ReplayHeader, HEADER_SIZE
+
+# CONSTANTS
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 7777
+
+# Frame header: payload length, message type
+FRAME_FORMAT = '<IB'
+FRAME_SIZE = struct.calcsize(FRAME_FORMAT)
+MAX_PAYLOAD_SIZE = 16 * 1024 * 1024
+
+# Client to server messages
+MSG_JOIN = 1
+MSG_INPUT = 2
+MSG_RESYNC = 3
+
+# Server to client messages
+MSG_WELCOME = 10
+MSG_TICK = 11
+MSG_END = 12
+MSG_SNAPSHOT = 13
+MSG_DELTA = 14
+MSG_HASH = 15
+MSG_STATE = 16
+
+# Roles requested on join
+ROLE_PLAYER = 0
+ROLE_SPECTATOR = 1
+
+# Player id sent to clients that do not control any snake
+NO_PLAYER = 0xFFFF
+
+# Maximum size in bytes of the UTF-8 player name sent on join
+MAX_NAME_SIZE = 64
+
+JOIN_FORMAT = '<B'
+INPUT_FORMAT = '<QB'
+WELCOME_FORMAT = '<IH'
+TICK_FORMAT = '<Q'
+HASH_FORMAT = '<Q20s'
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# FRAMING
+#
+
+def encode_frame(msg_type, payload=b''):
+    """
+    Builds a message frame.
+
+    :param msg_type: Message type.
+        + type: int
+    :param payload: Message payload.
+        + type: bytes
+    :return: The frame.
+        + type: bytes
+    """
+    return struct.pack(FRAME_FORMAT, len(payload), msg_type) + payload
+
+
+async def read_frame(reader):
+    """
+    Reads the next frame from an asyncio stream.
+
+    :param reader: Stream reader.
+        + type: asyncio.StreamReader
+    :return: A tuple with the message type and its payload.
+        + type: Tuple<int, bytes>
+    :raise asyncio.IncompleteReadError: If the connection is closed.
+    :raise ValueError: If the frame is too big.
+    """
+    length, msg_type = struct.unpack(FRAME_FORMAT, await reader.readexactly(FRAME_SIZE))
+    if length > MAX_PAYLOAD_SIZE:
+        raise ValueError("Frame too big: " + str(length))
+    payload = await reader.readexactly(length) if length > 0 else b''
+    return msg_type, payload
+
+
+class FrameDecoder(object):
+    """
+    Incremental frame decoder for non asyncio sockets.
+    """
+
+    def __init__(self):
+        """
+        Creates a new decoder with an empty buffer.
+        """
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Adds received bytes and returns the frames completed by them.
+
+        :param data: Received bytes.
+            + type: bytes
+        :return: List of (message type, payload) tuples.
+            + type: List<Tuple<int, bytes>>
+        :raise ValueError: If a frame is too big.
+        """
+        self._buffer.extend(data)
+        frames = []
+        pos = 0
+        while len(self._buffer) - pos >= FRAME_SIZE:
+            length, msg_type = struct.unpack_from(FRAME_FORMAT, self._buffer, pos)
+            if length > MAX_PAYLOAD_SIZE:
+                raise ValueError("Frame too big: " + str(length))
+            if len(self._buffer) - pos - FRAME_SIZE < length:
+                break
+            start = pos + FRAME_SIZE
+            frames.append((msg_type, bytes(self._buffer[start:start + length])))
+            pos = start + length
+        del self._buffer[:pos]
+        return frames
+
+
+#
+# MESSAGES
+#
+
+def encode_join(role, name=None):
+    """
+    Builds a join message.
+
+    :param role: Requested role.
+        + type: int
+    :param name: Player name, or None to be named by the server.
+        + type: str or None
+    :return: The frame.
+        + type: bytes
+    :raise ValueError: If the name is too long.
+    """
+    encoded_name = name.encode('utf-8') if name else b''
+    if len(encoded_name) > MAX_NAME_SIZE:
+        raise ValueError("Player name too long")
+    return encode_frame(MSG_JOIN, struct.pack(JOIN_FORMAT, role) + encoded_name)
+
+
+def decode_join(payload):
+    """
+    Parses a join message.
+
+    :param payload: Message payload.
+        + type: bytes
+    :return: A tuple with the requested role and the player name (None if not sent).
+        + type: Tuple<int, str or None>
+    :raise ValueError: If the message is malformed.
+    """
+    size = struct.calcsize(JOIN_FORMAT)
+    if len(payload) < size or len(payload) > size + MAX_NAME_SIZE:
+        raise ValueError("Malformed join message")
+    role = struct.unpack_from(JOIN_FORMAT, payload, 0)[0]
+    name = payload[size:].decode('utf-8').strip()
+    return role, name or None
+
+
+def encode_input(tick, direction):
+    """
+    Builds an input message.
+
+    :param tick: Tick the turn is requested for (number of ticks simulated before applying it).
+        + type: int
+    :param direction: Requested direction.
+        + type: int
+    :return: The frame.
+        + type: bytes
+    """
+    return encode_frame(MSG_INPUT, struct.pack(INPUT_FORMAT, tick, direction))
+
+
+def decode_input(payload):
+    """
+    Parses an input message.
+
+    :param payload: Message payload.
+        + type: bytes
+    :return: A tuple with the tick the turn is requested for and the requested direction.
+        + type: Tuple<int, int>
+    """
+    return struct.unpack(INPUT_FORMAT, payload)
+
+
+def encode_resync():
+    """
+    Builds the message sent by a player whose game drifted from the server, to request the full state.
+
+    :return: The frame.
+        + type: bytes
+    """
+    return encode_frame(MSG_RESYNC)
+
+
+def encode_welcome(match_id, player_id, header):
+    """
+    Builds the welcome message sent when a match starts.
+
+    :param match_id: Match id.
+        + type: int
+    :param player_id: Player id assigned to the client (NO_PLAYER for spectators).
+        + type: int
+    :param header: Header describing the initial state of the match.
+        + type: ReplayHeader
+    :return: The frame.
+        + type: bytes
+    """
+    return encode_frame(MSG_WELCOME, struct.pack(WELCOME_FORMAT, match_id, player_id) + header.pack())
+
+
+def decode_welcome(payload):
+    """
+    Parses a welcome message.
+
+    :param payload: Message payload.
+        + type: bytes
+    :return: A tuple with the match id, the player id and the match header.
+        + type: Tuple<int, int, ReplayHeader>
+    """
+    match_id, player_id = struct.unpack_from(WELCOME_FORMAT, payload, 0)
+    offset = struct.calcsize(WELCOME_FORMAT)
+    header = ReplayHeader.unpack(payload[offset:offset + HEADER_SIZE])
+    return match_id, player_id, header
+
+
+def encode_tick(tick, actions):
+    """
+    Builds the message of a simulated tick: the tick number (before applying the actions) and the
+    actions applied by the server, encoded as a replay tick record.
+
+    :param tick: Tick number.
+        + type: int
+    :param actions: Applied direction of each player, or None if it did not change.
+        + type: List<int or None>
+    :return: The frame.
+        + type: bytes
+    """
+    payload = bytearray(struct.pack(TICK_FORMAT, tick))
+    snake_replay.encode_tick(actions, payload)
+    return encode_frame(MSG_TICK, bytes(payload))
+
+
+def decode_tick(payload, num_players):
+    """
+    Parses a tick message.
+
+    :param payload: Message payload.
+        + type: bytes
+    :param num_players: Number of players of the match.
+        + type: int
+    :return: A tuple with the tick number and the applied actions.
+        + type: Tuple<int, List<int or None>>
+    """
+    tick = struct.unpack_from(TICK_FORMAT, payload, 0)[0]
+    value, offset = snake_replay.decode_varint(payload, struct.calcsize(TICK_FORMAT))
+    actions = [None] * num_players
+    for _ in range(value >> 1):
+        change, offset = snake_replay.decode_varint(payload, offset)
+        actions[change >> 2] = change & 3
+    return tick, actions
+
+
+def encode_hash(tick, digest):
+    """
+    Builds the message with the hash of the state, sent periodically so the players can detect that their
+    game drifted from the server.
+
+    :param tick: Tick number (after applying the tick actions).
+        + type: int
+    :param digest: Digest of the state (see snake_replay.state_digest).
+        + type: bytes
+    :return: The frame.
+        + type: bytes
+    """
+    return encode_frame(MSG_HASH, struct.pack(HASH_FORMAT, tick, digest))
+
+
+def decode_hash(payload):
+    """
+    Parses a state hash message.
+
+    :param payload: Message payload.
+        + type: bytes
+    :return: A tuple with the tick number and the digest of the state.
+        + type: Tuple<int, bytes>
+    """
+    return struct.unpack(HASH_FORMAT, payload)
+
+
+def encode_state(blob):
+    """
+    Builds the message with the full state of the game, sent to the players that request a resync.
+
+    :param blob: The state blob (see snake_replay.pack_state).
+        + type: bytes
+    :return: The frame.
+        + type: bytes
+    """
+    return encode_frame(MSG_STATE, blob)
+
+
+def encode_end(scores):
+    """
+    Builds the message sent when a match ends.
+
+    :param scores: Final scores.
+        + type: List<int>
+    :return: The frame.
+        + type: bytes
+    """
+    return encode_frame(MSG_END, struct.pack('<' + str(len(scores)) + 'q', *scores))
+
+
+def decode_end(payload):
+    """
+    Parses an end message.
+
+    :param payload: Message payload.
+        + type: bytes
+    :return: The final scores.
+        + type: List<int>
+    """
+    return list(struct.unpack('<' + str(len(payload) // 8) + 'q', payload))
+
+
+def encode_delta(msg_type, tick, diffs, scores, killed):
+    """
+    Builds a state delta message: the board cells, scores and alive players that changed since the previous
+    tick. A snapshot (MSG_SNAPSHOT) uses the same layout, as a delta against an empty board.
+
+    Payload layout: tick, varint number of cells, then varint cell and varint content | (owner + 1) << 2 per
+    cell (owner 0 when empty), varint number of scores, then varint player id and varint score per score,
+    varint number of killed players, then varint player id per killed player.
+
+    :param msg_type: MSG_DELTA or MSG_SNAPSHOT.
+        + type: int
+    :param tick: Tick number (after applying the delta).
+        + type: int
+    :param diffs: Cell diffs (packed cell, cell content, owner player id).
+        + type: List<Tuple<int, int, int>>
+    :param scores: New scores as (player id, score) pairs.
+        + type: List<Tuple<int, int>>
+    :param killed: Killed player ids.
+        + type: List<int>
+    :return: The frame.
+        + type: bytes
+    """
+    encode_varint = snake_replay.encode_varint
+    payload = bytearray(struct.pack(TICK_FORMAT, tick))
+    encode_varint(len(diffs), payload)
+    for cell, content, owner in diffs:
+        encode_varint(cell, payload)
+        encode_varint(content if owner is None else content | (owner + 1) << 2, payload)
+    encode_varint(len(scores), payload)
+    for player_id, score in scores:
+        encode_varint(player_id, payload)
+        encode_varint(score, payload)
+    encode_varint(len(killed), payload)
+    for player_id in killed:
+        encode_varint(player_id, payload)
+    return encode_frame(msg_type, bytes(payload))
+
+
+def decode_delta(payload):
+    """
+    Parses a state delta or snapshot message.
+
+    :param payload: Message payload.
+        + type: bytes
+    :return: A tuple with the tick number, the cell diffs, the new scores and the killed players.
+        + type: Tuple<int, List<Tuple<int, int, int>>, List<Tuple<int, int>>, List<int>>
+    """
+    decode_varint = snake_replay.decode_varint
+    tick = struct.unpack_from(TICK_FORMAT, payload, 0)[0]
+    offset = struct.calcsize(TICK_FORMAT)
+
+    num_diffs, offset = decode_varint(payload, offset)
+    diffs = []
+    for _ in range(num_diffs):
+        cell, offset = decode_varint(payload, offset)
+        value, offset = decode_varint(payload, offset)
+        diffs.append((cell, value & 3, (value >> 2) - 1 if value >> 2 else None))
+
+    num_scores, offset = decode_varint(payload, offset)
+    scores = []
+    for _ in range(num_scores):
+        player_id, offset = decode_varint(payload, offset)
+        score, offset = decode_varint(payload, offset)
+        scores.append((player_id, score))
+
+    num_killed, offset = decode_varint(payload, offset)
+    killed = []
+    for _ in range(num_killed):
+        player_id, offset = decode_varint(payload, offset)
+        killed.append(player_id)
+    return tick, diffs, scores, killed
@@ -0,0 +1,300 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+import curses
+import logging
+
+import snake_engine
+from snake_engine import CELL_FOOD, CELL_SNAKE
+
+# CONSTANTS
+CHAR_FOOD = '*'
+CHAR_EMPTY = ' '
+CHAR_SNAKE = '#'
+
+COLOR_EMPTY = 1
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# RENDERER
+#
+
+class Renderer(object):
+    """
+    Draws the game on a curses window consuming the per-tick cell diffs of the engine.
+
+    Only the changed cells are written on each tick. The border and the HUD are only redrawn when they
+    are dirty (first frame, invalidation or score change), and all the writes of a frame are sent to the
+    terminal at once with noutrefresh/doupdate.
+    """
+
+    def __init__(self, win, x_size, snake_colors, food_colors, print_hud=None, color_attr=curses.color_pair,
+                 flush=curses.doupdate):
+        """
+        Creates a new renderer.
+
+        :param win: Window screen.
+            + type: curses.Window
+        :param x_size: Board width (including borders), used to unpack the cells.
+            + type: int
+        :param snake_colors: Snake color of each player.
+            + type: List<int>
+        :param food_colors: Food color of each player.
+            + type: List<int>
+        :param print_hud: Function printing the HUD given the window and the scores.
+            + type: function
+        :param color_attr: Function returning the attribute of a color pair.
+            + type: function
+        :param flush: Function sending the pending window updates to the terminal.
+            + type: function
+        """
+        self.win = win
+        self.x_size = x_size
+        self.print_hud = print_hud
+        self.flush = flush
+
+        # Color attributes are computed once
+        self._snake_attrs = [color_attr(color) for color in snake_colors]
+        self._food_attrs = [color_attr(color) for color in food_colors]
+        self._empty_attr = color_attr(COLOR_EMPTY)
+
+        self._border_dirty = True
+        self._last_scores = None
+
+    def invalidate(self):
+        """
+        Forces the border and the HUD to be redrawn on the next frame.
+
+        :return: None
+        """
+        self._border_dirty = True
+        self._last_scores = None
+
+    def draw(self, diffs, scores):
+        """
+        Draws one frame.
+
+        :param diffs: Cell diffs (packed cell, cell content, owner player id).
+            + type: List<Tuple<int, int, int>>
+        :param scores: Current scores.
+            + type: List<int>
+        :return: None
+        """
+        win = self.win
+        if self._border_dirty:
+            win.border(0)
+            self._border_dirty = False
+            self._last_scores = None
+
+        # Print the changed cells
+        self.draw_cells(diffs)
+
+        # Print the HUD only when the scores change
+        if scores != self._last_scores:
+            if self.print_hud is not None:
+                self.print_hud(win, scores)
+            self._last_scores = list(scores)
+
+        # Send the whole frame at once
+        win.noutrefresh()
+        self.flush()
+
+    def draw_cells(self, diffs):
+        """
+        Writes the changed cells on the window.
+
+        :param diffs: Cell diffs (packed cell, cell content, owner player id).
+            + type: List<Tuple<int, int, int>>
+        :return: None
+        """
+        x_size = self.x_size
+        for cell, content, owner in diffs:
+            y, x = divmod(cell, x_size)
+            self.draw_cell(y, x, content, owner)
+
+    def draw_cell(self, y, x, content, owner):
+        """
+        Writes one cell on the window.
+
+        :param y: Window row.
+            + type: int
+        :param x: Window column.
+            + type: int
+        :param content: Cell content.
+            + type: int
+        :param owner: Owner player id.
+            + type: int
+        :return: None
+        """
+        if content == CELL_SNAKE:
+            self.win.addch(y, x, CHAR_SNAKE, self._snake_attrs[owner])
+        elif content == CELL_FOOD:
+            self.win.addch(y, x, CHAR_FOOD, self._food_attrs[owner])
+        else:
+            self.win.addch(y, x, CHAR_EMPTY, self._empty_attr)
+
+
+class ViewportRenderer(Renderer):
+    """
+    Draws a board bigger than the window through a camera following the head of a player.
+
+    The camera only moves when the head gets close to the edges of the view, and then it is centered on the
+    head. Between moves only the diffs inside the view are drawn; after a move the view is redrawn from the
+    state. Either way the cost of a frame depends on the window size, not on the board size.
+    """
+
+    def __init__(self, win, state, snake_colors, food_colors, print_hud=None, player_id=0,
+                 color_attr=curses.color_pair, flush=curses.doupdate):
+        """
+        Creates a new renderer.
+
+        :param win: Window screen (the view is the window without its border).
+            + type: curses.Window
+        :param state: Game state, read to redraw the view when the camera moves.
+            + type: GameState
+        :param snake_colors: Snake color of each player.
+            + type: List<int>
+        :param food_colors: Food color of each player.
+            + type: List<int>
+        :param print_hud: Function printing the HUD given the window and the scores.
+            + type: function
+        :param player_id: Player followed by the camera.
+            + type: int
+        :param color_attr: Function returning the attribute of a color pair.
+            + type: function
+        :param flush: Function sending the pending window updates to the terminal.
+            + type: function
+        """
+        Renderer.__init__(self, win, state.x_size, snake_colors, food_colors, print_hud, color_attr, flush)
+        self.state = state
+        self.player_id = player_id
+        height, width = win.getmaxyx()
+        self.view_y_size = min(height - 2, state.y_size - 2)
+        self.view_x_size = min(width - 2, state.x_size - 2)
+
+        # Board position of the top left cell of the view
+        self.origin_y = 1
+        self.origin_x = 1
+        self._view_dirty = True
+
+    def invalidate(self):
+        """
+        Forces the border, the HUD and the whole view to be redrawn on the next frame.
+
+        :return: None
+        """
+        Renderer.invalidate(self)
+        self._view_dirty = True
+
+    def follow(self):
+        """
+        Moves the camera if the followed head is close to the edges of the view.
+
+        :return: None
+        """
+        snake = self.state.snakes[self.player_id]
+        if not snake:
+            return
+        y, x = divmod(snake.head(), self.x_size)
+        origin_y = self._recenter(y, self.origin_y, self.view_y_size, self.state.y_size)
+        origin_x = self._recenter(x, self.origin_x, self.view_x_size, self.state.x_size)
+        if origin_y != self.origin_y or origin_x != self.origin_x:
+            self.origin_y = origin_y
+            self.origin_x = origin_x
+            self._view_dirty = True
+
+    @staticmethod
+    def _recenter(pos, origin, view_size, board_size):
+        """
+        Computes the origin of one axis of the view.
+
+        :param pos: Followed position.
+            + type: int
+        :param origin: Current origin.
+            + type: int
+        :param view_size: View size.
+            + type: int
+        :param board_size: Board size (including borders).
+            + type: int
+        :return: The new origin.
+            + type: int
+        """
+        margin = view_size // 4
+        if origin + margin <= pos < origin + view_size - margin:
+            return origin
+        return max(1, min(pos - view_size // 2, board_size - 1 - view_size))
+
+    def draw_cells(self, diffs):
+        """
+        Writes the changed cells inside the view, or the whole view if the camera moved.
+
+        :param diffs: Cell diffs (packed cell, cell content, owner player id).
+            + type: List<Tuple<int, int, int>>
+        :return: None
+        """
+        self.follow()
+        origin_y = self.origin_y
+        origin_x = self.origin_x
+        view_y_size = self.view_y_size
+        view_x_size = self.view_x_size
+
+        if self._view_dirty:
+            state = self.state
+            x_size = self.x_size
+            for y in range(view_y_size):
+                row = (origin_y + y) * x_size + origin_x
+                for x in range(view_x_size):
+                    content, owner = snake_engine.cell_content(state, row + x)
+                    self.draw_cell(y + 1, x + 1, content, owner)
+            self._view_dirty = False
+            return
+
+        x_size = self.x_size
+        for cell, content, owner in diffs:
+            y, x = divmod(cell, x_size)
+            y = y - origin_y
+            x = x - origin_x
+            if 0 <= y < view_y_size and 0 <= x < view_x_size:
+                self.draw_cell(y + 1, x + 1, content, owner)
+
+
+def new_renderer(win, state, snake_colors, food_colors, print_hud=None, player_id=0, color_attr=curses.color_pair,
+                 flush=curses.doupdate):
+    """
+    Creates the renderer for the given window and board: boards bigger than the window are shown through a
+    viewport following the given player.
+
+    :param win: Window screen.
+        + type: curses.Window
+    :param state: Game state.
+        + type: GameState
+    :param snake_colors: Snake color of each player.
+        + type: List<int>
+    :param food_colors: Food color of each player.
+        + type: List<int>
+    :param print_hud: Function printing the HUD given the window and the scores.
+        + type: function
+    :param player_id: Player followed by the viewport.
+        + type: int
+    :param color_attr: Function returning the attribute of a color pair.
+        + type: function
+    :param flush: Function sending the pending window updates to the terminal.
+        + type: function
+    :return: The renderer.
+        + type: Renderer
+    """
+    height, width = win.getmaxyx()
+    if state.y_size <= height and state.x_size <= width:
+        return Renderer(win, state.x_size, snake_colors, food_colors, print_hud, color_attr, flush)
+    return ViewportRenderer(win, state, snake_colors, food_colors, print_hud, player_id, color_attr, flush)
@@ -0,0 +1,755 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+from array import array
+import bisect
+import hashlib
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import logging
+
+import snake_engine
+from snake_engine import Y_SIZE, X_SIZE, BOUNDS_ENABLED, INITIAL_SPEED
+from snake_structures import FreeCells
+
+# CONSTANTS
+REPLAY_MAGIC = b'SNKR'
+REPLAY_VERSION = 5
+
+MODE_SNAKE = 0
+MODE_FIGHT = 1
+
+# Header: magic, version, mode, bounds enabled, number of players, y size, x size, seed, initial speed
+HEADER_FORMAT = '<4sBBBHIIQI'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Footer: offset of the keyframe index, number of keyframes, magic
+FOOTER_FORMAT = '<QI4s'
+FOOTER_SIZE = struct.calcsize(FOOTER_FORMAT)
+FOOTER_MAGIC = b'SNKI'
+
+# Keyframe index entry: tick, offset of the keyframe record
+INDEX_ENTRY_FORMAT = '<QQ'
+INDEX_ENTRY_SIZE = struct.calcsize(INDEX_ENTRY_FORMAT)
+
+# Keyframe state blobs, with 64 bits packed cells as huge boards have more than 2^31 cells
+STATE_FORMAT = '<QBQ'
+PLAYER_FORMAT = '<BBqqdQ'
+SNAKE_CELL_FORMAT = 'Q'
+RNG_FORMAT = '<' + str(625) + 'IBd'
+# Number of free cells stored in their sampling order (-1 if the free cells index has no order), only dense
+# boards of at most SPARSE_BOARD_CELLS cells have an order so they are stored as 32 bits cells
+FREE_CELLS_FORMAT = '<i'
+
+# Ticks between keyframes (0 disables them)
+KEYFRAME_INTERVAL = 10000
+
+# Seeded games recorded by the self-check: games per mode, players of the fight games, board size, ticks and
+# keyframe interval (short, so the games are checked across many keyframes)
+VERIFY_GAMES = 20
+VERIFY_PLAYERS = 4
+VERIFY_Y_SIZE = 20
+VERIFY_X_SIZE = 30
+VERIFY_MAX_TICKS = 500
+VERIFY_KEYFRAME_INTERVAL = 7
+
+READ_CHUNK_SIZE = 64 * 1024
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# REPLAY HEADER
+#
+
+class ReplayHeader(object):
+    """
+    Everything needed to rebuild the initial state of a recorded game.
+    """
+
+    def __init__(self, mode, num_players, seed, y_size=Y_SIZE, x_size=X_SIZE, bounds_enabled=BOUNDS_ENABLED,
+                 initial_speed=INITIAL_SPEED):
+        """
+        Creates a new replay header.
+
+        :param mode: Game mode (MODE_SNAKE or MODE_FIGHT).
+            + type: int
+        :param num_players: Number of players.
+            + type: int
+        :param seed: Seed of the game random number generator.
+            + type: int
+        :param y_size: Board height (including borders).
+            + type: int
+        :param x_size: Board width (including borders).
+            + type: int
+        :param bounds_enabled: Whether crossing the borders kills the snake instead of wrapping around.
+            + type: boolean
+        :param initial_speed: Tick duration in milliseconds of the initial snakes.
+            + type: int
+        """
+        self.mode = mode
+        self.num_players = num_players
+        self.seed = seed
+        self.y_size = y_size
+        self.x_size = x_size
+        self.bounds_enabled = bounds_enabled
+        self.initial_speed = initial_speed
+
+    def pack(self):
+        """
+        Serializes the header.
+
+        :return: The binary header.
+            + type: bytes
+        """
+        return struct.pack(HEADER_FORMAT, REPLAY_MAGIC, REPLAY_VERSION, self.mode, int(self.bounds_enabled),
+                           self.num_players, self.y_size, self.x_size, self.seed, self.initial_speed)
+
+    @staticmethod
+    def unpack(data):
+        """
+        Deserializes a header.
+
+        :param data: The binary header.
+            + type: bytes
+        :return: The replay header.
+            + type: ReplayHeader
+        :raise ValueError: If the data is not a supported replay header.
+        """
+        if len(data) < HEADER_SIZE:
+            raise ValueError("Truncated replay header")
+        magic, version, mode, bounds_enabled, num_players, y_size, x_size, seed, initial_speed = \
+            struct.unpack(HEADER_FORMAT, data[:HEADER_SIZE])
+        if magic != REPLAY_MAGIC:
+            raise ValueError("Not a replay file")
+        if version != REPLAY_VERSION:
+            raise ValueError("Unsupported replay version " + str(version))
+        return ReplayHeader(mode, num_players, seed, y_size=y_size, x_size=x_size,
+                            bounds_enabled=bool(bounds_enabled), initial_speed=initial_speed)
+
+    def new_state(self):
+        """
+        Builds the initial game state described by this header.
+
+        :return: The initial game state.
+            + type: GameState
+        """
+        if self.mode == MODE_SNAKE:
+            return snake_engine.new_snake_state(y_size=self.y_size, x_size=self.x_size,
+                                                bounds_enabled=self.bounds_enabled, seed=self.seed,
+                                                initial_speed=self.initial_speed)
+        return snake_engine.new_fight_state(self.num_players, y_size=self.y_size, x_size=self.x_size,
+                                            bounds_enabled=self.bounds_enabled, seed=self.seed,
+                                            initial_speed=self.initial_speed)
+
+
+#
+# ENCODING HELPERS
+#
+
+def encode_varint(value, out):
+    """
+    Appends the LEB128 encoding of a non negative integer.
+
+    :param value: Value to encode.
+        + type: int
+    :param out: Buffer where the encoding is appended.
+        + type: bytearray
+    :return: None
+    """
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value = value >> 7
+    out.append(value)
+
+
+def decode_varint(data, offset):
+    """
+    Decodes a LEB128 encoded non negative integer from a buffer.
+
+    :param data: Buffer.
+        + type: bytes
+    :param offset: Offset of the encoded value.
+        + type: int
+    :return: A tuple with the decoded value and the offset after it.
+        + type: Tuple<int, int>
+    :raise ValueError: If the buffer ends in the middle of the value.
+    """
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("Truncated varint")
+        byte = data[offset]
+        offset = offset + 1
+        value = value | ((byte & 0x7F) << shift)
+        if byte < 0x80:
+            return value, offset
+        shift = shift + 7
+
+
+def encode_tick(actions, out):
+    """
+    Appends the record of a tick: the number of players that changed their direction (shifted one bit
+    to leave room for the keyframe flag) followed by one (player_id << 2 | direction) varint per change.
+
+    :param actions: New direction of each player, or None to keep the current one.
+        + type: List<int or None>
+    :param out: Buffer where the record is appended.
+        + type: bytearray
+    :return: None
+    """
+    changes = [(player_id, action) for player_id, action in enumerate(actions) if action is not None]
+    encode_varint(len(changes) << 1, out)
+    for player_id, action in changes:
+        encode_varint(player_id << 2 | action, out)
+
+
+def encode_keyframe(state, out):
+    """
+    Appends a keyframe record: the keyframe flag, the length of the state blob and the state blob.
+
+    :param state: Game state to store.
+        + type: GameState
+    :param out: Buffer where the record is appended.
+        + type: bytearray
+    :return: None
+    """
+    blob = pack_state(state)
+    encode_varint(1, out)
+    encode_varint(len(blob), out)
+    out.extend(blob)
+
+
+def pack_state(state):
+    """
+    Serializes the full state of a game, including its random number generator.
+
+    :param state: Game state.
+        + type: GameState
+    :return: The state blob.
+        + type: bytes
+    """
+    blob = bytearray(struct.pack(STATE_FORMAT, state.ticks, int(state.must_end), state.elapsed_ms))
+    for player_id, snake in enumerate(state.snakes):
+        food = state.foods[player_id]
+        blob.extend(struct.pack(PLAYER_FORMAT, int(state.players_alive[player_id]), state.directions[player_id],
+                                state.scores[player_id], food if food is not None else -1,
+                                state.food_times[player_id], len(snake)))
+        blob.extend(struct.pack('<' + str(len(snake)) + SNAKE_CELL_FORMAT, *snake))
+    _, internal_state, gauss_next = state.rng.getstate()
+    blob.extend(struct.pack(RNG_FORMAT, *(internal_state + (int(gauss_next is not None), gauss_next or 0.0))))
+    # Foods are sampled by position on the free cells, so their order is part of the state
+    if isinstance(state.free_cells, FreeCells):
+        cells = state.free_cells.order()
+        blob.extend(struct.pack(FREE_CELLS_FORMAT, len(cells)))
+        if sys.byteorder != 'little':
+            cells.byteswap()
+        blob.extend(cells.tobytes())
+    else:
+        blob.extend(struct.pack(FREE_CELLS_FORMAT, -1))
+    return bytes(blob)
+
+
+def unpack_state(header, blob):
+    """
+    Deserializes the full state of a game.
+
+    :param header: Header of the replay the state belongs to.
+        + type: ReplayHeader
+    :param blob: The state blob.
+        + type: bytes
+    :return: The game state.
+        + type: GameState
+    """
+    ticks, must_end, elapsed_ms = struct.unpack_from(STATE_FORMAT, blob, 0)
+    offset = struct.calcsize(STATE_FORMAT)
+    players = []
+    for _ in range(header.num_players):
+        player = struct.unpack_from(PLAYER_FORMAT, blob, offset)
+        offset = offset + struct.calcsize(PLAYER_FORMAT)
+        snake_format = '<' + str(player[-1]) + SNAKE_CELL_FORMAT
+        snake = struct.unpack_from(snake_format, blob, offset)
+        offset = offset + struct.calcsize(snake_format)
+        players.append((player, snake))
+    rng_values = struct.unpack_from(RNG_FORMAT, blob, offset)
+    offset = offset + struct.calcsize(RNG_FORMAT)
+    num_free_cells = struct.unpack_from(FREE_CELLS_FORMAT, blob, offset)[0]
+    offset = offset + struct.calcsize(FREE_CELLS_FORMAT)
+    rng = random.Random()
+    rng.setstate((3, rng_values[:625], rng_values[626] if rng_values[625] else None))
+
+    x_size = header.x_size
+    snakes = [[divmod(cell, x_size) for cell in snake] for _, snake in players]
+    directions = [player[1] for player, _ in players]
+    state = snake_engine.GameState(snakes, [[0, 0] for _ in players], directions, y_size=header.y_size,
+                                   x_size=x_size, bounds_enabled=header.bounds_enabled, rng=rng,
+                                   initial_speed=header.initial_speed)
+    state.ticks = ticks
+    state.elapsed_ms = elapsed_ms
+    state.must_end = bool(must_end)
+    for player_id, (player, _) in enumerate(players):
+        alive, _, score, food, food_time, _ = player
+        state.players_alive[player_id] = bool(alive)
+        state.scores[player_id] = score
+        state.set_food(player_id, food if food != -1 else None)
+        state.food_times[player_id] = food_time
+    if num_free_cells >= 0:
+        cells = array('i')
+        cells.frombytes(blob[offset:offset + num_free_cells * cells.itemsize])
+        if sys.byteorder != 'little':
+            cells.byteswap()
+        state.free_cells.restore_order(cells)
+    return state
+
+
+def state_digest(blob):
+    """
+    Hashes a state blob, to check that two games are in the same state without sending the whole state.
+
+    :param blob: The state blob.
+        + type: bytes
+    :return: The digest of the state.
+        + type: bytes
+    """
+    return hashlib.sha1(blob).digest()
+
+
+class ByteStream(object):
+    """
+    Reads bytes and varints from a file object in chunks, without loading the whole file.
+    """
+
+    def __init__(self, file_obj, limit=None):
+        """
+        Creates a new byte stream.
+
+        :param file_obj: Binary file object to read from.
+            + type: file
+        :param limit: Maximum number of bytes to read from the file (None to read until its end).
+            + type: int or None
+        """
+        self._file = file_obj
+        self._remaining = limit
+        self._buffer = b''
+        self._pos = 0
+
+    def _fill(self):
+        """
+        Reads the next chunk of the file, dropping the consumed bytes.
+
+        :return: True if new bytes were read.
+            + type: boolean
+        """
+        size = READ_CHUNK_SIZE
+        if self._remaining is not None:
+            size = min(size, self._remaining)
+            self._remaining = self._remaining - size
+        chunk = self._file.read(size) if size > 0 else b''
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return len(chunk) > 0
+
+    def at_end(self):
+        """
+        Checks whether all the bytes have been consumed.
+
+        :return: True if there are no more bytes.
+            + type: boolean
+        """
+        return self._pos >= len(self._buffer) and not self._fill()
+
+    def read_varint(self):
+        """
+        Reads a LEB128 encoded non negative integer.
+
+        :return: The decoded value.
+            + type: int
+        :raise ValueError: If the stream ends in the middle of the value.
+        """
+        value = 0
+        shift = 0
+        while True:
+            if self._pos >= len(self._buffer) and not self._fill():
+                raise ValueError("Truncated replay record")
+            byte = self._buffer[self._pos]
+            self._pos = self._pos + 1
+            value = value | ((byte & 0x7F) << shift)
+            if byte < 0x80:
+                return value
+            shift = shift + 7
+
+    def read_bytes(self, size):
+        """
+        Reads the given number of bytes.
+
+        :param size: Number of bytes.
+            + type: int
+        :return: The read bytes.
+            + type: bytes
+        :raise ValueError: If the stream ends before reading all the bytes.
+        """
+        while len(self._buffer) - self._pos < size:
+            if not self._fill():
+                raise ValueError("Truncated replay record")
+        data = self._buffer[self._pos:self._pos + size]
+        self._pos = self._pos + size
+        return data
+
+
+def decode_record(stream, num_players):
+    """
+    Reads the next record, which can be a tick or a keyframe.
+
+    :param stream: Stream positioned at the beginning of a record.
+        + type: ByteStream
+    :param num_players: Number of players.
+        + type: int
+    :return: A tuple with the new direction of each player (None to keep the current one) and None for
+        tick records, or None and the state blob for keyframe records.
+        + type: Tuple<List<int or None>, bytes>
+    """
+    value = stream.read_varint()
+    if value & 1:
+        return None, stream.read_bytes(stream.read_varint())
+    actions = [None] * num_players
+    for _ in range(value >> 1):
+        change = stream.read_varint()
+        actions[change >> 2] = change & 3
+    return actions, None
+
+
+#
+# REPLAY WRITER AND READER
+#
+
+class ReplayWriter(object):
+    """
+    Records the inputs of a game, one record per simulated tick, plus periodic full-state keyframes
+    indexed on a footer so readers can seek without re-simulating from the beginning.
+    """
+
+    def __init__(self, path, header, keyframe_interval=KEYFRAME_INTERVAL):
+        """
+        Creates a new replay file.
+
+        :param path: Replay file path.
+            + type: str
+        :param header: Replay header.
+            + type: ReplayHeader
+        :param keyframe_interval: Ticks between keyframes (0 disables them).
+            + type: int
+        """
+        self.header = header
+        self.keyframe_interval = keyframe_interval
+        self._file = open(path, 'wb')
+        self._file.write(header.pack())
+        self._offset = HEADER_SIZE
+        self._buffer = bytearray()
+        self._index = []
+
+    def record(self, actions, state=None):
+        """
+        Records the actions applied on one tick.
+
+        :param actions: New direction of each player, or None to keep the current one.
+            + type: List<int or None>
+        :param state: Game state before applying the actions, needed to write keyframes.
+            + type: GameState or None
+        :return: None
+        """
+        if state is not None and self.keyframe_interval > 0 and state.ticks > 0 \
+                and state.ticks % self.keyframe_interval == 0:
+            self._index.append((state.ticks, self._offset + len(self._buffer)))
+            encode_keyframe(state, self._buffer)
+        encode_tick(actions, self._buffer)
+        if len(self._buffer) >= READ_CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered records to the file.
+
+        :return: None
+        """
+        self._file.write(self._buffer)
+        self._offset = self._offset + len(self._buffer)
+        del self._buffer[:]
+
+    def close(self):
+        """
+        Flushes the records, writes the keyframe index footer and closes the replay file.
+
+        :return: None
+        """
+        self.flush()
+        for tick, offset in self._index:
+            self._file.write(struct.pack(INDEX_ENTRY_FORMAT, tick, offset))
+        self._file.write(struct.pack(FOOTER_FORMAT, self._offset, len(self._index), FOOTER_MAGIC))
+        self._file.close()
+
+
+class ReplayReader(object):
+    """
+    Reads a replay file tick by tick, or seeks to any tick using its keyframes.
+    """
+
+    def __init__(self, path):
+        """
+        Opens a replay file and reads its header and keyframe index.
+
+        :param path: Replay file path.
+            + type: str
+        """
+        self._file = open(path, 'rb')
+        self.header = ReplayHeader.unpack(self._file.read(HEADER_SIZE))
+
+        # Read the keyframe index. Files without footer (not properly closed) are read until their end
+        self.records_end = None
+        self.keyframe_ticks = []
+        self.keyframe_offsets = []
+        size = os.fstat(self._file.fileno()).st_size
+        if size >= HEADER_SIZE + FOOTER_SIZE:
+            self._file.seek(size - FOOTER_SIZE)
+            index_offset, count, magic = struct.unpack(FOOTER_FORMAT, self._file.read(FOOTER_SIZE))
+            if magic == FOOTER_MAGIC and index_offset + count * INDEX_ENTRY_SIZE + FOOTER_SIZE == size:
+                self.records_end = index_offset
+                self._file.seek(index_offset)
+                for _ in range(count):
+                    tick, offset = struct.unpack(INDEX_ENTRY_FORMAT, self._file.read(INDEX_ENTRY_SIZE))
+                    self.keyframe_ticks.append(tick)
+                    self.keyframe_offsets.append(offset)
+
+    def _stream(self, offset):
+        """
+        Creates a stream of records starting at the given file offset.
+
+        :param offset: File offset of a record.
+            + type: int
+        :return: The records stream.
+            + type: ByteStream
+        """
+        self._file.seek(offset)
+        limit = self.records_end - offset if self.records_end is not None else None
+        return ByteStream(self._file, limit)
+
+    def ticks(self, stream=None):
+        """
+        Iterates the recorded actions of each tick, skipping the keyframes.
+
+        :param stream: Stream to read from (defaults to the beginning of the records).
+            + type: ByteStream
+        :return: Generator of the actions of each tick.
+            + type: Generator<List<int or None>>
+        """
+        if stream is None:
+            stream = self._stream(HEADER_SIZE)
+        num_players = self.header.num_players
+        while not stream.at_end():
+            actions, _ = decode_record(stream, num_players)
+            if actions is not None:
+                yield actions
+
+    def state_at(self, tick):
+        """
+        Rebuilds the game state at the given tick by loading the nearest previous keyframe and simulating
+        only the remaining ticks.
+
+        :param tick: Tick to seek to (the final state is returned if the game is shorter).
+            + type: int
+        :return: The game state after simulating the given number of ticks.
+            + type: GameState
+        """
+        position = bisect.bisect_right(self.keyframe_ticks, tick) - 1
+        if position >= 0:
+            stream = self._stream(self.keyframe_offsets[position])
+            _, blob = decode_record(stream, self.header.num_players)
+            state = unpack_state(self.header, blob)
+        else:
+            stream = self._stream(HEADER_SIZE)
+            state = self.header.new_state()
+
+        if state.ticks < tick:
+            for actions in self.ticks(stream):
+                snake_engine.step(state, actions)
+                if state.ticks >= tick:
+                    break
+        return state
+
+    def close(self):
+        """
+        Closes the replay file.
+
+        :return: None
+        """
+        self._file.close()
+
+
+def replay(path):
+    """
+    Re-simulates a recorded game headlessly.
+
+    :param path: Replay file path.
+        + type: str
+    :return: The final game state.
+        + type: GameState
+    """
+    reader = ReplayReader(path)
+    try:
+        state = reader.header.new_state()
+        for actions in reader.ticks():
+            snake_engine.step(state, actions)
+    finally:
+        reader.close()
+    return state
+
+
+def verify_replay(path):
+    """
+    Checks that seeking gives the same game as replaying: a state restored from every keyframe is simulated next
+    to the replayed one and both are compared on every tick.
+
+    :param path: Replay file path.
+        + type: str
+    :return: The first tick where the states differ, or None if they always match.
+        + type: int or None
+    """
+    reader = ReplayReader(path)
+    try:
+        stream = reader._stream(HEADER_SIZE)
+        num_players = reader.header.num_players
+        state = reader.header.new_state()
+        seeked = reader.header.new_state()
+        while not stream.at_end():
+            actions, blob = decode_record(stream, num_players)
+            if actions is None:
+                seeked = unpack_state(reader.header, blob)
+            else:
+                snake_engine.step(state, actions)
+                snake_engine.step(seeked, actions)
+            if pack_state(seeked) != pack_state(state):
+                return state.ticks
+    finally:
+        reader.close()
+    return None
+
+
+def record_verify_games(directory):
+    """
+    Records seeded games with random inputs, in both modes, for the self-check.
+
+    :param directory: Directory where the replays are written.
+        + type: str
+    :return: The replay file paths.
+        + type: List<str>
+    """
+    paths = []
+    for mode, num_players in [(MODE_SNAKE, 1), (MODE_FIGHT, VERIFY_PLAYERS)]:
+        for seed in range(VERIFY_GAMES):
+            header = ReplayHeader(mode, num_players, seed, y_size=VERIFY_Y_SIZE, x_size=VERIFY_X_SIZE)
+            path = os.path.join(directory, "verify-" + str(mode) + "-" + str(seed) + ".replay")
+            writer = ReplayWriter(path, header, keyframe_interval=VERIFY_KEYFRAME_INTERVAL)
+            state = header.new_state()
+            rng = random.Random(seed)
+            while not state.must_end and state.ticks < VERIFY_MAX_TICKS:
+                # Random turns, without reversing the snakes so the games last longer
+                actions = [None] * num_players
+                for player_id in range(num_players):
+                    if rng.random() < 0.2:
+                        reverse = snake_engine.OPPOSITE_DIRECTIONS[state.directions[player_id]]
+                        actions[player_id] = rng.choice([direction for direction in snake_engine.DIRECTIONS
+                                                         if direction != reverse])
+                writer.record(actions, state)
+                snake_engine.step(state, actions)
+            writer.close()
+            paths.append(path)
+    return paths
+
+
+def verify(paths):
+    """
+    Self-check of the replays: seeking must give the same state as replaying on every tick, and the client
+    prediction must give the same state as the server after rolling back.
+
+    :param paths: Replay file paths, or an empty list to check seeded games.
+        + type: List<str>
+    :return: True if all the replays pass the check.
+        + type: boolean
+    """
+    # Imported here as the prediction builds on this module
+    import snake_prediction
+
+    directory = None
+    if not paths:
+        directory = tempfile.mkdtemp(prefix="snake-verify-")
+        paths = record_verify_games(directory)
+    try:
+        passed = True
+        for path in paths:
+            tick = verify_replay(path)
+            if tick is not None:
+                passed = False
+                print("FAILED " + path + ": seeking differs from replaying at tick " + str(tick))
+            tick = snake_prediction.verify_prediction(path)
+            if tick is not None:
+                passed = False
+                print("FAILED " + path + ": the prediction differs from the server at tick " + str(tick))
+        print(str(len(paths)) + " replays checked, " + ("all passed" if passed else "some failed"))
+        return passed
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory)
+
+
+#
+# MAIN
+#
+
+def main(path, tick=None):
+    """
+    Re-simulates the given replay and shows the scores at the given tick (the final ones by default).
+
+    :param path: Replay file path.
+        + type: str
+    :param tick: Tick to seek to.
+        + type: int or None
+    :return: None
+    """
+    logger.info("Replay start")
+    if tick is None:
+        state = replay(path)
+    else:
+        reader = ReplayReader(path)
+        try:
+            state = reader.state_at(tick)
+        finally:
+            reader.close()
+    print()
+    print("TICKS = " + str(state.ticks))
+    for player_id, score in enumerate(state.scores):
+        print("Player " + str(player_id) + " with Score = " + str(score))
+    print()
+    logger.info("Replay end")
+
+
+#
+# ENTRY POINT
+#
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s | %(levelname)s | %(name)s - %(message)s')
+    if len(sys.argv) > 1 and sys.argv[1] == "--verify":
+        sys.exit(0 if verify(sys.argv[2:]) else 1)
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None)
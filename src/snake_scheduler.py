@@ -0,0 +1,475 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+import logging
+import math
+import time
+
+# CONSTANTS
+# Seconds per tick of the timer wheel
+WHEEL_RESOLUTION = 0.001
+
+# Levels of the timer wheel and slots per level (2 ** LEVEL_BITS). Level n holds the timers expiring in less
+# than 2 ** (LEVEL_BITS * (n + 1)) wheel ticks, so 4 levels of 64 slots cover about 4.6 hours at 1 ms
+WHEEL_LEVELS = 4
+LEVEL_BITS = 6
+LEVEL_SLOTS = 1 << LEVEL_BITS
+LEVEL_MASK = LEVEL_SLOTS - 1
+MAX_WHEEL_DELAY = (1 << (LEVEL_BITS * WHEEL_LEVELS)) - 1
+
+# Games running more ticks than this behind their schedule drop the missed ticks instead of catching up
+MAX_LATE_TICKS = 5
+
+# Games running more ticks than this behind their schedule are reported as falling behind
+BEHIND_TICKS = 2
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# TIMER WHEEL
+#
+
+class Timer(object):
+    """
+    Timer of a timer wheel.
+    """
+    __slots__ = ['expires', 'callback', 'slot']
+
+    def __init__(self, expires, callback):
+        """
+        Creates a new timer.
+
+        :param expires: Wheel tick when the timer expires.
+            + type: int
+        :param callback: Function called without arguments when the timer expires.
+            + type: function
+        """
+        self.expires = expires
+        self.callback = callback
+        # Slot of the wheel holding the timer, or None if it is not scheduled
+        self.slot = None
+
+
+class TimerWheel(object):
+    """
+    Hierarchical timer wheel (Varghese and Lauck): WHEEL_LEVELS arrays of LEVEL_SLOTS slots, where each slot of a
+    level spans a whole turn of the level below.
+
+    A timer is stored on the slot of the lowest level that can hold its delay, so adding or cancelling it is
+    O(1) (each slot is a set). Whenever a level completes a turn, the next slot of the level above is cascaded:
+    its timers are moved to lower levels, at most WHEEL_LEVELS - 1 times each. Advancing the wheel only visits
+    the slots of the elapsed ticks, whatever the number of timers.
+    """
+
+    def __init__(self, now=0):
+        """
+        Creates a new empty wheel.
+
+        :param now: Current wheel tick.
+            + type: int
+        """
+        self.levels = [[set() for _ in range(LEVEL_SLOTS)] for _ in range(WHEEL_LEVELS)]
+        # Next wheel tick to process
+        self.current = now
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _place(self, timer):
+        """
+        Stores a timer on the slot matching its delay.
+
+        :param timer: Timer.
+            + type: Timer
+        :return: None
+        """
+        delay = min(max(timer.expires - self.current, 0), MAX_WHEEL_DELAY)
+        expires = self.current + delay
+        level = 0
+        while delay >= (1 << (LEVEL_BITS * (level + 1))):
+            level = level + 1
+        slot = self.levels[level][(expires >> (LEVEL_BITS * level)) & LEVEL_MASK]
+        slot.add(timer)
+        timer.slot = slot
+
+    def add(self, timer):
+        """
+        Schedules a timer (timers already expired fire on the next advance).
+
+        :param timer: Timer not scheduled yet.
+            + type: Timer
+        :return: The timer.
+            + type: Timer
+        """
+        self._place(timer)
+        self.count = self.count + 1
+        return timer
+
+    def cancel(self, timer):
+        """
+        Cancels a scheduled timer.
+
+        :param timer: Timer.
+            + type: Timer
+        :return: True if the timer was scheduled.
+            + type: boolean
+        """
+        if timer.slot is None:
+            return False
+        timer.slot.discard(timer)
+        timer.slot = None
+        self.count = self.count - 1
+        return True
+
+    def advance(self, now):
+        """
+        Processes the wheel ticks up to the given one.
+
+        :param now: Current wheel tick.
+            + type: int
+        :return: The expired timers, in expiration order.
+            + type: List<Timer>
+        """
+        expired = []
+        if self.count == 0:
+            # Nothing to cascade nor expire, jump to the current tick
+            self.current = max(self.current, now + 1)
+            return expired
+
+        levels = self.levels
+        while self.current <= now and self.count > 0:
+            index = self.current & LEVEL_MASK
+            if index == 0:
+                # The first level completed a turn, cascade the next slots of the levels above
+                level = 1
+                while level < WHEEL_LEVELS:
+                    level_index = (self.current >> (LEVEL_BITS * level)) & LEVEL_MASK
+                    timers = levels[level][level_index]
+                    if timers:
+                        levels[level][level_index] = set()
+                        for timer in timers:
+                            self._place(timer)
+                    if level_index != 0:
+                        break
+                    level = level + 1
+
+            slot = levels[0][index]
+            if slot:
+                levels[0][index] = set()
+                for timer in slot:
+                    timer.slot = None
+                expired.extend(slot)
+                self.count = self.count - len(slot)
+            self.current = self.current + 1
+        self.current = max(self.current, now + 1)
+        return expired
+
+    def next_expiry(self):
+        """
+        Returns a wheel tick when the wheel must be advanced again: the tick of the next timer on the first level,
+        or the next cascade if the first level is empty until then.
+
+        :return: The wheel tick, or None if there are no timers.
+            + type: int or None
+        """
+        if self.count == 0:
+            return None
+        slots = self.levels[0]
+        tick = self.current
+        while True:
+            if slots[tick & LEVEL_MASK]:
+                return tick
+            tick = tick + 1
+            if tick & LEVEL_MASK == 0:
+                return tick
+
+
+#
+# GAME SCHEDULER
+#
+
+class ScheduledGame(object):
+    """
+    Schedule of a game run by a GameScheduler.
+    """
+
+    def __init__(self, game, on_end):
+        """
+        Creates the schedule of a game.
+
+        :param game: Game providing interval() and tick().
+            + type: object
+        :param on_end: Function called with the game when it ends, or None.
+            + type: function
+        """
+        self.game = game
+        self.on_end = on_end
+        self.timer = None
+        self.due = None
+        self.interval = None
+        self.lag = 0.0
+        self.behind = False
+        self.ticks = 0
+        self.late_ticks = 0
+        self.dropped_ticks = 0
+
+
+class GameScheduler(object):
+    """
+    Runs many independent games on a single thread, each one ticking at its own interval.
+
+    A game is any object with:
+        interval(): seconds until its next tick (e.g. from snake_engine.game_speed)
+        tick(): simulates one tick, returning False once the game has ended
+
+    The ticks of all the games are timers of a single TimerWheel, and the scheduler keeps a single timer of the
+    asyncio event loop armed for the next expiry, so the cost of a tick does not depend on the number of games.
+    Every game follows a fixed timestep: its next tick is due one interval after the previous due time, not after
+    the time it actually ran. Games too far behind drop the missed ticks, and games more than BEHIND_TICKS
+    intervals behind are reported (logged, and listed by behind()).
+    """
+
+    def __init__(self, clock=time.monotonic, resolution=WHEEL_RESOLUTION, max_late_ticks=MAX_LATE_TICKS,
+                 behind_ticks=BEHIND_TICKS, on_late=None):
+        """
+        Creates a new scheduler.
+
+        :param clock: Monotonic clock returning seconds (replaced by the event loop clock when started).
+            + type: function
+        :param resolution: Seconds per tick of the timer wheel.
+            + type: float
+        :param max_late_ticks: Intervals behind the schedule after which the missed ticks are dropped.
+            + type: int
+        :param behind_ticks: Intervals behind the schedule after which a game is reported as falling behind.
+            + type: int
+        :param on_late: Function called with the game, its lag in seconds and its dropped ticks for every tick
+            run after its due time, or None.
+            + type: function
+        """
+        self.clock = clock
+        self.resolution = resolution
+        self.max_late_ticks = max_late_ticks
+        self.behind_ticks = behind_ticks
+        self.on_late = on_late
+        self.wheel = TimerWheel(self._wheel_tick(clock()))
+        self.games = {}
+        # Kept as a plain counter so it can be read from other threads (e.g. by the metrics endpoint)
+        self.games_behind = 0
+        self._loop = None
+        self._handle = None
+        self._handle_tick = None
+
+    def __len__(self):
+        return len(self.games)
+
+    def _wheel_tick(self, when):
+        """
+        Converts a clock time to a wheel tick.
+
+        :param when: Clock time in seconds.
+            + type: float
+        :return: The wheel tick.
+            + type: int
+        """
+        return int(math.floor(when / self.resolution))
+
+    def _schedule(self, scheduled, due):
+        """
+        Schedules the next tick of a game. Timers expire on the first wheel tick at or after the due time, so
+        games never tick early.
+
+        :param scheduled: Game schedule.
+            + type: ScheduledGame
+        :param due: Clock time when the tick is due.
+            + type: float
+        :return: None
+        """
+        scheduled.due = due
+        scheduled.timer = self.wheel.add(Timer(int(math.ceil(due / self.resolution)),
+                                               lambda: self._run_tick(scheduled)))
+
+    def add(self, game, on_end=None):
+        """
+        Starts ticking a game: its first tick is due after one interval.
+
+        :param game: Game providing interval() and tick().
+            + type: object
+        :param on_end: Function called with the game when it ends, or None.
+            + type: function
+        :return: None
+        """
+        scheduled = ScheduledGame(game, on_end)
+        self.games[id(game)] = scheduled
+        scheduled.interval = game.interval()
+        self._schedule(scheduled, self.clock() + scheduled.interval)
+        self._arm()
+
+    def remove(self, game):
+        """
+        Stops ticking a game (without calling its end function).
+
+        :param game: Scheduled game.
+            + type: object
+        :return: True if the game was scheduled.
+            + type: boolean
+        """
+        scheduled = self.games.pop(id(game), None)
+        if scheduled is None:
+            return False
+        self.wheel.cancel(scheduled.timer)
+        if scheduled.behind:
+            self.games_behind = self.games_behind - 1
+        return True
+
+    def behind(self):
+        """
+        Lists the games falling behind their schedule.
+
+        :return: The games and their lag in seconds, the most delayed first.
+            + type: List<Tuple<object, float>>
+        """
+        return sorted([(scheduled.game, scheduled.lag) for scheduled in self.games.values() if scheduled.behind],
+                      key=lambda entry: -entry[1])
+
+    def run_due(self):
+        """
+        Runs the ticks of the games that are due.
+
+        :return: Number of ticks run.
+            + type: int
+        """
+        expired = self.wheel.advance(self._wheel_tick(self.clock()))
+        for timer in expired:
+            timer.callback()
+        return len(expired)
+
+    def _run_tick(self, scheduled):
+        """
+        Runs a tick of a game and schedules the next one.
+
+        :param scheduled: Game schedule.
+            + type: ScheduledGame
+        :return: None
+        """
+        game = scheduled.game
+        if self.games.get(id(game)) is not scheduled:
+            # Removed by a game that ticked before on the same advance
+            return
+        now = self.clock()
+        lag = now - scheduled.due
+        due = scheduled.due
+        dropped = 0
+        if lag > self.max_late_ticks * scheduled.interval:
+            # Too far behind to catch up without bursting, restart the schedule
+            dropped = int(lag / scheduled.interval)
+            scheduled.dropped_ticks = scheduled.dropped_ticks + dropped
+            logger.debug("Game " + str(game) + " dropped " + str(dropped) + " ticks")
+            due = now
+        if lag >= self.resolution:
+            scheduled.late_ticks = scheduled.late_ticks + 1
+            if self.on_late is not None:
+                self.on_late(game, lag, dropped)
+
+        # Report the games entering or leaving the behind state (a game is back on schedule once it is less than a
+        # tick late, so the games hovering around the threshold are not reported on every tick)
+        scheduled.lag = lag
+        if scheduled.behind:
+            behind = lag > scheduled.interval
+        else:
+            behind = lag > self.behind_ticks * scheduled.interval
+        if behind != scheduled.behind:
+            scheduled.behind = behind
+            self.games_behind = self.games_behind + (1 if behind else -1)
+            if behind:
+                logger.warning("Game " + str(game) + " is falling behind its schedule (%.1f ms late)" % (lag * 1000))
+            else:
+                logger.info("Game " + str(game) + " is back on schedule")
+
+        scheduled.ticks = scheduled.ticks + 1
+        try:
+            running = game.tick()
+        except Exception:
+            logger.exception("Game " + str(game) + " failed")
+            running = False
+        if not running:
+            self.remove(game)
+            if scheduled.on_end is not None:
+                scheduled.on_end(game)
+            return
+
+        # Fixed timestep following the current speed of the game
+        scheduled.interval = game.interval()
+        self._schedule(scheduled, due + scheduled.interval)
+
+    #
+    # EVENT LOOP
+    #
+
+    def start(self, loop):
+        """
+        Runs the scheduler on an asyncio event loop, following its clock.
+
+        :param loop: Event loop.
+            + type: asyncio.AbstractEventLoop
+        :return: None
+        """
+        self._loop = loop
+        if self.clock is not loop.time:
+            # The wheel ticks are absolute times, move the scheduled games to the loop clock
+            offset = loop.time() - self.clock()
+            self.clock = loop.time
+            schedules = list(self.games.values())
+            self.wheel = TimerWheel(self._wheel_tick(self.clock()))
+            for scheduled in schedules:
+                self._schedule(scheduled, scheduled.due + offset)
+        self._arm()
+
+    def _arm(self):
+        """
+        Arms the event loop timer for the next expiry of the wheel, if it is earlier than the armed one.
+
+        :return: None
+        """
+        if self._loop is None:
+            return
+        tick = self.wheel.next_expiry()
+        if tick is None:
+            return
+        if self._handle is not None:
+            if self._handle_tick <= tick:
+                return
+            self._handle.cancel()
+        self._handle_tick = tick
+        self._handle = self._loop.call_at(tick * self.resolution, self._on_timer)
+
+    def _on_timer(self):
+        """
+        Runs the due ticks when the event loop timer fires.
+
+        :return: None
+        """
+        self._handle = None
+        self.run_due()
+        self._arm()
+
+    def close(self):
+        """
+        Stops running the scheduler on the event loop (the games are kept).
+
+        :return: None
+        """
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._loop = None
@@ -0,0 +1,601 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+import snake_bots
+import snake_engine
+from snake_engine import DIRECTIONS, OPPOSITE_DIRECTIONS, NO_OWNER, SPARSE_BOARD_CELLS
+from snake_replay import ReplayHeader, MODE_SNAKE, MODE_FIGHT
+
+# CONFIGURABLE CONSTANTS
+BOUNDS_ENABLED = False
+
+# CONSTANTS
+Y_SIZE = 40
+X_SIZE = 100
+
+DATASET_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+CHUNK_FILE = "chunk_%06d.bin"
+TEMPORARY_SUFFIX = ".tmp"
+
+DEFAULT_GAMES = 1000
+DEFAULT_GAMES_PER_CHUNK = 16
+DEFAULT_MAX_TICKS = 2000
+DEFAULT_FIGHT_PLAYERS = 4
+# Share of the games played as Snake Fight (the rest are single player)
+DEFAULT_FIGHT_SHARE = 0.5
+# Probability of replacing the direction of a bot by a random one, to explore other transitions
+DEFAULT_EPSILON = 0.1
+DEFAULT_POLICIES = ["path", "greedy"]
+
+# Cells seen around the head on each side of the observation window
+DEFAULT_VIEW_RADIUS = 7
+
+# Transitions staged in memory before being copied to the chunk file
+BUFFER_ROWS = 4096
+
+# Content of the observation cells, relative to the observing player
+VIEW_EMPTY = 0
+VIEW_OWN_SNAKE = 1
+VIEW_OTHER_SNAKE = 2
+VIEW_OWN_FOOD = 3
+VIEW_OTHER_FOOD = 4
+VIEW_WALL = 5
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+# Policies loaded on each worker process
+_policies = {}
+
+
+#
+# DATASET FORMAT
+#
+
+def transition_dtype(view_radius):
+    """
+    Builds the fixed-width record of a transition: the observation of a player before a tick, the direction it
+    took and the score it got on the tick.
+
+    :param view_radius: Cells seen around the head on each side.
+        + type: int
+    :return: The record type.
+        + type: numpy.dtype
+    """
+    view_size = 2 * view_radius + 1
+    return np.dtype([("game", "<u8"), ("tick", "<u4"), ("player", "<u2"), ("length", "<u4"),
+                     ("direction", "i1"), ("food_offset", "<i4", (2,)), ("view", "i1", (view_size, view_size)),
+                     ("action", "i1"), ("reward", "<i4"), ("done", "u1"), ("truncated", "u1")])
+
+
+def game_seed(base_seed, game_index):
+    """
+    Derives the seed of a game from the dataset seed, so every game is reproducible on its own.
+
+    :param base_seed: Dataset seed.
+        + type: int
+    :param game_index: Index of the game on the dataset.
+        + type: int
+    :return: The game seed.
+        + type: int
+    """
+    return random.Random(str(base_seed) + ":" + str(game_index)).getrandbits(snake_engine.SEED_BITS)
+
+
+def chunk_path(directory, chunk_index):
+    """
+    Returns the path of a chunk file.
+
+    :param directory: Dataset directory.
+        + type: str
+    :param chunk_index: Chunk index.
+        + type: int
+    :return: The chunk path.
+        + type: str
+    """
+    return os.path.join(directory, CHUNK_FILE % chunk_index)
+
+
+def load_manifest(directory):
+    """
+    Loads the manifest of a dataset.
+
+    :param directory: Dataset directory.
+        + type: str
+    :return: The manifest, or None if the directory has no dataset.
+        + type: dict or None
+    """
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(directory, manifest):
+    """
+    Writes the manifest of a dataset atomically, so an interruption never leaves it half written.
+
+    :param directory: Dataset directory.
+        + type: str
+    :param manifest: Manifest.
+        + type: dict
+    :return: None
+    """
+    path = os.path.join(directory, MANIFEST_FILE)
+    with open(path + TEMPORARY_SUFFIX, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + TEMPORARY_SUFFIX, path)
+
+
+def open_chunks(directory):
+    """
+    Opens the completed chunks of a dataset as read-only memory maps (nothing is loaded until accessed).
+
+    :param directory: Dataset directory.
+        + type: str
+    :return: The memory map of each completed chunk, in chunk order.
+        + type: List<numpy.memmap>
+    :raise ValueError: If the directory has no dataset.
+    """
+    manifest = load_manifest(directory)
+    if manifest is None:
+        raise ValueError("No dataset on " + str(directory))
+    dtype = transition_dtype(manifest["config"]["view_radius"])
+    chunks = []
+    for chunk_index in sorted(int(index) for index in manifest["chunks"]):
+        if manifest["chunks"][str(chunk_index)]["rows"] > 0:
+            chunks.append(np.memmap(chunk_path(directory, chunk_index), dtype=dtype, mode='r'))
+    return chunks
+
+
+#
+# OBSERVATIONS
+#
+
+class Observer(object):
+    """
+    Encodes the observation of each player of a game: the window of cells around its head (VIEW_* contents),
+    its direction, its length and the offset to its food.
+
+    The window is read from a zero-copy NumPy view of the occupancy grid of the state, so the observations never
+    need to track the board changes.
+    """
+
+    def __init__(self, state, view_radius):
+        """
+        Creates the observer of a game.
+
+        :param state: Game state (dense board).
+            + type: GameState
+        :param view_radius: Cells seen around the head on each side.
+            + type: int
+        """
+        self.state = state
+        self.grid = np.frombuffer(state.grid, dtype=np.intc)
+        offsets = np.arange(-view_radius, view_radius + 1)
+        self.offset_y = offsets[:, np.newaxis]
+        self.offset_x = offsets[np.newaxis, :]
+
+    def food_offset(self, head_y, head_x, food):
+        """
+        Returns the offset from a head to a food, the shortest one around the borders on wrap-around boards.
+
+        :param head_y: Head row.
+            + type: int
+        :param head_x: Head column.
+            + type: int
+        :param food: Packed food cell, or None.
+            + type: int or None
+        :return: The (rows, columns) offset ((0, 0) without food).
+            + type: Tuple<int, int>
+        """
+        if food is None:
+            return 0, 0
+        state = self.state
+        food_y, food_x = divmod(food, state.x_size)
+        offset_y = food_y - head_y
+        offset_x = food_x - head_x
+        if not state.bounds_enabled:
+            size_y = state.y_size - 2
+            size_x = state.x_size - 2
+            offset_y = (offset_y + size_y // 2) % size_y - size_y // 2
+            offset_x = (offset_x + size_x // 2) % size_x - size_x // 2
+        return offset_y, offset_x
+
+    def view(self, player_id):
+        """
+        Builds the window of cells around the head of a player.
+
+        :param player_id: Player id (alive).
+            + type: int
+        :return: The (2 * view_radius + 1) square window of VIEW_* contents.
+            + type: numpy.ndarray
+        """
+        state = self.state
+        y_size = state.y_size
+        x_size = state.x_size
+        head_y, head_x = divmod(state.snakes[player_id].head(), x_size)
+        rows = head_y + self.offset_y
+        columns = head_x + self.offset_x
+        if state.bounds_enabled:
+            walls = (rows <= 0) | (rows >= y_size - 1) | (columns <= 0) | (columns >= x_size - 1)
+            rows = np.clip(rows, 0, y_size - 1)
+            columns = np.clip(columns, 0, x_size - 1)
+        else:
+            walls = None
+            rows = (rows - 1) % (y_size - 2) + 1
+            columns = (columns - 1) % (x_size - 2) + 1
+        cells = rows * x_size + columns
+
+        owners = self.grid[cells]
+        view = np.where(owners == NO_OWNER, VIEW_EMPTY, VIEW_OTHER_SNAKE).astype(np.int8)
+        view[owners == player_id] = VIEW_OWN_SNAKE
+        # Snakes hide the foods below them
+        free = owners == NO_OWNER
+        other_foods = [food for other_id, food in enumerate(state.foods) if other_id != player_id and food is not None]
+        if other_foods:
+            view[free & np.isin(cells, other_foods)] = VIEW_OTHER_FOOD
+        if state.foods[player_id] is not None:
+            view[free & (cells == state.foods[player_id])] = VIEW_OWN_FOOD
+        if walls is not None:
+            view[walls] = VIEW_WALL
+        return view
+
+
+#
+# CHUNK WRITER
+#
+
+class ChunkWriter(object):
+    """
+    Writes the transitions of a chunk on a memory-mapped file preallocated for the largest possible chunk.
+
+    Transitions are staged on a fixed buffer of BUFFER_ROWS records and copied to the file when it is full, so
+    the memory used does not depend on the chunk size. The file is truncated to the written records when closed.
+    """
+
+    def __init__(self, path, dtype, capacity, buffer_rows=BUFFER_ROWS):
+        """
+        Creates the chunk file.
+
+        :param path: File path.
+            + type: str
+        :param dtype: Transition record type.
+            + type: numpy.dtype
+        :param capacity: Maximum number of transitions of the chunk.
+            + type: int
+        :param buffer_rows: Transitions staged in memory (at least the transitions of a tick).
+            + type: int
+        """
+        self.path = path
+        self.dtype = dtype
+        # The preallocated file is sparse: only the written pages take disk space
+        self.file = np.memmap(path, dtype=dtype, mode='w+', shape=(max(1, capacity),))
+        self.buffer = np.zeros(min(buffer_rows, max(1, capacity)), dtype=dtype)
+        self.buffered = 0
+        self.rows = 0
+
+    def reserve(self, count):
+        """
+        Reserves consecutive buffer records for the transitions of a tick, flushing the buffer if they do not fit.
+
+        :param count: Number of records (at most the buffer size).
+            + type: int
+        :return: Index of the first reserved record on the buffer.
+            + type: int
+        """
+        if self.buffered + count > len(self.buffer):
+            self.flush()
+        start = self.buffered
+        self.buffered = self.buffered + count
+        return start
+
+    def flush(self):
+        """
+        Copies the staged transitions to the file.
+
+        :return: None
+        """
+        if self.buffered:
+            self.file[self.rows:self.rows + self.buffered] = self.buffer[:self.buffered]
+            self.file.flush()
+            self.rows = self.rows + self.buffered
+            self.buffered = 0
+
+    def close(self):
+        """
+        Flushes the staged transitions and truncates the file to the written ones.
+
+        :return: The number of written transitions.
+            + type: int
+        """
+        self.flush()
+        self.file.flush()
+        del self.file
+        os.truncate(self.path, self.rows * self.dtype.itemsize)
+        return self.rows
+
+
+#
+# GAMES
+#
+
+def play_game(writer, game_index, config):
+    """
+    Plays a headless self-play game between bot policies and writes the transitions of every alive player on
+    every tick. The reward of a transition is the score gained on the tick (MAX_SCORE_PER_FOOD scaled by the time
+    to the food, plus SCORE_PER_KILL per kill).
+
+    :param writer: Chunk writer.
+        + type: ChunkWriter
+    :param game_index: Index of the game on the dataset.
+        + type: int
+    :param config: Dataset settings.
+        + type: dict
+    :return: The number of ticks, foods eaten and kills of the game.
+        + type: Tuple<int, int, int>
+    """
+    seed = game_seed(config["seed"], game_index)
+    rng = random.Random(seed)
+    if rng.random() < config["fight_share"]:
+        header = ReplayHeader(MODE_FIGHT, config["fight_players"], seed, y_size=config["y_size"],
+                              x_size=config["x_size"], bounds_enabled=config["bounds_enabled"])
+    else:
+        header = ReplayHeader(MODE_SNAKE, 1, seed, y_size=config["y_size"], x_size=config["x_size"],
+                              bounds_enabled=config["bounds_enabled"])
+    state = header.new_state()
+
+    policies = {}
+    for player_id in range(state.num_players):
+        name = config["policies"][rng.randrange(len(config["policies"]))]
+        if name not in _policies:
+            _policies[name] = snake_bots.load_policy(name)
+        policies[player_id] = _policies[name]
+    # No time budget: the dataset must not depend on the load of the machine
+    bots = snake_bots.BotController(policies, budget=None)
+    observer = Observer(state, config["view_radius"])
+    epsilon = config["epsilon"]
+    max_ticks = config["max_ticks"]
+    buffer = writer.buffer
+
+    while not state.must_end and state.ticks < max_ticks:
+        actions = [None] * state.num_players
+        bots.actions(state, actions)
+        players = [player_id for player_id in range(state.num_players) if state.players_alive[player_id]]
+        start = writer.reserve(len(players))
+        for row, player_id in enumerate(players, start):
+            direction = state.directions[player_id]
+            if rng.random() < epsilon:
+                actions[player_id] = rng.choice([d for d in DIRECTIONS if d != OPPOSITE_DIRECTIONS[direction]])
+            action = actions[player_id] if actions[player_id] is not None else direction
+            head_y, head_x = divmod(state.snakes[player_id].head(), state.x_size)
+            buffer[row] = (game_index, state.ticks, player_id, len(state.snakes[player_id]), direction,
+                           observer.food_offset(head_y, head_x, state.foods[player_id]), observer.view(player_id),
+                           action, 0, 0, 0)
+
+        scores = list(state.scores)
+        snake_engine.step(state, actions)
+        truncated = not state.must_end and state.ticks >= max_ticks
+        for row, player_id in enumerate(players, start):
+            buffer["reward"][row] = state.scores[player_id] - scores[player_id]
+            buffer["done"][row] = state.must_end or not state.players_alive[player_id]
+            buffer["truncated"][row] = truncated
+    return state.ticks, state.foods_eaten, state.kills
+
+
+def generate_chunk(spec):
+    """
+    Generates the games of a chunk. Runs on the worker processes.
+
+    The chunk is written on a temporary file that is renamed once complete, so an interrupted chunk is never
+    mistaken for a finished one.
+
+    :param spec: Tuple with the dataset directory, the chunk index, the first game, the number of games and the
+        dataset settings.
+        + type: Tuple<str, int, int, int, dict>
+    :return: The chunk summary.
+        + type: dict
+    """
+    directory, chunk_index, first_game, num_games, config = spec
+    path = chunk_path(directory, chunk_index)
+    dtype = transition_dtype(config["view_radius"])
+    players = max(1, config["fight_players"])
+    writer = ChunkWriter(path + TEMPORARY_SUFFIX, dtype, num_games * config["max_ticks"] * players,
+                         max(BUFFER_ROWS, players))
+    ticks = foods = kills = 0
+    for game_index in range(first_game, first_game + num_games):
+        game_ticks, game_foods, game_kills = play_game(writer, game_index, config)
+        ticks = ticks + game_ticks
+        foods = foods + game_foods
+        kills = kills + game_kills
+    rows = writer.close()
+    os.replace(path + TEMPORARY_SUFFIX, path)
+    return {"chunk": chunk_index, "rows": rows, "games": num_games, "ticks": ticks, "foods": foods, "kills": kills}
+
+
+#
+# DATASET
+#
+
+def generate_dataset(directory, games=DEFAULT_GAMES, games_per_chunk=DEFAULT_GAMES_PER_CHUNK, seed=0,
+                     policies=None, fight_share=DEFAULT_FIGHT_SHARE, fight_players=DEFAULT_FIGHT_PLAYERS,
+                     epsilon=DEFAULT_EPSILON, view_radius=DEFAULT_VIEW_RADIUS, max_ticks=DEFAULT_MAX_TICKS,
+                     y_size=Y_SIZE, x_size=X_SIZE, bounds_enabled=BOUNDS_ENABLED, workers=None):
+    """
+    Generates a self-play dataset on a process pool, or resumes an interrupted one.
+
+    Every chunk holds the transitions of a fixed range of games and every game is seeded from the dataset seed,
+    so the chunks can be generated in any order and a resumed dataset is identical to an uninterrupted one. The
+    manifest records the settings and the completed chunks; a directory with a manifest is resumed (with the
+    same settings) by generating only the missing chunks.
+
+    :param directory: Dataset directory (created if needed).
+        + type: str
+    :param games: Number of games.
+        + type: int
+    :param games_per_chunk: Games per chunk file.
+        + type: int
+    :param seed: Dataset seed, from which the seed of every game is derived.
+        + type: int
+    :param policies: Policy names the players are drawn from (see snake_bots.load_policy).
+        + type: List<str> or None
+    :param fight_share: Share of the games played as Snake Fight.
+        + type: float
+    :param fight_players: Players of the Snake Fight games.
+        + type: int
+    :param epsilon: Probability of replacing a bot direction by a random one.
+        + type: float
+    :param view_radius: Cells seen around the head on each side.
+        + type: int
+    :param max_ticks: Ticks after which a game is stopped (its last transitions are marked as truncated).
+        + type: int
+    :param y_size: Board height (including borders).
+        + type: int
+    :param x_size: Board width (including borders).
+        + type: int
+    :param bounds_enabled: Whether crossing the borders kills the snakes instead of wrapping around.
+        + type: boolean
+    :param workers: Worker processes (defaults to the number of cores).
+        + type: int or None
+    :return: The manifest of the dataset.
+        + type: dict
+    :raise ValueError: If the board is too big or the directory holds a dataset with other settings.
+    """
+    if y_size * x_size > SPARSE_BOARD_CELLS:
+        raise ValueError("Board too big to generate observations")
+    config = {"games": games, "games_per_chunk": games_per_chunk, "seed": seed,
+              "policies": list(policies or DEFAULT_POLICIES), "fight_share": fight_share,
+              "fight_players": fight_players, "epsilon": epsilon, "view_radius": view_radius,
+              "max_ticks": max_ticks, "y_size": y_size, "x_size": x_size, "bounds_enabled": bounds_enabled}
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    manifest = load_manifest(directory)
+    if manifest is None:
+        manifest = {"version": DATASET_FORMAT_VERSION, "config": config,
+                    "dtype": np.lib.format.dtype_to_descr(transition_dtype(view_radius)), "chunks": {}}
+        save_manifest(directory, manifest)
+    elif manifest["version"] != DATASET_FORMAT_VERSION or manifest["config"] != config:
+        raise ValueError("The dataset on " + str(directory) + " was generated with other settings")
+
+    # Chunks interrupted or finished after the last manifest update are generated again
+    for path in glob.glob(os.path.join(directory, "*" + TEMPORARY_SUFFIX)):
+        os.remove(path)
+    itemsize = transition_dtype(view_radius).itemsize
+    for chunk_index, summary in list(manifest["chunks"].items()):
+        path = chunk_path(directory, int(chunk_index))
+        if not os.path.exists(path) or os.path.getsize(path) != summary["rows"] * itemsize:
+            logger.warning("Chunk " + chunk_index + " is damaged and will be generated again")
+            del manifest["chunks"][chunk_index]
+
+    specs = []
+    for chunk_index, first_game in enumerate(range(0, games, games_per_chunk)):
+        if str(chunk_index) not in manifest["chunks"]:
+            specs.append((directory, chunk_index, first_game, min(games_per_chunk, games - first_game), config))
+    logger.debug(str(len(specs)) + " chunks to generate, " + str(len(manifest["chunks"])) + " already done")
+    if not specs:
+        return manifest
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        for summary in pool.imap_unordered(generate_chunk, specs):
+            manifest["chunks"][str(summary["chunk"])] = summary
+            save_manifest(directory, manifest)
+            logger.debug("Chunk " + str(summary["chunk"]) + ": " + str(summary["rows"]) + " transitions")
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return manifest
+
+
+#
+# MAIN
+#
+
+def main():
+    """
+    Main function to generate a self-play dataset.
+
+    :return: Exit code.
+        + type: int
+    """
+    parser = argparse.ArgumentParser(description="Snake self-play dataset generator")
+    parser.add_argument("output", help="Dataset directory (an existing dataset is resumed)")
+    parser.add_argument("--games", type=int, default=DEFAULT_GAMES, help="Number of games")
+    parser.add_argument("--games-per-chunk", type=int, default=DEFAULT_GAMES_PER_CHUNK, help="Games per chunk file")
+    parser.add_argument("--seed", type=int, default=0, help="Dataset seed")
+    parser.add_argument("--policies", nargs="+", default=DEFAULT_POLICIES,
+                        help="Bot policies the players are drawn from: built-in names (" +
+                             ", ".join(sorted(snake_bots.POLICIES)) + ") or module:function import paths")
+    parser.add_argument("--fight-share", type=float, default=DEFAULT_FIGHT_SHARE,
+                        help="Share of the games played as Snake Fight")
+    parser.add_argument("--fight-players", type=int, default=DEFAULT_FIGHT_PLAYERS, help="Players per Snake Fight")
+    parser.add_argument("--epsilon", type=float, default=DEFAULT_EPSILON,
+                        help="Probability of a random direction on each tick")
+    parser.add_argument("--view-radius", type=int, default=DEFAULT_VIEW_RADIUS,
+                        help="Cells seen around the head on each side")
+    parser.add_argument("--max-ticks", type=int, default=DEFAULT_MAX_TICKS, help="Maximum ticks per game")
+    parser.add_argument("--workers", type=int, help="Worker processes (defaults to the number of cores)")
+    args = parser.parse_args()
+
+    for name in args.policies:
+        try:
+            snake_bots.load_policy(name)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.games < 1 or args.games_per_chunk < 1 or args.fight_players < 1 or args.view_radius < 0:
+        parser.error("The games, games per chunk, fight players and view radius must be positive")
+
+    start = time.time()
+    try:
+        manifest = generate_dataset(args.output, args.games, args.games_per_chunk, args.seed, args.policies,
+                                    args.fight_share, args.fight_players, args.epsilon, args.view_radius,
+                                    args.max_ticks, workers=args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    except KeyboardInterrupt:
+        logger.info("Interrupted: run again with the same settings to resume")
+        return 1
+    elapsed = time.time() - start
+
+    chunks = manifest["chunks"].values()
+    rows = sum(summary["rows"] for summary in chunks)
+    print("Chunks:       " + str(len(manifest["chunks"])))
+    print("Games:        " + str(sum(summary["games"] for summary in chunks)))
+    print("Transitions:  " + str(rows))
+    print("Size:         %.1f MB" % (rows * transition_dtype(args.view_radius).itemsize / 1e6))
+    print("Elapsed:      %.1f s" % elapsed)
+    return 0
+
+
+#
+# ENTRY POINT
+#
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s | %(levelname)s | %(name)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,718 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+import argparse
+import asyncio
+from collections import deque
+import logging
+import time
+
+import snake_engine
+import snake_input
+import snake_leaderboard
+import snake_metrics
+import snake_protocol
+import snake_replay
+import snake_scheduler
+from snake_protocol import DEFAULT_HOST, DEFAULT_PORT, MSG_JOIN, MSG_INPUT, MSG_RESYNC, MSG_SNAPSHOT, MSG_DELTA, \
+    ROLE_SPECTATOR, NO_PLAYER
+from snake_replay import ReplayHeader, MODE_FIGHT
+
+# CONFIGURABLE CONSTANTS
+BOUNDS_ENABLED = False
+PLAYERS_PER_MATCH = 2
+
+# CONSTANTS
+Y_SIZE = 40
+X_SIZE = 100
+
+# Clients with more unsent bytes than this are considered stalled and dropped
+MAX_PENDING_BYTES = 256 * 1024
+
+# Spectators with more unsent bytes than this skip deltas until they are resynchronized with a snapshot
+SPECTATOR_MAX_PENDING_BYTES = 64 * 1024
+
+# Maximum turns per player scheduled for future ticks
+MAX_SCHEDULED_TURNS = 32
+
+# Ticks between the state hashes sent to the players to detect games drifting from the server
+HASH_INTERVAL = 32
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# CONNECTIONS
+#
+
+class ClientConnection(object):
+    """
+    Connection of a remote client. Writes never block the simulation: frames are queued on the transport
+    and clients that stop reading are dropped.
+    """
+
+    def __init__(self, reader, writer):
+        """
+        Wraps the streams of a new connection.
+
+        :param reader: Stream reader.
+            + type: asyncio.StreamReader
+        :param writer: Stream writer.
+            + type: asyncio.StreamWriter
+        """
+        self.reader = reader
+        self.writer = writer
+        self.player_id = None
+        self.name = None
+        self.closed = False
+
+    def send(self, frame):
+        """
+        Queues a frame to be sent.
+
+        :param frame: Frame to send.
+            + type: bytes
+        :return: None
+        """
+        if self.closed:
+            return
+        if self.pending_bytes() > MAX_PENDING_BYTES:
+            logger.debug("Dropping stalled client")
+            self.close()
+            return
+        self.writer.write(frame)
+
+    def pending_bytes(self):
+        """
+        Returns the bytes queued on the transport and not sent yet.
+
+        :return: Unsent bytes.
+            + type: int
+        """
+        return self.writer.transport.get_write_buffer_size()
+
+    def close(self):
+        """
+        Closes the connection.
+
+        :return: None
+        """
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+
+
+#
+# SPECTATORS
+#
+
+class SpectatorFanout(object):
+    """
+    Streams the state of a match to its spectators as per-tick deltas.
+
+    Each delta is serialized once per tick and the same frame buffer is written to every spectator, so
+    adding viewers does not add encoding work. A delta is relative to the previous tick, which is the last
+    state a spectator acknowledged as long as its connection keeps up. New spectators and spectators whose
+    connection falls behind skip the deltas and are resynchronized with a snapshot of the whole state.
+    """
+
+    def __init__(self):
+        """
+        Creates a new fan-out without spectators.
+        """
+        self.spectators = []
+        self._unsynced = set()
+        self._last_scores = None
+        self._last_alive = None
+
+    def __len__(self):
+        return len(self.spectators)
+
+    def add(self, conn):
+        """
+        Adds a spectator, which receives a snapshot on the next published tick.
+
+        :param conn: Spectator connection.
+            + type: ClientConnection
+        :return: None
+        """
+        self.spectators.append(conn)
+        self._unsynced.add(conn)
+
+    def send(self, frame):
+        """
+        Sends a frame to all the spectators.
+
+        :param frame: Frame to send.
+            + type: bytes
+        :return: None
+        """
+        for conn in self.spectators:
+            conn.send(frame)
+
+    def publish(self, state, diffs):
+        """
+        Sends the changes of a simulated tick to all the spectators.
+
+        :param state: Game state after the tick.
+            + type: GameState
+        :param diffs: Cell diffs produced by the tick.
+            + type: List<Tuple<int, int, int>>
+        :return: None
+        """
+        # Compute the delta against the previous tick
+        scores = state.scores
+        alive = state.players_alive
+        if self._last_scores is None:
+            changed_scores = list(enumerate(scores))
+            killed = [player_id for player_id, is_alive in enumerate(alive) if not is_alive]
+        else:
+            changed_scores = [(player_id, score) for player_id, score in enumerate(scores)
+                              if score != self._last_scores[player_id]]
+            killed = [player_id for player_id, is_alive in enumerate(alive)
+                      if self._last_alive[player_id] and not is_alive]
+        self._last_scores = list(scores)
+        self._last_alive = list(alive)
+
+        if not self.spectators:
+            return
+
+        # Serialize once and share the buffer with all the spectators
+        delta = snake_protocol.encode_delta(MSG_DELTA, state.ticks, diffs, changed_scores, killed)
+        snapshot = None
+        closed = False
+        for conn in self.spectators:
+            if conn.closed:
+                closed = True
+                continue
+            if conn.pending_bytes() > SPECTATOR_MAX_PENDING_BYTES:
+                # Lagging behind, the next delta it receives would not apply to its last state
+                self._unsynced.add(conn)
+                continue
+            if conn in self._unsynced:
+                if snapshot is None:
+                    dead = [player_id for player_id, is_alive in enumerate(alive) if not is_alive]
+                    snapshot = snake_protocol.encode_delta(MSG_SNAPSHOT, state.ticks, state.initial_diffs(),
+                                                           list(enumerate(scores)), dead)
+                conn.send(snapshot)
+                self._unsynced.discard(conn)
+            else:
+                conn.send(delta)
+
+        if closed:
+            self.spectators = [conn for conn in self.spectators if not conn.closed]
+            self._unsynced = set(conn for conn in self._unsynced if not conn.closed)
+
+
+#
+# METRICS
+#
+
+class ServerMetrics(object):
+    """
+    Metrics of all the matches of a server, exposed in the text exposition format.
+    """
+
+    def __init__(self, active_matches=None, matches_behind=None):
+        """
+        Creates the server metrics.
+
+        :param active_matches: Function returning the number of running matches.
+            + type: function
+        :param matches_behind: Function returning the number of matches falling behind their schedule.
+            + type: function
+        """
+        self.registry = snake_metrics.MetricsRegistry()
+        register = self.registry.register
+        self.ticks = register(snake_metrics.Counter("snake_ticks_total", "Simulated ticks"))
+        self.tick_duration = register(snake_metrics.Histogram(
+            "snake_tick_duration_seconds", "Time to simulate and send a tick"))
+        self.late_ticks = register(snake_metrics.Counter("snake_late_ticks_total", "Ticks run after their deadline"))
+        self.dropped_ticks = register(snake_metrics.Counter(
+            "snake_dropped_ticks_total", "Ticks skipped by matches too far behind their schedule"))
+        self.inputs = register(snake_metrics.Counter("snake_inputs_total", "Turns received per player", ("player",)))
+        self.active_matches = register(snake_metrics.Gauge("snake_active_matches", "Running matches",
+                                                           active_matches))
+        self.matches_behind = register(snake_metrics.Gauge("snake_matches_behind",
+                                                           "Matches falling behind their schedule", matches_behind))
+        self.kills = register(snake_metrics.Counter("snake_kills_total", "Snakes killed by another snake"))
+        self.foods_eaten = register(snake_metrics.Counter("snake_foods_eaten_total", "Foods eaten"))
+        self.resyncs = register(snake_metrics.Counter("snake_resyncs_total",
+                                                      "Full states sent to players that drifted from the server"))
+
+
+#
+# MATCH
+#
+
+class Match(object):
+    """
+    Authoritative Snake Fight match. The server simulates the game and broadcasts the inputs applied on
+    each tick, so clients can reproduce the state from the match seed.
+    """
+
+    def __init__(self, match_id, num_players, seed, y_size=Y_SIZE, x_size=X_SIZE, bounds_enabled=BOUNDS_ENABLED,
+                 metrics=None):
+        """
+        Creates a new match waiting for players.
+
+        :param match_id: Match id.
+            + type: int
+        :param num_players: Number of players needed to start.
+            + type: int
+        :param seed: Seed of the match.
+            + type: int
+        :param y_size: Board height (including borders).
+            + type: int
+        :param x_size: Board width (including borders).
+            + type: int
+        :param bounds_enabled: Whether crossing the borders kills the snake instead of wrapping around.
+            + type: boolean
+        :param metrics: Metrics shared with the other matches of the server (defaults to own metrics).
+            + type: ServerMetrics
+        """
+        self.match_id = match_id
+        self.num_players = num_players
+        self.header = ReplayHeader(MODE_FIGHT, num_players, seed, y_size=y_size, x_size=x_size,
+                                   bounds_enabled=bounds_enabled)
+        self.state = None
+        self.players = []
+        self.spectators = SpectatorFanout()
+        self.turn_queues = [snake_input.TurnQueue() for _ in range(num_players)]
+        self.scheduled_turns = [deque() for _ in range(num_players)]
+        self.metrics = metrics if metrics is not None else ServerMetrics()
+        self.start_time = None
+
+    def is_full(self):
+        """
+        Checks whether the match has all its players.
+
+        :return: True if the match can start.
+            + type: boolean
+        """
+        return len(self.players) >= self.num_players
+
+    def add_player(self, conn):
+        """
+        Adds a player to the match.
+
+        :param conn: Player connection.
+            + type: ClientConnection
+        :return: None
+        """
+        conn.player_id = len(self.players)
+        self.players.append(conn)
+
+    def add_spectator(self, conn):
+        """
+        Adds a spectator to the match.
+
+        :param conn: Spectator connection.
+            + type: ClientConnection
+        :return: None
+        """
+        conn.player_id = NO_PLAYER
+        if self.state is not None:
+            conn.send(snake_protocol.encode_welcome(self.match_id, NO_PLAYER, self.header))
+        self.spectators.add(conn)
+
+    def remove_player(self, conn):
+        """
+        Removes a player that left before the match started.
+
+        :param conn: Player connection.
+            + type: ClientConnection
+        :return: None
+        """
+        if self.state is None and conn in self.players:
+            self.players.remove(conn)
+            for player_id, player in enumerate(self.players):
+                player.player_id = player_id
+
+    def handle_input(self, player_id, tick, direction):
+        """
+        Queues a turn requested by a player. Turns requested for a future tick (predicted ahead by the
+        client) are applied on that tick, late turns are applied as soon as possible.
+
+        :param player_id: Player id.
+            + type: int
+        :param tick: Tick the turn was requested for.
+            + type: int
+        :param direction: Requested direction.
+            + type: int
+        :return: None
+        """
+        if self.state is None or direction not in snake_engine.DIRECTIONS:
+            return
+        self.metrics.inputs.inc(1, (player_id,))
+        scheduled = self.scheduled_turns[player_id]
+        if tick > self.state.ticks or scheduled:
+            if len(scheduled) < MAX_SCHEDULED_TURNS:
+                scheduled.append((tick, direction))
+        else:
+            self.turn_queues[player_id].push(direction, self.state.directions[player_id])
+
+    def resync(self, conn):
+        """
+        Sends the full state of the game to a player that drifted from the server.
+
+        :param conn: Player connection.
+            + type: ClientConnection
+        :return: None
+        """
+        if self.state is None:
+            return
+        self.metrics.resyncs.inc()
+        conn.send(snake_protocol.encode_state(snake_replay.pack_state(self.state)))
+
+    def next_actions(self):
+        """
+        Returns the action of each player for the next tick.
+
+        :return: Direction of each player, or None if it does not change.
+            + type: List<int or None>
+        """
+        tick = self.state.ticks
+        directions = self.state.directions
+        actions = []
+        for player_id, turn_queue in enumerate(self.turn_queues):
+            scheduled = self.scheduled_turns[player_id]
+            while scheduled and scheduled[0][0] <= tick:
+                turn_queue.push(scheduled.popleft()[1], directions[player_id])
+            actions.append(turn_queue.pop())
+        return actions
+
+    def broadcast(self, frame):
+        """
+        Sends a frame to all the clients of the match.
+
+        :param frame: Frame to send.
+            + type: bytes
+        :return: None
+        """
+        for conn in self.players:
+            conn.send(frame)
+        self.spectators.send(frame)
+
+    def start(self):
+        """
+        Starts the match, sending the initial state to the players and the spectators.
+
+        :return: None
+        """
+        logger.debug("Starting match " + str(self.match_id))
+        self.start_time = time.time()
+        self.state = self.header.new_state()
+        for conn in self.players:
+            conn.send(snake_protocol.encode_welcome(self.match_id, conn.player_id, self.header))
+        self.spectators.send(snake_protocol.encode_welcome(self.match_id, NO_PLAYER, self.header))
+        self.spectators.publish(self.state, self.state.initial_diffs())
+
+    def interval(self):
+        """
+        Returns the seconds until the next tick, following the speed of the longest snake.
+
+        :return: The tick interval in seconds.
+            + type: float
+        """
+        return snake_engine.game_speed(max(len(snake) for snake in self.state.snakes)) / 1000.0
+
+    def tick(self):
+        """
+        Simulates one tick and sends it to the players and the spectators.
+
+        :return: False if the match has ended.
+            + type: boolean
+        """
+        if all(conn.closed for conn in self.players):
+            logger.debug("All players left match " + str(self.match_id))
+            return False
+
+        metrics = self.metrics
+        start = time.perf_counter()
+        kills = self.state.kills
+        foods_eaten = self.state.foods_eaten
+        tick = self.state.ticks
+        actions = self.next_actions()
+        diffs = snake_engine.step(self.state, actions)
+        frame = snake_protocol.encode_tick(tick, actions)
+        if self.state.ticks % HASH_INTERVAL == 0:
+            digest = snake_replay.state_digest(snake_replay.pack_state(self.state))
+            frame = frame + snake_protocol.encode_hash(self.state.ticks, digest)
+        for conn in self.players:
+            conn.send(frame)
+        self.spectators.publish(self.state, diffs)
+
+        metrics.ticks.inc()
+        metrics.kills.inc(self.state.kills - kills)
+        metrics.foods_eaten.inc(self.state.foods_eaten - foods_eaten)
+        metrics.tick_duration.observe(time.perf_counter() - start)
+        return not self.state.must_end
+
+    def finish(self):
+        """
+        Sends the final scores and closes the connections of the match.
+
+        :return: The final scores.
+            + type: List<int>
+        """
+        self.broadcast(snake_protocol.encode_end(self.state.scores))
+        for conn in self.players + self.spectators.spectators:
+            conn.close()
+        logger.debug("Ending match " + str(self.match_id) + " with scores " + str(self.state.scores))
+        return self.state.scores
+
+    def __str__(self):
+        return "match " + str(self.match_id)
+
+    def result(self):
+        """
+        Builds the result of a finished match. Players that joined without a name are recorded as "Player <id>".
+
+        :return: The match result.
+            + type: snake_leaderboard.GameResult
+        """
+        players = [conn.name or "Player " + str(conn.player_id) for conn in self.players]
+        return snake_leaderboard.GameResult(snake_leaderboard.MODE_SERVER, self.header.seed, players,
+                                            self.state.scores, self.state.ticks, time.time() - self.start_time)
+
+
+#
+# SERVER
+#
+
+class GameServer(object):
+    """
+    Asyncio TCP server running many concurrent matches in a single thread. The ticks of all the matches are
+    multiplexed on a single timer wheel (see snake_scheduler), each match following the speed of its snakes.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, players_per_match=PLAYERS_PER_MATCH, metrics_port=None,
+                 leaderboard_file=None):
+        """
+        Creates a new server.
+
+        :param host: Address to listen on.
+            + type: str
+        :param port: Port to listen on.
+            + type: int
+        :param players_per_match: Number of players of each match.
+            + type: int
+        :param metrics_port: Local port of the metrics endpoint, or None to disable it.
+            + type: int or None
+        :param leaderboard_file: SQLite file path where the match results are recorded, or None to disable it.
+            + type: str or None
+        """
+        self.host = host
+        self.port = port
+        self.players_per_match = players_per_match
+        self.matches = {}
+        # The metrics endpoint runs on its own thread, so its gauges only read plain counters
+        self.active_matches = 0
+        self.scheduler = snake_scheduler.GameScheduler(on_late=self.late_tick)
+        self.metrics = ServerMetrics(lambda: self.active_matches, lambda: self.scheduler.games_behind)
+        self.metrics_server = None
+        if metrics_port is not None:
+            self.metrics_server = snake_metrics.MetricsServer(self.metrics.registry, port=metrics_port)
+        self.leaderboard = snake_leaderboard.new_writer(leaderboard_file)
+        self._open_match = None
+        self._next_match_id = 0
+        self._server = None
+
+    async def start(self):
+        """
+        Starts listening for clients.
+
+        :return: None
+        """
+        self._server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Server listening on " + self.host + ":" + str(self.port))
+        self.scheduler.start(asyncio.get_running_loop())
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+
+    async def serve_forever(self):
+        """
+        Starts the server and serves clients until cancelled.
+
+        :return: None
+        """
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        """
+        Stops listening for new clients and writes the pending leaderboard results.
+
+        :return: None
+        """
+        if self._server is not None:
+            self._server.close()
+        self.scheduler.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        if self.leaderboard is not None:
+            self.leaderboard.close()
+
+    def open_match(self):
+        """
+        Returns the match waiting for players, creating it if needed.
+
+        :return: The open match.
+            + type: Match
+        """
+        if self._open_match is None:
+            self._open_match = Match(self._next_match_id, self.players_per_match, snake_engine.new_seed(),
+                                     metrics=self.metrics)
+            self._next_match_id = self._next_match_id + 1
+        return self._open_match
+
+    def join(self, conn):
+        """
+        Adds a player to the open match, starting it when it is full.
+
+        :param conn: Player connection.
+            + type: ClientConnection
+        :return: The match the player joined.
+            + type: Match
+        """
+        match = self.open_match()
+        match.add_player(conn)
+        if match.is_full():
+            self._open_match = None
+            self.matches[match.match_id] = match
+            self.active_matches = self.active_matches + 1
+            match.start()
+            self.scheduler.add(match, self.end_match)
+        return match
+
+    def spectate(self, conn):
+        """
+        Adds a spectator to the most recent running match, or to the open match if none is running.
+
+        :param conn: Spectator connection.
+            + type: ClientConnection
+        :return: The spectated match.
+            + type: Match
+        """
+        if self.matches:
+            match = self.matches[max(self.matches)]
+        else:
+            match = self.open_match()
+        match.add_spectator(conn)
+        return match
+
+    def end_match(self, match):
+        """
+        Finishes a match that has ended and forgets it.
+
+        :param match: Ended match.
+            + type: Match
+        :return: None
+        """
+        del self.matches[match.match_id]
+        self.active_matches = self.active_matches - 1
+        match.finish()
+        # Queued without blocking, the leaderboard is written on its own thread
+        if self.leaderboard is not None:
+            self.leaderboard.record(match.result())
+
+    def late_tick(self, match, lag, dropped):
+        """
+        Counts a tick run after its due time.
+
+        :param match: Late match.
+            + type: Match
+        :param lag: Seconds behind the schedule.
+            + type: float
+        :param dropped: Ticks dropped to get back on schedule.
+            + type: int
+        :return: None
+        """
+        self.metrics.late_ticks.inc()
+        if dropped:
+            self.metrics.dropped_ticks.inc(dropped)
+
+    async def handle_client(self, reader, writer):
+        """
+        Handles a client connection until it is closed.
+
+        :param reader: Stream reader.
+            + type: asyncio.StreamReader
+        :param writer: Stream writer.
+            + type: asyncio.StreamWriter
+        :return: None
+        """
+        conn = ClientConnection(reader, writer)
+        match = None
+        try:
+            msg_type, payload = await snake_protocol.read_frame(reader)
+            if msg_type != MSG_JOIN:
+                return
+            role, conn.name = snake_protocol.decode_join(payload)
+            if role == ROLE_SPECTATOR:
+                match = self.spectate(conn)
+            else:
+                match = self.join(conn)
+
+            while True:
+                msg_type, payload = await snake_protocol.read_frame(reader)
+                if msg_type == MSG_INPUT and conn.player_id != NO_PLAYER:
+                    tick, direction = snake_protocol.decode_input(payload)
+                    match.handle_input(conn.player_id, tick, direction)
+                elif msg_type == MSG_RESYNC and conn.player_id != NO_PLAYER:
+                    match.resync(conn)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            if match is not None:
+                match.remove_player(conn)
+            conn.close()
+
+
+#
+# MAIN
+#
+
+def main():
+    """
+    Main function to run the Snake Fight server.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Snake Fight server")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--players", type=int, default=PLAYERS_PER_MATCH, help="Players per match")
+    parser.add_argument("--metrics-port", type=int, help="Serve the metrics on this local port (disabled by default)")
+    parser.add_argument("--leaderboard", help="Record the match results on this SQLite file (disabled by default)")
+    args = parser.parse_args()
+
+    logger.info("Snake server start")
+    server = GameServer(args.host, args.port, args.players, args.metrics_port, args.leaderboard)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    logger.info("Snake server end")
+
+
+#
+# ENTRY POINT
+#
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s | %(levelname)s | %(name)s - %(message)s')
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+import logging
+from multiprocessing import resource_tracker, shared_memory
+import struct
+import time
+
+from snake_engine import CELL_EMPTY, NO_OWNER, SPARSE_BOARD_CELLS
+
+try:
+    import numpy as np
+except ImportError:
+    # Only the readers need NumPy
+    np = None
+
+# CONSTANTS
+SHARED_MAGIC = b'SNKS'
+SHARED_VERSION = 1
+
+# Header: magic, version, number of players, board height, board width, sequence, tick
+HEADER_FORMAT = '<4sBxHIIQQ'
+HEADER_SIZE = 64
+SEQUENCE_FORMAT = '<Q'
+SEQUENCE_OFFSET = struct.calcsize('<4sBxHII')
+TICK_FORMAT = '<Q'
+TICK_OFFSET = SEQUENCE_OFFSET + struct.calcsize(SEQUENCE_FORMAT)
+
+# Owner ids are stored as int16
+MAX_SHARED_PLAYERS = 32767
+
+# Seconds between two attempts of a reader waiting for the writer to finish a frame
+READ_RETRY_DELAY = 0.0001
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+
+#
+# LAYOUT
+#
+
+def align(offset):
+    """
+    Rounds an offset up to a multiple of 8 bytes.
+
+    :param offset: Offset in bytes.
+        + type: int
+    :return: The aligned offset.
+        + type: int
+    """
+    return (offset + 7) & ~7
+
+
+def layout(num_players, y_size, x_size):
+    """
+    Computes the position of the arrays on the shared block, right after the header:
+    owners (int16 owner of the snake or food on each cell, NO_OWNER if empty), cells (int8 CELL_* content per cell),
+    foods (int64 packed cell per player, -1 if none), scores (int64 per player) and alive (int8 per player).
+
+    :param num_players: Number of players.
+        + type: int
+    :param y_size: Board height (including borders).
+        + type: int
+    :param x_size: Board width (including borders).
+        + type: int
+    :return: The (offset, item format, length) of each array by name, and the total size.
+        + type: Tuple<dict<str, Tuple<int, str, int>>, int>
+    """
+    num_cells = y_size * x_size
+    arrays = {}
+    offset = HEADER_SIZE
+    for name, item_format, length in [("owners", 'h', num_cells), ("cells", 'b', num_cells),
+                                      ("foods", 'q', num_players), ("scores", 'q', num_players),
+                                      ("alive", 'b', num_players)]:
+        offset = align(offset)
+        arrays[name] = (offset, item_format, length)
+        offset = offset + struct.calcsize(item_format) * length
+    return arrays, align(offset)
+
+
+def check_board(num_players, y_size, x_size):
+    """
+    Checks whether a board can be published on shared memory.
+
+    :param num_players: Number of players.
+        + type: int
+    :param y_size: Board height (including borders).
+        + type: int
+    :param x_size: Board width (including borders).
+        + type: int
+    :return: None
+    :raise ValueError: If the board is too big or has too many players to be exported.
+    """
+    if y_size * x_size > SPARSE_BOARD_CELLS or num_players > MAX_SHARED_PLAYERS:
+        raise ValueError("Board too big or too many players to be shared")
+
+
+#
+# WRITER
+#
+
+class BoardPublisher(object):
+    """
+    Publishes the board of a game on a shared memory block after every tick.
+
+    The writer follows a seqlock: the sequence counter is odd while a frame is being written and even once
+    it is complete, so the number of published frames is sequence / 2. Only the cells changed on each tick
+    are written (from the step diffs) and the writer never waits for the readers.
+    """
+
+    def __init__(self, name, state):
+        """
+        Creates the shared block of a game and publishes its initial state.
+
+        :param name: Shared memory name (e.g. "snake_board").
+            + type: str
+        :param state: Game state.
+            + type: GameState
+        :raise ValueError: If the board is too big or has too many players to be exported.
+        """
+        check_board(state.num_players, state.y_size, state.x_size)
+        self.num_players = state.num_players
+        arrays, size = layout(state.num_players, state.y_size, state.x_size)
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.sequence = 0
+
+        buf = self.shm.buf
+        struct.pack_into(HEADER_FORMAT, buf, 0, SHARED_MAGIC, SHARED_VERSION, state.num_players, state.y_size,
+                         state.x_size, self.sequence, state.ticks)
+        views = {}
+        for array_name, (offset, item_format, length) in arrays.items():
+            views[array_name] = buf[offset:offset + struct.calcsize(item_format) * length].cast(item_format)
+        self.owners = views["owners"]
+        self.cells = views["cells"]
+        self.foods = views["foods"]
+        self.scores = views["scores"]
+        self.alive = views["alive"]
+
+        for cell in range(len(self.owners)):
+            self.owners[cell] = NO_OWNER
+            self.cells[cell] = CELL_EMPTY
+        self.publish(state, state.initial_diffs())
+        logger.debug("Publishing the board on shared memory " + self.shm.name)
+
+    def publish(self, state, diffs):
+        """
+        Publishes a new frame.
+
+        :param state: Game state after the tick.
+            + type: GameState
+        :param diffs: Cell diffs produced by the tick.
+            + type: List<Tuple<int, int, int>>
+        :return: None
+        """
+        buf = self.shm.buf
+        self.sequence = self.sequence + 1
+        struct.pack_into(SEQUENCE_FORMAT, buf, SEQUENCE_OFFSET, self.sequence)
+
+        owners = self.owners
+        cells = self.cells
+        for cell, content, owner in diffs:
+            cells[cell] = content
+            owners[cell] = NO_OWNER if owner is None else owner
+        foods = self.foods
+        scores = self.scores
+        alive = self.alive
+        for player_id in range(self.num_players):
+            food = state.foods[player_id]
+            foods[player_id] = -1 if food is None else food
+            scores[player_id] = state.scores[player_id]
+            alive[player_id] = state.players_alive[player_id]
+        struct.pack_into(TICK_FORMAT, buf, TICK_OFFSET, state.ticks)
+
+        self.sequence = self.sequence + 1
+        struct.pack_into(SEQUENCE_FORMAT, buf, SEQUENCE_OFFSET, self.sequence)
+
+    def close(self):
+        """
+        Releases and removes the shared block.
+
+        :return: None
+        """
+        for view in (self.owners, self.cells, self.foods, self.scores, self.alive):
+            view.release()
+        self.shm.close()
+        self.shm.unlink()
+
+
+#
+# READER
+#
+
+def attach(name):
+    """
+    Attaches to an existing shared block without taking its ownership, so the block is not removed when the
+    reader process exits.
+
+    :param name: Shared memory name.
+        + type: str
+    :return: The shared block.
+        + type: shared_memory.SharedMemory
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 every attached block is registered on the resource tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class BoardReader(object):
+    """
+    Reads the board published by a BoardPublisher through NumPy views of the shared block (no copies).
+
+    The views always show the latest frame, so a consistent read checks the sequence around it:
+
+        while True:
+            sequence = reader.begin()
+            ...  # use reader.cells, reader.owners, reader.foods, reader.scores, reader.alive
+            if reader.validate(sequence):
+                break
+
+    or takes a consistent copy with snapshot().
+    """
+
+    def __init__(self, name):
+        """
+        Attaches to a published board.
+
+        :param name: Shared memory name.
+            + type: str
+        :raise ImportError: If NumPy is not installed.
+        :raise ValueError: If the block does not contain a published board.
+        """
+        if np is None:
+            raise ImportError("NumPy is required to read the shared board")
+        self.shm = attach(name)
+        magic, version, num_players, y_size, x_size, _, _ = struct.unpack_from(HEADER_FORMAT, self.shm.buf, 0)
+        if magic != SHARED_MAGIC or version != SHARED_VERSION:
+            self.shm.close()
+            raise ValueError("Not a shared board")
+        self.num_players = num_players
+        self.y_size = y_size
+        self.x_size = x_size
+
+        arrays, _ = layout(num_players, y_size, x_size)
+        dtypes = {'h': np.int16, 'b': np.int8, 'q': np.int64}
+        views = {}
+        for array_name, (offset, item_format, length) in arrays.items():
+            views[array_name] = np.ndarray((length,), dtype=dtypes[item_format], buffer=self.shm.buf, offset=offset)
+        self.owners = views["owners"].reshape(y_size, x_size)
+        self.cells = views["cells"].reshape(y_size, x_size)
+        self.foods = views["foods"]
+        self.scores = views["scores"]
+        self.alive = views["alive"]
+        self._header = np.ndarray((2,), dtype=np.uint64, buffer=self.shm.buf, offset=SEQUENCE_OFFSET)
+
+    def sequence(self):
+        """
+        Returns the current sequence counter (odd while a frame is being written).
+
+        :return: The sequence counter.
+            + type: int
+        """
+        return int(self._header[0])
+
+    def tick(self):
+        """
+        Returns the tick of the published frame.
+
+        :return: The tick.
+            + type: int
+        """
+        return int(self._header[1])
+
+    def begin(self):
+        """
+        Waits until no frame is being written.
+
+        :return: The sequence counter of the frame about to be read.
+            + type: int
+        """
+        sequence = self.sequence()
+        while sequence & 1:
+            time.sleep(READ_RETRY_DELAY)
+            sequence = self.sequence()
+        return sequence
+
+    def validate(self, sequence):
+        """
+        Checks whether the frame read since begin is consistent (no frame has been written meanwhile).
+
+        :param sequence: Sequence counter returned by begin.
+            + type: int
+        :return: True if the read frame is consistent.
+            + type: boolean
+        """
+        return self.sequence() == sequence
+
+    def snapshot(self):
+        """
+        Copies a consistent frame.
+
+        :return: Dictionary with the tick, owners, cells, foods, scores and alive arrays.
+            + type: dict
+        """
+        while True:
+            sequence = self.begin()
+            frame = {"tick": self.tick(), "owners": self.owners.copy(), "cells": self.cells.copy(),
+                     "foods": self.foods.copy(), "scores": self.scores.copy(), "alive": self.alive.copy()}
+            if self.validate(sequence):
+                return frame
+
+    def close(self):
+        """
+        Detaches from the shared block (the views cannot be used anymore).
+
+        :return: None
+        """
+        del self.owners, self.cells, self.foods, self.scores, self.alive, self._header
+        self.shm.close()
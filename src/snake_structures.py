@@ -0,0 +1,351 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+from array import array
+
+# CONSTANTS
+INITIAL_BODY_CAPACITY = 16
+
+# Random cells tried by the sparse free cells index before giving up
+SPARSE_SAMPLE_ROUNDS = 64
+
+
+#
+# SNAKE BODY
+#
+
+class SnakeBody(object):
+    """
+    Snake body stored as a ring buffer of packed cells (y * x_size + x).
+
+    The head is pushed and the tail is popped in O(1) without allocating new objects. The backing
+    array doubles its capacity when it is full, so long snakes only pay for log(length) reallocations.
+    """
+    __slots__ = ['_cells', '_mask', '_start', '_length']
+
+    def __init__(self, cells=(), capacity=INITIAL_BODY_CAPACITY):
+        """
+        Creates a new snake body.
+
+        :param cells: Initial packed cells of the snake (head first).
+            + type: Iterable<int>
+        :param capacity: Initial capacity (rounded up to a power of 2).
+            + type: int
+        """
+        cells = list(cells)
+        size = INITIAL_BODY_CAPACITY
+        while size < capacity or size < len(cells):
+            size = size * 2
+        self._cells = array('q', [0]) * size
+        self._mask = size - 1
+        self._start = 0
+        self._length = len(cells)
+        for i, cell in enumerate(cells):
+            self._cells[i] = cell
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        """
+        Iterates the packed cells from head to tail.
+        """
+        cells = self._cells
+        mask = self._mask
+        start = self._start
+        for i in range(self._length):
+            yield cells[(start + i) & mask]
+
+    def __repr__(self):
+        return "SnakeBody(" + str(list(self)) + ")"
+
+    def head(self):
+        """
+        Returns the packed cell of the head.
+
+        :return: The head cell.
+            + type: int
+        """
+        return self._cells[self._start]
+
+    def tail(self):
+        """
+        Returns the packed cell of the tail.
+
+        :return: The tail cell.
+            + type: int
+        """
+        return self._cells[(self._start + self._length - 1) & self._mask]
+
+    def push_head(self, cell):
+        """
+        Adds a new head to the snake.
+
+        :param cell: Packed cell of the new head.
+            + type: int
+        :return: None
+        """
+        if self._length > self._mask:
+            self._grow()
+        self._start = (self._start - 1) & self._mask
+        self._cells[self._start] = cell
+        self._length = self._length + 1
+
+    def pop_tail(self):
+        """
+        Removes the tail of the snake.
+
+        :return: The removed tail cell.
+            + type: int
+        """
+        self._length = self._length - 1
+        return self._cells[(self._start + self._length) & self._mask]
+
+    def clear(self):
+        """
+        Removes all the cells of the snake, keeping the allocated capacity.
+
+        :return: None
+        """
+        self._start = 0
+        self._length = 0
+
+    def _grow(self):
+        """
+        Doubles the capacity of the backing array keeping the cells order.
+
+        :return: None
+        """
+        cells = array('q', self)
+        cells.extend(array('q', [0]) * len(cells))
+        self._cells = cells
+        self._mask = len(cells) - 1
+        self._start = 0
+
+
+#
+# FREE CELLS INDEX
+#
+
+class FreeCells(object):
+    """
+    Index of the playable cells not occupied by any snake.
+
+    Free cells are kept in a dense array plus a map from cell to its position in that array, so adding,
+    removing (swap with the last one) and sampling a random free cell are O(1) regardless of how full
+    the board is.
+    """
+    __slots__ = ['_cells', '_positions', '_size']
+
+    def __init__(self, y_size, x_size):
+        """
+        Creates a new index where all the playable cells (without borders) are free.
+
+        :param y_size: Board height (including borders).
+            + type: int
+        :param x_size: Board width (including borders).
+            + type: int
+        """
+        self._cells = array('i', [0]) * ((y_size - 2) * (x_size - 2))
+        self._positions = array('i', [-1]) * (y_size * x_size)
+        self._size = 0
+        for y in range(1, y_size - 1):
+            for x in range(1, x_size - 1):
+                cell = y * x_size + x
+                self._cells[self._size] = cell
+                self._positions[cell] = self._size
+                self._size = self._size + 1
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, cell):
+        return self._positions[cell] != -1
+
+    def add(self, cell):
+        """
+        Marks the given cell as free. Does nothing if it is already free.
+
+        :param cell: Packed cell.
+            + type: int
+        :return: None
+        """
+        if self._positions[cell] != -1:
+            return
+        self._cells[self._size] = cell
+        self._positions[cell] = self._size
+        self._size = self._size + 1
+
+    def remove(self, cell):
+        """
+        Marks the given cell as occupied. Does nothing if it is already occupied.
+
+        :param cell: Packed cell.
+            + type: int
+        :return: None
+        """
+        index = self._positions[cell]
+        if index == -1:
+            return
+        # Move the last free cell to the removed slot
+        self._size = self._size - 1
+        last = self._cells[self._size]
+        self._cells[index] = last
+        self._positions[last] = index
+        self._positions[cell] = -1
+
+    def sample(self, rng):
+        """
+        Returns a random free cell.
+
+        :param rng: Random number generator.
+            + type: random.Random
+        :return: A random free cell or None if the board is full.
+            + type: int or None
+        """
+        if self._size == 0:
+            return None
+        return self._cells[rng.randint(0, self._size - 1)]
+
+    def order(self):
+        """
+        Returns the free cells in their sampling order, which depends on the history of the index.
+
+        :return: The free cells.
+            + type: array.array
+        """
+        return self._cells[:self._size]
+
+    def restore_order(self, cells):
+        """
+        Restores the sampling order of the free cells, so a rebuilt index samples the same cells as the original.
+
+        :param cells: The same free cells, in the order returned by order().
+            + type: Iterable<int>
+        :return: None
+        :raise ValueError: If the cells are not the free cells of the index.
+        """
+        cells = array('i', cells)
+        if len(cells) != self._size or len(set(cells)) != self._size \
+                or any(self._positions[cell] == -1 for cell in cells):
+            raise ValueError("The cells are not the free cells of the index")
+        for index, cell in enumerate(cells):
+            self._cells[index] = cell
+            self._positions[cell] = index
+
+
+#
+# SPARSE STORAGE
+#
+
+class SparseGrid(object):
+    """
+    Occupancy grid for huge boards, storing only the occupied cells.
+
+    It is a drop-in replacement of the dense grid array for the engine: reading a cell returns its owner or
+    the default value, and writing the default value frees the cell. Memory scales with the occupied cells
+    instead of the board size.
+    """
+    __slots__ = ['_owners', '_default']
+
+    def __init__(self, default):
+        """
+        Creates a new empty grid.
+
+        :param default: Value of the cells without owner.
+            + type: int
+        """
+        self._owners = {}
+        self._default = default
+
+    def __len__(self):
+        return len(self._owners)
+
+    def __getitem__(self, cell):
+        return self._owners.get(cell, self._default)
+
+    def __setitem__(self, cell, owner):
+        if owner == self._default:
+            self._owners.pop(cell, None)
+        else:
+            self._owners[cell] = owner
+
+    def items(self):
+        """
+        Returns the occupied cells and their owners.
+
+        :return: Iterable of (packed cell, owner) tuples.
+            + type: Iterable<Tuple<int, int>>
+        """
+        return self._owners.items()
+
+
+class SparseFreeCells(object):
+    """
+    Index of the free playable cells for huge boards, storing only the occupied cells.
+
+    Random free cells are sampled by rejection over the whole board, which takes very few rounds while the
+    board is mostly empty (always the case on huge boards). Sampling gives up after SPARSE_SAMPLE_ROUNDS.
+    """
+    __slots__ = ['_y_size', '_x_size', '_occupied', '_playable']
+
+    def __init__(self, y_size, x_size):
+        """
+        Creates a new index where all the playable cells (without borders) are free.
+
+        :param y_size: Board height (including borders).
+            + type: int
+        :param x_size: Board width (including borders).
+            + type: int
+        """
+        self._y_size = y_size
+        self._x_size = x_size
+        self._occupied = set()
+        self._playable = (y_size - 2) * (x_size - 2)
+
+    def __len__(self):
+        return self._playable - len(self._occupied)
+
+    def __contains__(self, cell):
+        y, x = divmod(cell, self._x_size)
+        return 0 < y < self._y_size - 1 and 0 < x < self._x_size - 1 and cell not in self._occupied
+
+    def add(self, cell):
+        """
+        Marks the given cell as free. Does nothing if it is already free.
+
+        :param cell: Packed cell.
+            + type: int
+        :return: None
+        """
+        self._occupied.discard(cell)
+
+    def remove(self, cell):
+        """
+        Marks the given cell as occupied. Does nothing if it is already occupied.
+
+        :param cell: Packed cell.
+            + type: int
+        :return: None
+        """
+        self._occupied.add(cell)
+
+    def sample(self, rng):
+        """
+        Returns a random free cell.
+
+        :param rng: Random number generator.
+            + type: random.Random
+        :return: A random free cell or None if none has been found.
+            + type: int or None
+        """
+        for _ in range(SPARSE_SAMPLE_ROUNDS):
+            cell = rng.randint(1, self._y_size - 2) * self._x_size + rng.randint(1, self._x_size - 2)
+            if cell not in self._occupied:
+                return cell
+        return None
@@ -0,0 +1,351 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+
+# For better print formatting
+from __future__ import print_function
+
+# Imports
+import argparse
+from itertools import combinations
+import json
+import logging
+import multiprocessing
+import random
+import sys
+
+import snake_bots
+import snake_engine
+import snake_fight
+from snake_replay import ReplayHeader, MODE_FIGHT
+
+# CONFIGURABLE CONSTANTS
+BOUNDS_ENABLED = False
+
+# CONSTANTS
+Y_SIZE = 40
+X_SIZE = 100
+
+FORMAT_ROUND_ROBIN = "round-robin"
+FORMAT_SWISS = "swiss"
+FORMATS = [FORMAT_ROUND_ROBIN, FORMAT_SWISS]
+
+# Games per pairing (the seats alternate between games)
+DEFAULT_GAMES = 2
+# Ticks after which a match is stopped with the current scores
+DEFAULT_MAX_TICKS = 5000
+
+# Points of a match
+POINTS_WIN = 1.0
+POINTS_DRAW = 0.5
+POINTS_BYE = 1.0
+
+# Matches sent to each worker at once
+POOL_CHUNK_SIZE = 4
+
+#
+# Logger definition
+#
+
+logger = logging.getLogger("console")
+
+# Policies loaded on each worker process
+_policies = {}
+
+
+#
+# MATCHES
+#
+
+def match_seed(base_seed, round_number, match_index):
+    """
+    Derives the seed of a match from the tournament seed, so every match is reproducible on its own.
+
+    :param base_seed: Tournament seed.
+        + type: int
+    :param round_number: Round of the match.
+        + type: int
+    :param match_index: Index of the match on its round.
+        + type: int
+    :return: The match seed.
+        + type: int
+    """
+    return random.Random(str(base_seed) + ":" + str(round_number) + ":" + str(match_index)).getrandbits(64)
+
+
+def play_match(spec):
+    """
+    Plays a headless Snake Fight match between bot policies. Runs on the worker processes.
+
+    :param spec: Tuple with the match id, the round, the policy of each seat, the seed, the board height, the
+        board width and the maximum ticks.
+        + type: Tuple<int, int, Tuple<str>, int, int, int, int>
+    :return: The match result.
+        + type: dict
+    """
+    match_id, round_number, policy_names, seed, y_size, x_size, max_ticks = spec
+    policies = []
+    for name in policy_names:
+        if name not in _policies:
+            _policies[name] = snake_bots.load_policy(name)
+        policies.append(_policies[name])
+
+    header = ReplayHeader(MODE_FIGHT, len(policy_names), seed, y_size=y_size, x_size=x_size,
+                          bounds_enabled=BOUNDS_ENABLED)
+    state = header.new_state()
+    # No time budget: the directions must not depend on the load of the machine
+    bots = snake_bots.BotController(dict(enumerate(policies)), budget=None)
+    while not state.must_end and state.ticks < max_ticks:
+        actions = [None] * state.num_players
+        bots.actions(state, actions)
+        snake_engine.step(state, actions)
+
+    return {"match_id": match_id, "round": round_number, "policies": list(policy_names), "seed": seed,
+            "scores": list(state.scores), "ticks": state.ticks}
+
+
+#
+# STANDINGS
+#
+
+class Standings(object):
+    """
+    Aggregated results of the entrants of a tournament. The winner of each match is decided by the
+    snake_fight final ranking; equal top scores are a draw.
+    """
+
+    def __init__(self, entrants):
+        """
+        Creates new empty standings.
+
+        :param entrants: Policy names.
+            + type: List<str>
+        """
+        self.entrants = list(entrants)
+        self.stats = dict((name, {"played": 0, "wins": 0, "draws": 0, "losses": 0, "byes": 0, "points": 0.0,
+                                  "total_score": 0}) for name in entrants)
+        self.opponents = dict((name, set()) for name in entrants)
+
+    def record(self, result):
+        """
+        Adds the result of a match.
+
+        :param result: Match result.
+            + type: dict
+        :return: None
+        """
+        names = result["policies"]
+        scores = result["scores"]
+        ranking = snake_fight.rank_players(scores)
+        best = ranking[0][0]
+        winners = [player_id for score, player_id in ranking if score == best]
+        for player_id, name in enumerate(names):
+            stats = self.stats[name]
+            stats["played"] = stats["played"] + 1
+            stats["total_score"] = stats["total_score"] + scores[player_id]
+            if player_id not in winners:
+                stats["losses"] = stats["losses"] + 1
+            elif len(winners) > 1:
+                stats["draws"] = stats["draws"] + 1
+                stats["points"] = stats["points"] + POINTS_DRAW
+            else:
+                stats["wins"] = stats["wins"] + 1
+                stats["points"] = stats["points"] + POINTS_WIN
+            self.opponents[name].update(other for other in names if other != name)
+
+    def record_bye(self, name):
+        """
+        Gives a bye (a free win) to an entrant left without opponent on a Swiss round.
+
+        :param name: Policy name.
+            + type: str
+        :return: None
+        """
+        stats = self.stats[name]
+        stats["byes"] = stats["byes"] + 1
+        stats["points"] = stats["points"] + POINTS_BYE
+
+    def ranking(self):
+        """
+        Sorts the entrants by points, then by mean score, then by name.
+
+        :return: List of (policy name, stats).
+            + type: List<Tuple<str, dict>>
+        """
+        def key(name):
+            stats = self.stats[name]
+            mean = stats["total_score"] / float(stats["played"]) if stats["played"] else 0.0
+            return -stats["points"], -mean, name
+        return [(name, self.stats[name]) for name in sorted(self.entrants, key=key)]
+
+
+#
+# PAIRINGS
+#
+
+def round_robin_pairings(entrants, games=DEFAULT_GAMES):
+    """
+    Pairs every entrant against every other one.
+
+    :param entrants: Policy names.
+        + type: List<str>
+    :param games: Games per pairing (the seats alternate between games).
+        + type: int
+    :return: List of seats (policy of each player) of each match.
+        + type: List<Tuple<str, str>>
+    """
+    pairings = []
+    for first, second in combinations(entrants, 2):
+        for game in range(games):
+            pairings.append((first, second) if game % 2 == 0 else (second, first))
+    return pairings
+
+
+def swiss_pairings(standings, games=DEFAULT_GAMES):
+    """
+    Pairs the entrants of the next Swiss round: entrants are sorted by their standings and each one plays
+    the best ranked entrant it has not met yet. With an odd number of entrants the lowest ranked entrant
+    without a bye gets one.
+
+    :param standings: Current standings.
+        + type: Standings
+    :param games: Games per pairing (the seats alternate between games).
+        + type: int
+    :return: The seats of each match and the entrant with a bye (or None).
+        + type: Tuple<List<Tuple<str, str>>, str or None>
+    """
+    order = [name for name, _ in standings.ranking()]
+    bye = None
+    if len(order) % 2 == 1:
+        candidates = [name for name in order if standings.stats[name]["byes"] == 0] or order
+        bye = candidates[-1]
+        order.remove(bye)
+
+    pairings = []
+    while order:
+        first = order.pop(0)
+        opponent = next((name for name in order if name not in standings.opponents[first]), order[0])
+        order.remove(opponent)
+        for game in range(games):
+            pairings.append((first, opponent) if game % 2 == 0 else (opponent, first))
+    return pairings, bye
+
+
+#
+# TOURNAMENT
+#
+
+def run_tournament(entrants, tournament_format=FORMAT_ROUND_ROBIN, games=DEFAULT_GAMES, rounds=None, seed=0,
+                   workers=None, y_size=Y_SIZE, x_size=X_SIZE, max_ticks=DEFAULT_MAX_TICKS):
+    """
+    Runs a tournament between bot policies on a process pool.
+
+    :param entrants: Policy names (see snake_bots.load_policy).
+        + type: List<str>
+    :param tournament_format: FORMAT_ROUND_ROBIN or FORMAT_SWISS.
+        + type: str
+    :param games: Games per pairing.
+        + type: int
+    :param rounds: Swiss rounds (defaults to the rounds needed to find a single winner).
+        + type: int or None
+    :param seed: Tournament seed, from which the seed of every match is derived.
+        + type: int
+    :param workers: Worker processes (defaults to the number of cores).
+        + type: int or None
+    :param y_size: Board height (including borders).
+        + type: int
+    :param x_size: Board width (including borders).
+        + type: int
+    :param max_ticks: Ticks after which a match is stopped with the current scores.
+        + type: int
+    :return: The standings and the results of all the matches (sorted by match id).
+        + type: Tuple<Standings, List<dict>>
+    """
+    standings = Standings(entrants)
+    if tournament_format == FORMAT_ROUND_ROBIN:
+        rounds = 1
+    elif rounds is None:
+        rounds = max(1, (len(entrants) - 1).bit_length())
+
+    results = []
+    pool = multiprocessing.Pool(workers)
+    try:
+        for round_number in range(rounds):
+            if tournament_format == FORMAT_ROUND_ROBIN:
+                pairings = round_robin_pairings(entrants, games)
+            else:
+                pairings, bye = swiss_pairings(standings, games)
+                if bye is not None:
+                    standings.record_bye(bye)
+
+            first_id = len(results)
+            specs = [(first_id + index, round_number, seats, match_seed(seed, round_number, index), y_size, x_size,
+                      max_ticks) for index, seats in enumerate(pairings)]
+            logger.debug("Round " + str(round_number) + ": " + str(len(specs)) + " matches")
+            round_results = sorted(pool.imap_unordered(play_match, specs, POOL_CHUNK_SIZE),
+                                   key=lambda result: result["match_id"])
+            # Results are recorded in match order so the standings do not depend on the worker timings
+            for result in round_results:
+                standings.record(result)
+            results.extend(round_results)
+    finally:
+        pool.close()
+        pool.join()
+    return standings, results
+
+
+#
+# MAIN
+#
+
+def main():
+    """
+    Main function to run a bot tournament.
+
+    :return: Exit code.
+        + type: int
+    """
+    parser = argparse.ArgumentParser(description="Snake Fight bot tournament")
+    parser.add_argument("policies", nargs="+",
+                        help="Bot policies: built-in names (" + ", ".join(sorted(snake_bots.POLICIES)) +
+                             ") or module:function import paths")
+    parser.add_argument("--format", choices=FORMATS, default=FORMAT_ROUND_ROBIN, help="Tournament format")
+    parser.add_argument("--games", type=int, default=DEFAULT_GAMES, help="Games per pairing")
+    parser.add_argument("--rounds", type=int, help="Swiss rounds")
+    parser.add_argument("--seed", type=int, default=0, help="Tournament seed")
+    parser.add_argument("--workers", type=int, help="Worker processes (defaults to the number of cores)")
+    parser.add_argument("--max-ticks", type=int, default=DEFAULT_MAX_TICKS, help="Maximum ticks per match")
+    parser.add_argument("--output", help="Write the standings and the match results to this JSON file")
+    args = parser.parse_args()
+
+    if len(set(args.policies)) != len(args.policies) or len(args.policies) < 2:
+        parser.error("At least two different policies are needed")
+    for name in args.policies:
+        try:
+            snake_bots.load_policy(name)
+        except ValueError as e:
+            parser.error(str(e))
+
+    standings, results = run_tournament(args.policies, args.format, args.games, args.rounds, args.seed,
+                                        args.workers, max_ticks=args.max_ticks)
+
+    print("%-4s %-32s %7s %6s %6s %6s %8s %12s" % ("rank", "policy", "played", "wins", "draws", "losses", "points",
+                                                  "mean score"))
+    for rank, (name, stats) in enumerate(standings.ranking()):
+        mean = stats["total_score"] / float(stats["played"]) if stats["played"] else 0.0
+        print("%-4d %-32s %7d %6d %6d %6d %8.1f %12.1f" % (rank + 1, name, stats["played"], stats["wins"],
+                                                          stats["draws"], stats["losses"], stats["points"], mean))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"format": args.format, "seed": args.seed, "standings": standings.ranking(),
+                       "matches": results}, f, indent=2)
+    return 0
+
+
+#
+# ENTRY POINT
+#
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s | %(levelname)s | %(name)s - %(message)s')
+    sys.exit(main())